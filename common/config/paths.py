@@ -2,27 +2,47 @@
 Centralized data path configuration.
 Shared by all modules (ml, nlp, rag, serving).
 """
+import os
 from pathlib import Path
 
 # Project root (assumes this file is in common/config/)
 PROJECT_ROOT = Path(__file__).parent.parent.parent
 
+# Data and artifact roots; overridable so scratch runs (benchmarks) never touch the repo's data
+DATA_DIR = Path(os.environ.get("FINSENSE_DATA_DIR", PROJECT_ROOT / "data"))
+
 # Raw data paths (unmodified data from external sources)
-RAW_DATA_DIR = PROJECT_ROOT / "data" / "raw"
+RAW_DATA_DIR = DATA_DIR / "raw"
 RAW_MARKET_DIR = RAW_DATA_DIR / "market"
+RAW_MARKET_WATERMARKS_FILE = RAW_MARKET_DIR / "_watermarks.json"  # per-symbol high-water marks
 RAW_METADATA_DIR = RAW_DATA_DIR / "metadata"
 RAW_METADATA_FILE = RAW_METADATA_DIR / "companies.csv"
 
 # Processed data paths (ML-ready data)
-PROCESSED_DATA_DIR = PROJECT_ROOT / "data" / "processed"
+PROCESSED_DATA_DIR = DATA_DIR / "processed"
 PROCESSED_MARKET_DIR = PROCESSED_DATA_DIR / "market"
 PROCESSED_FEATURES_DIR = PROCESSED_DATA_DIR / "features"
+PROCESSED_OHLCV_DATASET_DIR = PROCESSED_MARKET_DIR / "daily_ohlcv"  # symbol=<SYM>/ partitions
+PROCESSED_OHLCV_MANIFEST_FILE = PROCESSED_MARKET_DIR / "_raw_manifest.json"  # raw files already compacted
+SHAP_DATASET_DIR = PROCESSED_FEATURES_DIR / "shap_market_only"  # model_version=<sha12>/ partitions
+
+TRAIN_DATASET_FILE = PROCESSED_DATA_DIR / "train_market_only.parquet"
 
 # YAML config (for symbols, date ranges)
 ML_CONFIG_FILE = PROJECT_ROOT / "ml" / "config.yaml"
 
-# Auto-create directories on import (prevents crashes)
-RAW_MARKET_DIR.mkdir(parents=True, exist_ok=True)
-RAW_METADATA_DIR.mkdir(parents=True, exist_ok=True)
-PROCESSED_MARKET_DIR.mkdir(parents=True, exist_ok=True)
-PROCESSED_FEATURES_DIR.mkdir(parents=True, exist_ok=True)
+# Model artifacts + pipeline state
+ML_ARTIFACTS_DIR = Path(os.environ.get("FINSENSE_ARTIFACTS_DIR", PROJECT_ROOT / "ml" / "artifacts"))
+PIPELINE_STATE_FILE = ML_ARTIFACTS_DIR / "pipeline_state.json"
+DRIFT_REFERENCE_FILE = ML_ARTIFACTS_DIR / "lgbm_market_only_drift_reference.json"  # training-time feature bins
+MODEL_BUNDLE_FILE = ML_ARTIFACTS_DIR / "lgbm_market_only_horizons.pkl"  # one Booster per forecast horizon
+BACKTEST_DIR = ML_ARTIFACTS_DIR / "backtest"  # walk-forward folds + OOF predictions
+PROFILE_DIR = ML_ARTIFACTS_DIR / "profiles"   # per-stage profiling reports (ml/src/profiling.py)
+
+DATA_DIRS = (RAW_MARKET_DIR, RAW_METADATA_DIR, PROCESSED_MARKET_DIR, PROCESSED_FEATURES_DIR)
+
+
+def ensure_data_dirs():
+    """Create the data directories; called at stage start (importing this module has no side effects)."""
+    for directory in DATA_DIRS:
+        directory.mkdir(parents=True, exist_ok=True)
@@ -1,9 +1,27 @@
+from typing import Optional
+
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
 class Settings(BaseSettings):
     env: str = "local"
     log_level: str = "INFO"
+    inference_backend: str = "lightgbm"   # lightgbm | flat (ml/src/export_flat_model.py)
+    feature_reload_interval_s: float = 30.0   # market.parquet poll for hot reloads (0 = off)
+    prediction_cache_size: int = 10_000       # LRU entries in front of /forecast (0 = off)
+    prediction_cache_ttl_s: float = 300.0
+    batch_window_ms: float = 2.0              # /forecast micro-batching window (0 = off)
+    batch_max_items: int = 64
+    batch_queue_size: int = 2048              # pending requests before 503
+    metrics_dir: Optional[str] = None         # shared dir → metrics aggregated across uvicorn workers
+    metrics_flush_interval_s: float = 5.0
+    drift_window_size: int = 5_000            # recent /forecast feature vectors scored for drift
+    drift_window_slices: int = 10
+    drift_psi_threshold: float = 0.2
+    drift_min_samples: int = 200
+    profile_enabled: bool = True              # per-stage JSON reports under ml/artifacts/profiles/
+    profile_tracemalloc: bool = False         # + top allocators per step (slows allocation-heavy code)
+    profile_sample_ms: float = 0.0            # > 0: sampling profiler → collapsed stacks for flamegraphs
 
     model_config = SettingsConfigDict(env_prefix="FINSENSE_",case_sensitive=False)
 
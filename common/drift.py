@@ -0,0 +1,99 @@
+"""
+Binned feature distributions for drift detection (shared by training and serving).
+
+A reference is written next to the model at training time. For each feature
+it stores quantile bin edges from the training rows and the training count
+in each bin. Bins are (-inf, e0], (e0, e1], ..., (e_last, inf), plus a final
+bin for missing values. Serving bins live feature vectors the same way and
+compares the two histograms; raw training data is never needed again.
+"""
+import json
+import math
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List
+
+import numpy as np
+
+if TYPE_CHECKING:   # training-side only; serving never loads pandas for this module
+    import pandas as pd
+
+N_BINS = 10
+PSI_EPSILON = 1e-4            # floor for empty bins (PSI is undefined at 0)
+KS_C_ALPHA = 1.358            # two-sample KS critical coefficient at alpha = 0.05
+
+
+def bin_index(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Bin per value: i for edges[i-1] < v <= edges[i], len(edges) above the top edge, len(edges) + 1 for NaN."""
+    idx = np.searchsorted(edges, values, side="left")
+    idx[np.isnan(values)] = len(edges) + 1
+    return idx
+
+
+def build_reference(X: "pd.DataFrame", n_bins: int = N_BINS) -> dict:
+    features = {}
+    for name in X.columns:
+        values = X[name].to_numpy(dtype=np.float64)
+        finite = values[np.isfinite(values)]
+        # Interior quantiles only; ties collapse so every bin has a distinct range
+        edges = np.unique(np.quantile(finite, np.linspace(0, 1, n_bins + 1)[1:-1])) if len(finite) else np.array([])
+        counts = np.bincount(bin_index(values, edges), minlength=len(edges) + 2)
+        features[name] = {"edges": edges.tolist(), "counts": counts.tolist()}
+    return {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "n_rows": len(X),
+        "n_bins": n_bins,
+        "features": features,
+    }
+
+
+def save_reference(reference: dict, path: Path):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    tmp_path.write_text(json.dumps(reference, indent=2))
+    tmp_path.replace(path)
+
+
+def load_reference(path: Path) -> dict:
+    return json.loads(Path(path).read_text())
+
+
+def psi(expected_counts: np.ndarray, actual_counts: np.ndarray) -> float:
+    """Population stability index over matching bins."""
+    e = np.maximum(expected_counts / max(expected_counts.sum(), 1), PSI_EPSILON)
+    a = np.maximum(actual_counts / max(actual_counts.sum(), 1), PSI_EPSILON)
+    return float(np.sum((a - e) * np.log(a / e)))
+
+
+def binned_ks(expected_counts: np.ndarray, actual_counts: np.ndarray) -> float:
+    """Largest CDF gap at the bin edges over non-missing values (a lower bound on the exact KS statistic)."""
+    e, a = expected_counts[:-1], actual_counts[:-1]
+    if e.sum() == 0 or a.sum() == 0:
+        return 0.0
+    return float(np.max(np.abs(np.cumsum(e) / e.sum() - np.cumsum(a) / a.sum())))
+
+
+def ks_critical(n: int, m: int) -> float:
+    return KS_C_ALPHA * math.sqrt((n + m) / (n * m)) if n and m else math.inf
+
+
+def score(reference_counts: Dict[str, List[int]], live_counts: Dict[str, np.ndarray], reference_rows: int,
+          psi_threshold: float = 0.2) -> Dict[str, dict]:
+    scores = {}
+    for name, expected in reference_counts.items():
+        expected = np.asarray(expected, dtype=np.float64)
+        actual = np.asarray(live_counts[name], dtype=np.float64)
+        value = psi(expected, actual)
+        ks = binned_ks(expected, actual)
+        critical = ks_critical(int(actual[:-1].sum()), int(expected[:-1].sum()) or reference_rows)
+        scores[name] = {
+            "psi": value,
+            "ks": ks,
+            "ks_critical": critical,
+            "ks_significant": ks > critical,
+            "missing_share": float(actual[-1] / actual.sum()) if actual.sum() else 0.0,
+            "status": "drift" if value >= psi_threshold else "moderate" if value >= psi_threshold / 2 else "stable",
+            "drift": value >= psi_threshold,
+        }
+    return scores
@@ -0,0 +1,15 @@
+"""
+Content fingerprints for data files and model artifacts.
+Shared by the ML pipeline (change detection) and serving (artifact versions).
+"""
+import hashlib
+from pathlib import Path
+
+
+def file_sha256(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Streaming SHA-256 of a file's contents (constant memory)."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
@@ -0,0 +1,156 @@
+"""
+Flat array representation of a LightGBM tree ensemble (numpy; numba optional).
+
+All trees share one node table: feature, threshold, left/right child,
+missing-value routing and leaf value live in contiguous arrays. Leaves point
+to themselves. With numba installed, prediction is a compiled per-row walk
+over these arrays (no Python per node, GIL released); otherwise it falls back
+to `max_depth` vectorised numpy steps over every (row, tree) pair.
+Built for single rows and small batches; large batches are better served by
+Booster.predict. Produced by ml/src/export_flat_model.py.
+"""
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from common.lazy import is_available, lazy_import
+
+numba = lazy_import("numba") if is_available("numba") else None   # optional: numpy fallback below
+
+MISSING_NONE, MISSING_ZERO, MISSING_NAN = 0, 1, 2
+ZERO_THRESHOLD = 1e-35   # LightGBM's kZeroThreshold
+
+ARRAYS = ("feature", "threshold", "left", "right", "default_left", "missing_type", "value", "roots")
+
+
+def _walk(X, feature, threshold, left, right, default_left, missing_type, value, roots, out):
+    """Sum of leaf values per row; same routing as LightGBM's NumericalDecision."""
+    for i in range(X.shape[0]):
+        total = 0.0
+        for t in range(roots.shape[0]):
+            node = roots[t]
+            while left[node] != node:
+                fval = X[i, feature[node]]
+                kind = missing_type[node]
+                if np.isnan(fval) and kind != MISSING_NAN:
+                    fval = 0.0
+                if (kind == MISSING_ZERO and abs(fval) <= ZERO_THRESHOLD) or (kind == MISSING_NAN and np.isnan(fval)):
+                    go_left = default_left[node]
+                else:
+                    go_left = fval <= threshold[node]
+                node = left[node] if go_left else right[node]
+            total += value[node]
+        out[i] = total
+
+
+_walk_compiled = None
+
+
+def _compiled_walk():
+    """numba-compiled _walk, built on first predict (importing numba costs ~0.2 s); None without numba."""
+    global _walk_compiled
+    if _walk_compiled is None and numba is not None:
+        _walk_compiled = numba.njit(cache=True, nogil=True)(_walk)
+    return _walk_compiled
+
+
+class FlatTreeModel:
+    def __init__(self, feature: np.ndarray, threshold: np.ndarray, left: np.ndarray, right: np.ndarray,
+                 default_left: np.ndarray, missing_type: np.ndarray, value: np.ndarray, roots: np.ndarray,
+                 max_depth: int, feature_names: List[str], average_output: bool = False,
+                 source_sha256: str = ""):
+        self.feature = np.ascontiguousarray(feature, dtype=np.int32)
+        self.threshold = np.ascontiguousarray(threshold, dtype=np.float64)
+        self.left = np.ascontiguousarray(left, dtype=np.int32)
+        self.right = np.ascontiguousarray(right, dtype=np.int32)
+        self.default_left = np.ascontiguousarray(default_left, dtype=bool)
+        self.missing_type = np.ascontiguousarray(missing_type, dtype=np.int8)
+        self.value = np.ascontiguousarray(value, dtype=np.float64)
+        self.roots = np.ascontiguousarray(roots, dtype=np.int32)
+        self.max_depth = int(max_depth)
+        self.feature_names = list(feature_names)
+        self.average_output = bool(average_output)
+        self.source_sha256 = source_sha256
+
+        # Only pay for missing-value routing when the model can need it
+        self._nan_nodes = self.missing_type == MISSING_NAN
+        self._zero_nodes = self.missing_type == MISSING_ZERO
+        self._has_zero_nodes = bool(self._zero_nodes.any())
+
+    @property
+    def num_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def compiled(self) -> bool:
+        return numba is not None
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """Raw scores for a (n, n_features) or (n_features,) input; same as Booster.predict."""
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X[None, :]
+        walk = _compiled_walk()
+        if walk is not None:
+            out = np.empty(X.shape[0])
+            walk(X, self.feature, self.threshold, self.left, self.right, self.default_left,
+                 self.missing_type, self.value, self.roots, out)
+        else:
+            out = self._predict_numpy(X)
+        if self.average_output:
+            out /= len(self.roots)
+        return out
+
+    def _predict_numpy(self, X: np.ndarray) -> np.ndarray:
+        n = X.shape[0]
+        rows = np.arange(n)[:, None]
+        node = np.broadcast_to(self.roots, (n, len(self.roots)))
+        plain = not self._has_zero_nodes and not np.isnan(X).any()
+
+        for _ in range(self.max_depth):
+            fval = X[rows, self.feature[node]]
+            if plain:
+                go_left = fval <= self.threshold[node]
+            else:
+                go_left = self._route_missing(fval, node)
+            node = np.where(go_left, self.left[node], self.right[node])
+
+        return self.value[node].sum(axis=1)
+
+    def _route_missing(self, fval: np.ndarray, node: np.ndarray) -> np.ndarray:
+        # Mirrors LightGBM's NumericalDecision: NaN is 0 unless the split tracks NaN;
+        # "missing" rows follow default_left, the rest compare against the threshold
+        nan = np.isnan(fval)
+        nan_node = self._nan_nodes[node]
+        fval = np.where(nan & ~nan_node, 0.0, fval)
+        missing = (nan & nan_node) | (self._zero_nodes[node] & (np.abs(fval) <= ZERO_THRESHOLD))
+        return np.where(missing, self.default_left[node], fval <= self.threshold[node])
+
+    # ---- persistence ----
+
+    def save(self, path: Path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            np.savez(
+                f,
+                **{name: getattr(self, name) for name in ARRAYS},
+                max_depth=self.max_depth,
+                feature_names=np.array(self.feature_names),
+                average_output=self.average_output,
+                source_sha256=self.source_sha256,
+            )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "FlatTreeModel":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(
+                **{name: data[name] for name in ARRAYS},
+                max_depth=int(data["max_depth"]),
+                feature_names=[str(name) for name in data["feature_names"]],
+                average_output=bool(data["average_output"]),
+                source_sha256=str(data["source_sha256"]),
+            )
@@ -0,0 +1,42 @@
+"""
+Deferred imports for heavy libraries.
+
+    lgb = lazy_import("lightgbm")
+
+binds a placeholder module; the real import runs on the first attribute
+access (lgb.train, lgb.Dataset, ...) and is then cached in sys.modules as
+usual. Processes that never touch the library never pay for it: the API
+cold-starts without shap/sklearn/matplotlib, and a pipeline stage only loads
+what it calls. Annotations that name a lazy module's types must be strings,
+or the annotation itself triggers the import.
+"""
+import importlib
+import importlib.util
+import sys
+import types
+
+
+class LazyModule(types.ModuleType):
+    def _load(self) -> types.ModuleType:
+        module = importlib.import_module(self.__name__)
+        self.__dict__.update(module.__dict__)   # later lookups hit the instance dict directly
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self) -> str:
+        return f"<lazy module {self.__name__!r}>"
+
+
+def lazy_import(name: str) -> types.ModuleType:
+    """The module itself if already imported, else a placeholder that imports it on first use."""
+    return sys.modules.get(name) or LazyModule(name)
+
+
+def is_available(name: str) -> bool:
+    """Installed, without importing it (for optional dependencies)."""
+    return name in sys.modules or importlib.util.find_spec(name) is not None
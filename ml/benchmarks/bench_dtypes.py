@@ -0,0 +1,104 @@
+"""
+Benchmark: memory and file size of the processed tables, dtype policy vs before.
+
+    python -m ml.benchmarks.bench_pipeline --scales 1000x5 --stages processing features dataset
+    FINSENSE_DATA_DIR=/tmp/finsense-bench/1000x5/data python -m ml.benchmarks.bench_dtypes
+
+Loads daily OHLCV, market features and the training dataset as the stages
+now read them (ml/src/schemas.py), rebuilds each with the dtypes the stages
+wrote before the policy, and reports for both:
+- in-memory size (pandas deep memory usage)
+- Parquet file size and the time to read it back
+
+"Before" means: object-string symbols everywhere; in daily OHLCV also int64
+volume, 'YYYY-MM-DD' string ingest_date and a per-row source_file name; a
+float64 targets in the dataset (features were already float32 there).
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import pandas as pd
+from loguru import logger
+
+from common.config.paths import PROCESSED_FEATURES_DIR, TRAIN_DATASET_FILE
+from ml.src.datasets import TARGET_COLS
+from ml.src.features_market import FEATURES_SCHEMA
+from ml.src.models_baseline import DATASET_SCHEMA
+from ml.src.processing import load_daily_ohlcv
+from ml.src.schemas import OHLCV_SCHEMA, read_parquet, write_parquet
+
+MB = 1e6
+
+
+def before_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(
+        symbol=df["symbol"].astype(str),
+        volume=df["volume"].astype("int64"),
+        ingest_date=df["ingest_date"].dt.strftime("%Y-%m-%d"),
+        source_file=df["ingest_date"].dt.strftime("%Y%m%d") + ".csv",
+    )
+
+
+def before_features(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(symbol=df["symbol"].astype(str))
+
+
+def before_dataset(df: pd.DataFrame) -> pd.DataFrame:
+    return df.assign(symbol=df["symbol"].astype(str), **{col: df[col].astype("float64") for col in TARGET_COLS.values()})
+
+
+def measure(df: pd.DataFrame, path: Path, write) -> dict:
+    write(df, path)
+    start = time.perf_counter()
+    pd.read_parquet(path)
+    return {
+        "memory_mb": df.memory_usage(deep=True).sum() / MB,
+        "parquet_mb": path.stat().st_size / MB,
+        "read_seconds": time.perf_counter() - start,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--output", type=Path, default=None, help="also write the results as JSON")
+    args = parser.parse_args()
+
+    tables = {
+        "daily_ohlcv": (load_daily_ohlcv, OHLCV_SCHEMA, before_ohlcv),
+        "features": (lambda: read_parquet(PROCESSED_FEATURES_DIR / "market.parquet", FEATURES_SCHEMA),
+                     FEATURES_SCHEMA, before_features),
+        "dataset": (lambda: read_parquet(TRAIN_DATASET_FILE, DATASET_SCHEMA), DATASET_SCHEMA, before_dataset),
+    }
+    results = {}
+    logger.info(f"  {'table':<12} {'rows':>11} {'memory MB':>19} {'parquet MB':>19} {'read s':>15}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, (load, schema, before) in tables.items():
+            try:
+                df = load()
+            except (FileNotFoundError, OSError) as e:
+                logger.warning(f"  {name}: not built yet ({e})")
+                continue
+            old = measure(before(df), Path(tmp) / f"{name}-before.parquet",
+                          lambda frame, path: frame.to_parquet(path, index=False))
+            new = measure(df, Path(tmp) / f"{name}.parquet",
+                          lambda frame, path: write_parquet(frame, path, schema))
+            results[name] = {"rows": len(df), "before": old, "policy": new}
+            logger.info(f"  {name:<12} {len(df):>11,} "
+                        f"{old['memory_mb']:>8.1f} → {new['memory_mb']:>8.1f} "
+                        f"{old['parquet_mb']:>8.1f} → {new['parquet_mb']:>8.1f} "
+                        f"{old['read_seconds']:>6.2f} → {new['read_seconds']:>6.2f}")
+
+    if not results:
+        logger.error("No processed tables found; run the pipeline (or bench_pipeline) first")
+        sys.exit(1)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        logger.success(f"Results: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
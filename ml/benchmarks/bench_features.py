@@ -0,0 +1,74 @@
+"""
+Benchmark: pandas reference vs single-pass NumPy kernel for market features.
+
+    python -m ml.benchmarks.bench_features --symbols 10000 --years 20
+    python -m ml.benchmarks.bench_features --symbols 500 --years 5 --check
+
+Synthetic geometric random-walk bars (252 per year). --skip-pandas times the
+kernel alone when the reference would not fit in memory.
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from ml.src.features_kernel import compute_market_features_fast
+from ml.src.features_market import FEATURE_COLS, compute_market_features
+
+TRADING_DAYS_PER_YEAR = 252
+
+
+def synthetic_bars(n_symbols: int, n_days: int, seed: int = 42) -> pd.DataFrame:
+    """Symbol-sorted random-walk closes and log-normal volumes."""
+    rng = np.random.default_rng(seed)
+    n = n_symbols * n_days
+    log_ret = rng.normal(0.0003, 0.02, size=(n_symbols, n_days))
+    close = 100 * np.exp(np.cumsum(log_ret, axis=1)).ravel()
+    volume = rng.lognormal(15, 0.5, size=n).astype(np.int64)
+    symbols = np.repeat(np.array([f"SYM{i:05d}" for i in range(n_symbols)], dtype=object), n_days)
+    timestamps = np.tile(pd.bdate_range("2000-01-03", periods=n_days, tz="UTC").to_numpy(), n_symbols)
+    return pd.DataFrame({"symbol": symbols, "timestamp": timestamps, "close": close, "volume": volume})
+
+
+def check_parity(reference: pd.DataFrame, fast: pd.DataFrame, rtol: float = 1e-5, atol: float = 1e-6):
+    for col in FEATURE_COLS:
+        expected = reference[col].to_numpy(dtype=np.float64)
+        actual = fast[col].to_numpy(dtype=np.float64)
+        np.testing.assert_allclose(actual, expected, rtol=rtol, atol=atol, equal_nan=True,
+                                   err_msg=f"kernel/pandas mismatch in {col}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--symbols", type=int, default=10_000)
+    parser.add_argument("--years", type=int, default=20)
+    parser.add_argument("--skip-pandas", action="store_true")
+    parser.add_argument("--check", action="store_true", help="assert kernel matches pandas")
+    args = parser.parse_args()
+
+    df = synthetic_bars(args.symbols, args.years * TRADING_DAYS_PER_YEAR)
+    logger.info(f"Synthetic bars: {len(df):,} rows ({args.symbols:,} symbols × {args.years}y)")
+
+    start = time.perf_counter()
+    fast = compute_market_features_fast(df)
+    fast_s = time.perf_counter() - start
+    logger.info(f"NumPy kernel: {fast_s:.2f}s ({len(df) / fast_s / 1e6:.1f}M rows/s)")
+
+    if args.skip_pandas:
+        return
+
+    start = time.perf_counter()
+    reference = compute_market_features(df)
+    pandas_s = time.perf_counter() - start
+    logger.info(f"pandas:       {pandas_s:.2f}s ({len(df) / pandas_s / 1e6:.1f}M rows/s)")
+    logger.success(f"Speedup: {pandas_s / fast_s:.1f}x")
+
+    if args.check:
+        check_parity(reference, fast)
+        logger.success("Parity OK")
+
+
+if __name__ == "__main__":
+    main()
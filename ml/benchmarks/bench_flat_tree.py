@@ -0,0 +1,75 @@
+"""
+Benchmark: Booster.predict vs flat-array trees for single rows and small batches.
+
+    python -m ml.benchmarks.bench_flat_tree                     # synthetic model
+    python -m ml.benchmarks.bench_flat_tree --trees 1000 --leaves 63
+    python -m ml.benchmarks.bench_flat_tree --artifact          # ml/artifacts model
+
+Always checks parity (with injected NaNs) before timing.
+"""
+import argparse
+import time
+
+import joblib
+import lightgbm as lgb
+import numpy as np
+from loguru import logger
+
+from ml.src.export_flat_model import MODEL_FILE, flatten_booster, verify_parity
+from ml.src.models_baseline import FEATURE_COLS, LGBM_PARAMS
+
+BATCH_SIZES = (1, 8, 64, 512)
+
+
+def synthetic_booster(n_trees: int, n_leaves: int, n_rows: int = 20_000, seed: int = 42):
+    """Booster on noisy five-feature data with missing values, grown to exactly n_trees."""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_rows, len(FEATURE_COLS)))
+    y = 0.01 * np.tanh(X[:, 0]) - 0.005 * X[:, 3] * X[:, 4] + rng.normal(0, 0.02, n_rows)
+    X[rng.random(X.shape) < 0.02] = np.nan
+    params = {**LGBM_PARAMS, 'num_leaves': n_leaves}
+    booster = lgb.train(params, lgb.Dataset(X, label=y, feature_name=FEATURE_COLS), num_boost_round=n_trees)
+    return booster, X
+
+
+def _per_call_us(fn, X: np.ndarray, repeats: int) -> np.ndarray:
+    fn(X)  # warm-up
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        fn(X)
+        timings[i] = time.perf_counter() - start
+    return timings * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--artifact", action="store_true", help="benchmark ml/artifacts/lgbm_market_only.pkl")
+    parser.add_argument("--trees", type=int, default=500)
+    parser.add_argument("--leaves", type=int, default=31)
+    parser.add_argument("--repeats", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.artifact:
+        booster = joblib.load(MODEL_FILE)
+        X = np.random.default_rng(0).normal(0, 0.02, size=(4096, len(FEATURE_COLS)))
+    else:
+        booster, X = synthetic_booster(args.trees, args.leaves)
+    flat = flatten_booster(booster)
+    logger.info(f"Model: {flat.num_trees} trees, {len(flat.feature):,} nodes, max depth {flat.max_depth}")
+
+    verify_parity(booster, flat, X[:4096])
+    logger.success("Parity OK")
+
+    logger.info(f"  {'rows':>5} {'booster p50/p99 (µs)':>22} {'flat p50/p99 (µs)':>20} {'speedup':>8}")
+    for size in BATCH_SIZES:
+        batch = np.ascontiguousarray(X[:size])
+        base = _per_call_us(booster.predict, batch, args.repeats)
+        fast = _per_call_us(flat.predict, batch, args.repeats)
+        b50, b99 = np.percentile(base, [50, 99])
+        f50, f99 = np.percentile(fast, [50, 99])
+        logger.info(f"  {size:>5} {b50:>10.1f} / {b99:>9.1f} {f50:>9.1f} / {f99:>8.1f} {b50 / f50:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
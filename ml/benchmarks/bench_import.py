@@ -0,0 +1,80 @@
+"""
+Benchmark: cold import time of the API gateway and the ML modules.
+
+    python -m ml.benchmarks.bench_import                           # all targets, 5 runs each
+    python -m ml.benchmarks.bench_import --budget-ms 1000          # exit 1 if the gateway is slower
+
+Each run is a fresh interpreter (nothing cached in sys.modules; OS file cache
+warm after the first run). Reports the median import time per module and
+which heavy libraries the import pulled in. The gateway must not load any of
+HEAVY: they belong to first use (model load, explainer warm-up, a stage).
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+import numpy as np
+from loguru import logger
+
+from common.config.paths import PROJECT_ROOT
+
+GATEWAY = "serving.api_gateway.main"
+TARGETS = (
+    GATEWAY,
+    "common.config.paths",
+    "ml.pipeline",
+    "ml.src.models_baseline",
+    "ml.src.backtest",
+    "ml.src.tuning",
+    "ml.src.explainability",
+    "ml.src.export_flat_model",
+    "ml.src.ingestion",
+)
+HEAVY = ("lightgbm", "shap", "sklearn", "matplotlib", "scipy", "yfinance", "numba", "pandas")
+
+PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "heavy": [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def import_once(module: str) -> dict:
+    result = subprocess.run([sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY)],
+                            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=TARGETS)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=None, help=f"max median import time of {GATEWAY}")
+    args = parser.parse_args()
+
+    failures = []
+    logger.info(f"  {'module':<28} {'median (ms)':>11} {'min (ms)':>9}  heavy libraries loaded")
+    for module in args.modules:
+        runs = [import_once(module) for _ in range(args.runs)]
+        ms = np.array([run["seconds"] for run in runs]) * 1e3
+        heavy = runs[-1]["heavy"]
+        logger.info(f"  {module:<28} {np.median(ms):>11.0f} {ms.min():>9.0f}  {', '.join(heavy) or '-'}")
+
+        if module == GATEWAY:
+            if heavy:
+                failures.append(f"{GATEWAY} imports {heavy} at startup")
+            if args.budget_ms is not None and np.median(ms) > args.budget_ms:
+                failures.append(f"{GATEWAY} imports in {np.median(ms):.0f} ms (budget {args.budget_ms:.0f} ms)")
+
+    for failure in failures:
+        logger.error(failure)
+    if failures:
+        sys.exit(1)
+    logger.success("Import budget OK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+"""
+Benchmark: pipeline stages end to end on synthetic data at several scales.
+
+    python -m ml.benchmarks.bench_pipeline                                  # default scales
+    python -m ml.benchmarks.bench_pipeline --scales 10000x20 --stages processing features
+    python -m ml.benchmarks.bench_pipeline --compare ml/benchmarks/results/<previous>.json
+
+For each scale SYMBOLSxYEARS, raw CSVs come from ml/benchmarks/synthetic_market.py
+(generated once per scale under --workdir). Processed data and artifacts are
+then wiped, and each stage runs cold, in dependency order, in its own
+interpreter. FINSENSE_DATA_DIR / FINSENSE_ARTIFACTS_DIR point at the scratch
+tree, so the repo's data is never touched. Stage parameters come from
+ml/config.yaml, as in the pipeline. Per stage it records wall time, CPU
+time, and peak RSS of the stage process and of its worker processes.
+
+Results go to a JSON file. --compare flags stages whose time or peak memory
+grew by more than --tolerance against an earlier run (exit code 1).
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from loguru import logger
+
+from common.config.paths import PROJECT_ROOT
+
+DEFAULT_SCALES = ("100x2", "1000x5", "2000x20")
+DEFAULT_STAGES = ("processing", "features", "dataset", "train", "shap")
+RESULTS_DIR = PROJECT_ROOT / "ml" / "benchmarks" / "results"
+RESULT_MARKER = "BENCH_RESULT "
+
+
+def parse_scale(scale: str) -> tuple:
+    symbols, years = scale.lower().split("x")
+    return int(symbols), float(years)
+
+
+# ---- child: one stage, one process ----
+
+def run_stage(name: str):
+    """Run a pipeline stage in this process and print its measurements (after the stage's own logs)."""
+    import importlib
+
+    import yaml
+
+    from common.config.paths import ML_CONFIG_FILE, ensure_data_dirs
+    from ml.pipeline import build_stages
+
+    with open(ML_CONFIG_FILE) as f:
+        stage = build_stages(yaml.safe_load(f))[name]
+    module_name, func_name = stage.target.split(":")
+    func = getattr(importlib.import_module(module_name), func_name)
+    ensure_data_dirs()
+
+    start, cpu_start = time.perf_counter(), time.process_time()
+    func(**stage.params)
+    seconds, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    print(RESULT_MARKER + json.dumps({
+        "seconds": seconds,
+        "cpu_seconds": cpu + children.ru_utime + children.ru_stime,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,          # Linux: KiB
+        "workers_peak_rss_mb": children.ru_maxrss / 1024,
+    }), flush=True)
+
+
+def _stage_subprocess(name: str, env: dict, log_file: Path) -> dict:
+    with open(log_file, "w") as log:
+        proc = subprocess.run([sys.executable, "-m", "ml.benchmarks.bench_pipeline", "--run-stage", name],
+                              cwd=PROJECT_ROOT, env=env, stdout=subprocess.PIPE, stderr=log, text=True)
+    lines = [line for line in proc.stdout.splitlines() if line.startswith(RESULT_MARKER)]
+    if proc.returncode != 0 or not lines:
+        return {"status": "failed", "returncode": proc.returncode, "log": str(log_file)}
+    return {"status": "ok", **json.loads(lines[-1][len(RESULT_MARKER):])}
+
+
+# ---- parent ----
+
+def bench_scale(scale: str, stages: list, workdir: Path, seed: int) -> dict:
+    from ml.benchmarks.synthetic_market import generate_market
+
+    n_symbols, years = parse_scale(scale)
+    root = workdir / scale
+    data_dir, artifacts_dir = root / "data", root / "artifacts"
+    spec = generate_market(data_dir, n_symbols, years, seed=seed)
+
+    # Cold start for every stage: nothing derived from the raw files survives a previous run
+    shutil.rmtree(data_dir / "processed", ignore_errors=True)
+    shutil.rmtree(artifacts_dir, ignore_errors=True)
+    artifacts_dir.mkdir(parents=True)
+    env = {**os.environ, "FINSENSE_DATA_DIR": str(data_dir), "FINSENSE_ARTIFACTS_DIR": str(artifacts_dir)}
+
+    results = {}
+    for name in stages:
+        if any(r["status"] != "ok" for r in results.values()):
+            results[name] = {"status": "skipped"}     # later stages read earlier stages' outputs
+            continue
+        logger.info(f"[{scale}] {name}...")
+        result = _stage_subprocess(name, env, root / f"{name}.log")
+        if result["status"] == "ok":
+            result["rows_per_second"] = spec["rows"] / result["seconds"] if result["seconds"] else None
+            logger.info(f"[{scale}] {name}: {result['seconds']:.2f}s, peak {result['peak_rss_mb']:,.0f} MB "
+                        f"(workers {result['workers_peak_rss_mb']:,.0f} MB)")
+        else:
+            logger.error(f"[{scale}] {name} failed; see {result['log']}")
+        results[name] = result
+    return {"scale": scale, "symbols": n_symbols, "years": years, "rows": spec["rows"],
+            "raw_bytes": spec["bytes"], "stages": results}
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict, previous: dict, tolerance: float) -> list:
+    """Regressions: (scale, stage, metric, before, after) where after > before * (1 + tolerance)."""
+    before = {(s["scale"], name): r for s in previous["scales"] for name, r in s["stages"].items()}
+    regressions = []
+    for scale in current["scales"]:
+        for name, result in scale["stages"].items():
+            old = before.get((scale["scale"], name))
+            if result["status"] != "ok" or not old or old["status"] != "ok":
+                continue
+            for metric in ("seconds", "peak_rss_mb"):
+                ratio = result[metric] / old[metric] if old[metric] else 1.0
+                logger.info(f"  {scale['scale']:>9} {name:<11} {metric:<12} {old[metric]:>10.2f} → {result[metric]:>10.2f} ({ratio:.2f}x)")
+                if ratio > 1 + tolerance:
+                    regressions.append((scale["scale"], name, metric, old[metric], result[metric]))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scales", nargs="+", default=DEFAULT_SCALES, help="SYMBOLSxYEARS, e.g. 10000x20")
+    parser.add_argument("--stages", nargs="+", default=DEFAULT_STAGES, help="pipeline stage names, in order")
+    parser.add_argument("--workdir", type=Path, default=Path("/tmp/finsense-bench"), help="synthetic data + scratch outputs")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, default=None, help="results JSON (default: ml/benchmarks/results/)")
+    parser.add_argument("--compare", type=Path, default=None, help="earlier results JSON to check against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed growth before a regression")
+    parser.add_argument("--run-stage", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_stage:
+        run_stage(args.run_stage)
+        return
+
+    report = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "scales": [bench_scale(scale, list(args.stages), args.workdir, args.seed) for scale in args.scales],
+    }
+    output = args.output or RESULTS_DIR / f"pipeline-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2))
+    logger.success(f"Results: {output}")
+
+    if args.compare:
+        regressions = compare(report, json.loads(args.compare.read_text()), args.tolerance)
+        for scale, name, metric, old, new in regressions:
+            logger.error(f"Regression: {scale} {name} {metric} {old:.2f} → {new:.2f}")
+        if regressions:
+            sys.exit(1)
+        logger.success(f"No regressions beyond {args.tolerance:.0%}")
+
+
+if __name__ == "__main__":
+    main()
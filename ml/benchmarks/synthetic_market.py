@@ -0,0 +1,150 @@
+"""
+Deterministic synthetic OHLCV bars in the raw ingestion layout.
+
+    python -m ml.benchmarks.synthetic_market --symbols 10000 --years 20 --data-dir /tmp/finsense-synth
+    FINSENSE_DATA_DIR=/tmp/finsense-synth python -m ml.pipeline run
+
+Writes <data-dir>/raw/market/<SYMBOL>/<YYYYMMDD>.csv exactly as ingestion
+does: a full-history file for the first ingest plus `increments` small
+daily files that re-send the last OVERLAP_DAYS bars (so processing has
+restatements to dedup). Each symbol has its own random stream (seeded from
+(seed, symbol index)): drift and volatility, a listing date in the first
+fifth of the calendar, a geometric random-walk close, open/high/low around
+it and log-normal volume. The same arguments always give the same files,
+and a symbol's bars do not depend on how many symbols are generated.
+"""
+import argparse
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+from loguru import logger
+
+TRADING_DAYS_PER_YEAR = 252
+OVERLAP_DAYS = 5                      # bars re-sent by each incremental ingest (ingestion overlap_days)
+START_DATE = "2005-01-03"
+INGEST_DATE = pd.Timestamp("2026-01-26")
+COLUMNS = ["symbol", "timestamp", "open", "high", "low", "close", "volume", "ingest_date"]
+SPEC_FILE = "synthetic.json"
+
+
+def symbol_name(i: int) -> str:
+    return f"SYN{i:05d}"
+
+
+def session_strings(n_days: int, start: str = START_DATE) -> np.ndarray:
+    """Exchange-local midnight per business day, formatted like yfinance CSVs ("2025-01-02 00:00:00-05:00")."""
+    days = pd.bdate_range(start, periods=n_days, tz="America/New_York")
+    raw = days.strftime("%Y-%m-%d %H:%M:%S%z")
+    return np.array([s[:-2] + ":" + s[-2:] for s in raw], dtype=object)
+
+
+def symbol_bars(i: int, n_days: int, seed: int) -> dict:
+    """Bars for symbol i from its listing session onwards (arrays, oldest first)."""
+    rng = np.random.default_rng([seed, i])
+    listed = int(rng.integers(0, max(1, n_days // 5)))
+    n = n_days - listed
+    mu, sigma = rng.uniform(-0.0002, 0.0006), rng.uniform(0.008, 0.035)
+
+    close = rng.uniform(5, 500) * np.exp(np.cumsum(rng.normal(mu, sigma, n)))
+    prev_close = np.concatenate([[close[0]], close[:-1]])
+    open_ = prev_close * np.exp(rng.normal(0, sigma / 4, n))
+    high = np.maximum(open_, close) * np.exp(np.abs(rng.normal(0, sigma / 2, n)))
+    low = np.minimum(open_, close) * np.exp(-np.abs(rng.normal(0, sigma / 2, n)))
+    volume = rng.lognormal(np.log(rng.uniform(1e5, 5e7)), 0.4, n).astype(np.int64)
+    return {"listed": listed, "open": open_, "high": high, "low": low, "close": close, "volume": volume}
+
+
+def _write_csv(path: Path, symbol: str, timestamps: np.ndarray, bars: dict, rows: slice, ingest_date: str) -> int:
+    n = len(timestamps[rows])
+    table = pa.table({
+        "symbol": pa.array([symbol] * n, pa.string()),
+        "timestamp": pa.array(timestamps[rows], pa.string()),
+        **{col: pa.array(bars[col][rows]) for col in ("open", "high", "low", "close", "volume")},
+        "ingest_date": pa.array([ingest_date] * n, pa.string()),
+    })
+    with open(path, "wb") as f:
+        # Unquoted header and values, as ingestion's DataFrame.to_csv writes them
+        f.write((",".join(COLUMNS) + "\n").encode())
+        pacsv.write_csv(table, f, pacsv.WriteOptions(include_header=False, quoting_style="none"))
+    return path.stat().st_size
+
+
+def _write_symbols(indices: List[int], market_dir: Path, n_days: int, seed: int, increments: int) -> tuple:
+    """Write every file of the given symbols; returns (rows, bytes)."""
+    sessions = session_strings(n_days)
+    rows = size = 0
+    for i in indices:
+        symbol = symbol_name(i)
+        bars = symbol_bars(i, n_days, seed)
+        timestamps = sessions[bars["listed"]:]
+        n = len(timestamps)
+        symbol_dir = market_dir / symbol
+        symbol_dir.mkdir(parents=True, exist_ok=True)
+
+        # First ingest: everything but the bars the increments add; then one new bar per day + overlap
+        first = max(1, n - increments)
+        size += _write_csv(symbol_dir / f"{INGEST_DATE:%Y%m%d}.csv", symbol, timestamps, bars, slice(0, first),
+                           f"{INGEST_DATE:%Y-%m-%d}")
+        for k in range(1, n - first + 1):
+            ingest = INGEST_DATE + pd.Timedelta(days=k)
+            end = first + k
+            size += _write_csv(symbol_dir / f"{ingest:%Y%m%d}.csv", symbol, timestamps, bars,
+                               slice(max(0, end - 1 - OVERLAP_DAYS), end), f"{ingest:%Y-%m-%d}")
+        rows += n
+    return rows, size
+
+
+def generate_market(data_dir: Path, n_symbols: int, years: float, seed: int = 42, increments: int = 1,
+                    max_workers: int = 4) -> dict:
+    """
+    Write the raw layout under data_dir/raw/market; returns the spec (with row/byte counts).
+    Skipped when data_dir already holds the same spec.
+    """
+    data_dir = Path(data_dir)
+    n_days = int(round(years * TRADING_DAYS_PER_YEAR))
+    spec = {"symbols": n_symbols, "years": years, "sessions": n_days, "seed": seed, "increments": increments}
+    spec_file = data_dir / SPEC_FILE
+    if spec_file.exists():
+        existing = json.loads(spec_file.read_text())
+        if {k: existing.get(k) for k in spec} == spec:
+            logger.info(f"Synthetic data up to date: {data_dir}")
+            return existing
+
+    market_dir = data_dir / "raw" / "market"
+    market_dir.mkdir(parents=True, exist_ok=True)
+    logger.info(f"Generating {n_symbols:,} symbols x {n_days:,} sessions → {market_dir}")
+    start = time.perf_counter()
+    chunks = [list(range(i, min(i + 100, n_symbols))) for i in range(0, n_symbols, 100)]
+    # Spawned, not forked: callers (bench_pipeline) may already have threads running
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        results = list(pool.map(_write_symbols, chunks, [market_dir] * len(chunks), [n_days] * len(chunks),
+                                [seed] * len(chunks), [increments] * len(chunks)))
+    spec.update(rows=sum(r for r, _ in results), bytes=sum(b for _, b in results),
+                seconds=time.perf_counter() - start)
+    spec_file.write_text(json.dumps(spec, indent=2))
+    logger.success(f"{spec['rows']:,} bars, {spec['bytes'] / 1e6:,.1f} MB in {spec['seconds']:.1f}s")
+    return spec
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", type=Path, required=True, help="root to use as FINSENSE_DATA_DIR")
+    parser.add_argument("--symbols", type=int, default=1000)
+    parser.add_argument("--years", type=float, default=5)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--increments", type=int, default=1, help="daily incremental files per symbol")
+    parser.add_argument("--max-workers", type=int, default=4)
+    args = parser.parse_args()
+    generate_market(args.data_dir, args.symbols, args.years, args.seed, args.increments, args.max_workers)
+
+
+if __name__ == "__main__":
+    main()
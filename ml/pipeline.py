@@ -0,0 +1,345 @@
+"""
+Memoized ML pipeline runner.
+
+    python -m ml.pipeline run               # run stale stages only
+    python -m ml.pipeline run --force       # ignore the cache
+    python -m ml.pipeline run --only train  # one stage (+ nothing else)
+    python -m ml.pipeline status            # show what would run
+
+Stages form a DAG (processing → features → dataset → train/backtest → shap). Each
+stage is fingerprinted from its input files, its code (the target module and
+every in-repo module it imports, transitively) and its parameters; a stage
+whose fingerprint matches the last successful run and whose outputs still
+exist is skipped. Ready stages run concurrently on a thread pool.
+"""
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional
+
+import yaml
+from loguru import logger
+
+from common.config.paths import (
+    BACKTEST_DIR, DRIFT_REFERENCE_FILE, ML_ARTIFACTS_DIR, ML_CONFIG_FILE, MODEL_BUNDLE_FILE, PIPELINE_STATE_FILE,
+    PROCESSED_FEATURES_DIR, PROCESSED_OHLCV_DATASET_DIR, PROJECT_ROOT, RAW_MARKET_DIR, SHAP_DATASET_DIR, TRAIN_DATASET_FILE,
+    ensure_data_dirs,
+)
+from common.fingerprint import file_sha256
+
+REPO_PACKAGES = ("ml", "common")
+
+
+def _module_file(module: str) -> Optional[Path]:
+    if module.split(".")[0] not in REPO_PACKAGES:
+        return None
+    base = PROJECT_ROOT.joinpath(*module.split("."))
+    for path in (base.with_suffix(".py"), base / "__init__.py"):
+        if path.is_file():
+            return path
+    return None
+
+
+def _imported_modules(module: str, path: Path) -> List[str]:
+    """Absolute names of everything `module` imports, including function-level imports."""
+    package = module if path.name == "__init__.py" else module.rpartition(".")[0]
+    imported = []
+    for node in ast.walk(ast.parse(path.read_text(encoding="utf-8"))):
+        if isinstance(node, ast.Import):
+            imported += [alias.name for alias in node.names]
+        elif isinstance(node, ast.ImportFrom):
+            base = node.module or ""
+            if node.level:
+                parent = package.rsplit(".", node.level - 1)[0] if node.level > 1 else package
+                base = f"{parent}.{base}" if base else parent
+            imported.append(base)
+            imported += [f"{base}.{alias.name}" for alias in node.names]   # `from . import x` names modules
+    return imported
+
+
+@lru_cache(maxsize=None)
+def _module_code(module: str) -> FrozenSet[Path]:
+    """Source file of `module` plus every in-repo module it imports, transitively."""
+    code, pending = set(), [module]
+    while pending:
+        name = pending.pop()
+        path = _module_file(name)
+        if path is None or path in code:
+            continue
+        code.add(path)
+        pending += _imported_modules(name, path)
+    return frozenset(code)
+
+
+@dataclass
+class Stage:
+    name: str
+    target: str                      # "module:function", imported only when the stage runs
+    inputs: List[Path]               # files or directories
+    outputs: List[Path]
+    deps: List[str] = field(default_factory=list)
+    params: dict = field(default_factory=dict)
+    code: List[Path] = field(init=False)   # source files that define the stage's behaviour
+
+    def __post_init__(self):
+        self.code = sorted(_module_code(self.target.split(":")[0]))
+
+
+def build_stages(config: dict) -> Dict[str, Stage]:
+    params = config.get('pipeline', {})
+    stages = [
+        Stage(
+            name="processing",
+            target="ml.src.processing:process_daily_ohlcv",
+            inputs=[RAW_MARKET_DIR],
+            outputs=[PROCESSED_OHLCV_DATASET_DIR],
+            params=params.get('processing', {"incremental": True}),
+        ),
+        Stage(
+            name="features",
+            target="ml.src.features_market:calculate_market_features",
+            inputs=[PROCESSED_OHLCV_DATASET_DIR],
+            outputs=[PROCESSED_FEATURES_DIR / "market.parquet", PROCESSED_FEATURES_DIR / "market.csv"],
+            deps=["processing"],
+            params=params.get('features', {"engine": "numpy"}),
+        ),
+        Stage(
+            name="dataset",
+            target="ml.src.datasets:build_market_only_dataset",
+            inputs=[PROCESSED_OHLCV_DATASET_DIR, PROCESSED_FEATURES_DIR / "market.parquet"],
+            outputs=[TRAIN_DATASET_FILE, TRAIN_DATASET_FILE.with_suffix(".csv")],
+            deps=["processing", "features"],
+        ),
+        Stage(
+            name="train",
+            target="ml.src.models_baseline:train_lightgbm_baseline",
+            inputs=[TRAIN_DATASET_FILE] + (
+                [ML_ARTIFACTS_DIR / "lgbm_market_only_best_params.json"]
+                if params.get('train', {}).get('tuned') else []
+            ),
+            outputs=[ML_ARTIFACTS_DIR / "lgbm_market_only.pkl", MODEL_BUNDLE_FILE,
+                     ML_ARTIFACTS_DIR / "lgbm_market_only_oof.csv", DRIFT_REFERENCE_FILE],
+            deps=["dataset"],
+            params=params.get('train', {}),
+        ),
+        Stage(
+            name="export_flat",
+            target="ml.src.export_flat_model:export_flat_model",
+            inputs=[ML_ARTIFACTS_DIR / "lgbm_market_only.pkl", MODEL_BUNDLE_FILE, TRAIN_DATASET_FILE],
+            outputs=[ML_ARTIFACTS_DIR / "lgbm_market_only_flat.npz"] + [
+                ML_ARTIFACTS_DIR / f"lgbm_market_only_flat_{horizon}.npz"
+                for horizon in params.get('train', {}).get('horizons', ["1d"]) if horizon != "1d"
+            ],
+            deps=["train"],
+        ),
+        Stage(
+            name="backtest",
+            target="ml.src.backtest:run_backtest",
+            inputs=[TRAIN_DATASET_FILE],
+            outputs=[BACKTEST_DIR / "folds.parquet", BACKTEST_DIR / "oof.parquet"],
+            deps=["dataset"],
+            params=config.get('backtest', {}),
+        ),
+        Stage(
+            name="shap",
+            target="ml.src.explainability:generate_shap_for_baseline",
+            inputs=[TRAIN_DATASET_FILE, ML_ARTIFACTS_DIR / "lgbm_market_only.pkl"],
+            outputs=[SHAP_DATASET_DIR, ML_ARTIFACTS_DIR / "shap_market_only_summary.png"],
+            deps=["train"],
+            params=config.get('explainability', {}),
+        ),
+    ]
+    return {stage.name: stage for stage in stages}
+
+
+class Fingerprinter:
+    """Content hashes with a (size, mtime) cache so unchanged files are not re-read."""
+
+    def __init__(self, cache: dict):
+        self.cache = cache
+
+    def file(self, path: Path) -> str:
+        stat = path.stat()
+        key = str(path.relative_to(PROJECT_ROOT))
+        cached = self.cache.get(key)
+        if cached and cached['size'] == stat.st_size and cached['mtime'] == stat.st_mtime:
+            return cached['sha256']
+        digest = file_sha256(path)
+        self.cache[key] = {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': digest}
+        return digest
+
+    def path(self, path: Path) -> str:
+        if not path.exists():
+            return "missing"
+        if path.is_file():
+            return self.file(path)
+        digest = hashlib.sha256()
+        for child in sorted(p for p in path.rglob("*") if p.is_file() and not p.name.endswith(".tmp")):
+            digest.update(child.relative_to(path).as_posix().encode())
+            digest.update(self.file(child).encode())
+        return digest.hexdigest()
+
+    def stage(self, stage: Stage) -> str:
+        payload = {
+            "stage": stage.name,
+            "target": stage.target,
+            "params": stage.params,
+            "code": {str(p.relative_to(PROJECT_ROOT)): self.path(p) for p in stage.code},
+            "inputs": {str(p.relative_to(PROJECT_ROOT)): self.path(p) for p in stage.inputs},
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()
+
+
+def _load_state() -> dict:
+    if not PIPELINE_STATE_FILE.exists():
+        return {"stages": {}, "files": {}}
+    with open(PIPELINE_STATE_FILE) as f:
+        return json.load(f)
+
+
+def _save_state(state: dict):
+    PIPELINE_STATE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = PIPELINE_STATE_FILE.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+    tmp_path.replace(PIPELINE_STATE_FILE)
+
+
+def _is_fresh(stage: Stage, fingerprint: str, state: dict) -> bool:
+    previous = state["stages"].get(stage.name)
+    return (
+        previous is not None
+        and previous["fingerprint"] == fingerprint
+        and all(p.exists() for p in stage.outputs)
+    )
+
+
+def _run_stage(stage: Stage) -> float:
+    module_name, func_name = stage.target.split(":")
+    func = getattr(importlib.import_module(module_name), func_name)
+    ensure_data_dirs()
+    start = time.perf_counter()
+    func(**stage.params)
+    return time.perf_counter() - start
+
+
+def run_pipeline(only: Optional[List[str]] = None, force: bool = False,
+                 max_workers: int = 2, dry_run: bool = False) -> dict:
+    """
+    Execute stale stages in dependency order; returns per-stage results
+    {name: {"status": hit|miss|stale|failed|blocked, "seconds": ..., "saved_seconds": ...}}.
+    """
+    with open(ML_CONFIG_FILE) as f:
+        config = yaml.safe_load(f)
+    stages = build_stages(config)
+    selected = set(only) if only else set(stages)
+    unknown = selected - set(stages)
+    if unknown:
+        raise ValueError(f"Unknown stages: {sorted(unknown)}")
+
+    state = _load_state()
+    fingerprints = Fingerprinter(state["files"])
+    results: Dict[str, dict] = {}
+    pending = [name for name in stages if name in selected]
+    running = {}
+    run_start = time.perf_counter()
+
+    def deps_done(stage: Stage) -> bool:
+        return all(dep in results or dep not in selected for dep in stage.deps)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        while pending or running:
+            # Schedule every stage whose upstream has finished
+            for name in list(pending):
+                stage = stages[name]
+                if not deps_done(stage):
+                    continue
+                pending.remove(name)
+
+                dep_status = {results.get(dep, {}).get("status") for dep in stage.deps}
+                if dep_status & {"failed", "blocked"}:
+                    results[name] = {"status": "blocked", "seconds": 0.0, "saved_seconds": 0.0}
+                    continue
+                if dry_run and "stale" in dep_status:
+                    results[name] = {"status": "stale", "seconds": 0.0, "saved_seconds": 0.0}
+                    continue
+
+                fingerprint = fingerprints.stage(stage)
+                if not force and _is_fresh(stage, fingerprint, state):
+                    saved = state["stages"][name].get("seconds", 0.0)
+                    results[name] = {"status": "hit", "seconds": 0.0, "saved_seconds": saved}
+                    logger.info(f"[{name}] up to date - skipped (saves ~{saved:.1f}s)")
+                    continue
+                if dry_run:
+                    results[name] = {"status": "stale", "seconds": 0.0, "saved_seconds": 0.0}
+                    continue
+
+                logger.info(f"[{name}] running")
+                running[pool.submit(_run_stage, stage)] = (name, fingerprint)
+
+            if not running:
+                continue
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name, fingerprint = running.pop(future)
+                try:
+                    seconds = future.result()
+                except Exception as e:
+                    logger.exception(f"[{name}] failed: {e}")
+                    results[name] = {"status": "failed", "seconds": 0.0, "saved_seconds": 0.0}
+                    continue
+                # Record the fingerprint of the inputs the stage actually ran on
+                state["stages"][name] = {"fingerprint": fingerprint, "seconds": seconds}
+                results[name] = {"status": "miss", "seconds": seconds, "saved_seconds": 0.0}
+                _save_state(state)
+
+    if not dry_run:
+        _save_state(state)
+    _log_summary(results, time.perf_counter() - run_start)
+    return results
+
+
+def _log_summary(results: dict, wall_seconds: float):
+    logger.info("Pipeline summary:")
+    logger.info(f"  {'stage':<12} {'status':<8} {'run (s)':>8} {'saved (s)':>10}")
+    for name, result in results.items():
+        logger.info(
+            f"  {name:<12} {result['status']:<8} {result['seconds']:>8.1f} {result['saved_seconds']:>10.1f}"
+        )
+    hits = sum(r["status"] == "hit" for r in results.values())
+    misses = sum(r["status"] == "miss" for r in results.values())
+    saved = sum(r["saved_seconds"] for r in results.values())
+    logger.success(f"{hits} cache hits, {misses} misses, ~{saved:.1f}s saved, wall {wall_seconds:.1f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FinSense ML pipeline")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    run = sub.add_parser("run", help="run stale stages")
+    run.add_argument("--only", nargs="+", help="restrict to these stages")
+    run.add_argument("--force", action="store_true", help="ignore cached fingerprints")
+    run.add_argument("--max-workers", type=int, default=2)
+
+    status = sub.add_parser("status", help="show which stages are stale")
+    status.add_argument("--only", nargs="+")
+
+    args = parser.parse_args()
+    if args.command == "run":
+        results = run_pipeline(only=args.only, force=args.force, max_workers=args.max_workers)
+        if any(r["status"] in ("failed", "blocked") for r in results.values()):
+            raise SystemExit(1)
+    else:
+        run_pipeline(only=args.only, dry_run=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Walk-forward (rolling-origin) backtest for the LightGBM baseline.
+
+Folds are laid out on trading sessions:
+
+    |---- train ----|-embargo-|-- test --|
+          |---- train ----|-embargo-|-- test --|      (origin += step)
+
+Each fold trains on its window (last 10% of it used for early stopping),
+predicts the test block, and reports RMSE / MAE / directional accuracy.
+Folds run on a process pool; LightGBM threads are split across workers so
+the box is not oversubscribed. Results land in ml/artifacts/backtest/:
+folds.parquet (one row per fold) and oof.parquet (every test prediction).
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import yaml
+from loguru import logger
+
+from common.config.paths import BACKTEST_DIR, ML_CONFIG_FILE, TRAIN_DATASET_FILE
+from common.lazy import lazy_import
+from .models_baseline import (DATASET_SCHEMA, EARLY_STOPPING_ROUNDS, FEATURE_COLS, LGBM_PARAMS, NUM_BOOST_ROUND,
+                              TARGET_COL)
+from .profiling import file_bytes, profiled_stage, step
+from .schemas import read_parquet
+
+lgb = lazy_import("lightgbm")
+
+VALID_FRACTION = 0.1   # tail of each train window used for early stopping
+
+
+@dataclass
+class Fold:
+    fold: int
+    train_start: int     # session indices, [start, end)
+    train_end: int
+    test_start: int
+    test_end: int
+
+
+def walk_forward_folds(n_sessions: int, train_sessions: int, test_sessions: int,
+                       step_sessions: int, embargo_sessions: int = 1,
+                       expanding: bool = False) -> List[Fold]:
+    """Fold boundaries over `n_sessions` ordered sessions; partial test blocks are dropped."""
+    if min(train_sessions, test_sessions, step_sessions) < 1 or embargo_sessions < 0:
+        raise ValueError("train/test/step must be >= 1 and embargo >= 0")
+    folds = []
+    train_end = train_sessions
+    while train_end + embargo_sessions + test_sessions <= n_sessions:
+        test_start = train_end + embargo_sessions
+        folds.append(Fold(
+            fold=len(folds),
+            train_start=0 if expanding else train_end - train_sessions,
+            train_end=train_end,
+            test_start=test_start,
+            test_end=test_start + test_sessions,
+        ))
+        train_end += step_sessions
+    return folds
+
+
+# ---- worker side: the dataset is loaded once per process, not per fold ----
+
+_DATA = {}
+
+
+def _init_worker(data_file: str):
+    df = read_parquet(data_file, DATASET_SCHEMA, columns=['symbol', 'timestamp'] + FEATURE_COLS + [TARGET_COL])
+    session = df['timestamp'].dt.tz_convert('UTC').dt.normalize() if df['timestamp'].dt.tz \
+        else df['timestamp'].dt.normalize()
+    sessions, session_id = np.unique(session.to_numpy(), return_inverse=True)
+
+    # Session-major order makes every window a contiguous slice
+    order = np.lexsort((df['symbol'].cat.codes.to_numpy(), session_id))    # categories are sorted
+    session_id = session_id[order]
+    _DATA.update(
+        X=df[FEATURE_COLS].to_numpy(dtype=np.float32)[order],
+        y=df[TARGET_COL].to_numpy(dtype=np.float64)[order],
+        symbol=df['symbol'].to_numpy()[order],
+        timestamp=df['timestamp'].to_numpy()[order],
+        sessions=sessions,
+        bounds=np.searchsorted(session_id, np.arange(len(sessions) + 1)),
+    )
+
+
+def _run_fold(fold: Fold, num_threads: int) -> tuple:
+    start = time.perf_counter()
+    bounds, sessions = _DATA['bounds'], _DATA['sessions']
+    X, y = _DATA['X'], _DATA['y']
+
+    n_train = fold.train_end - fold.train_start
+    valid_start = fold.train_end - max(1, int(n_train * VALID_FRACTION))
+    fit = slice(bounds[fold.train_start], bounds[valid_start])
+    valid = slice(bounds[valid_start], bounds[fold.train_end])
+    test = slice(bounds[fold.test_start], bounds[fold.test_end])
+
+    train_data = lgb.Dataset(X[fit], label=y[fit], feature_name=FEATURE_COLS, free_raw_data=False)
+    valid_data = lgb.Dataset(X[valid], label=y[valid], reference=train_data)
+    params = {**LGBM_PARAMS, 'num_threads': num_threads}
+    model = lgb.train(
+        params, train_data,
+        num_boost_round=NUM_BOOST_ROUND,
+        valid_sets=[valid_data],
+        callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS, verbose=False)],
+    )
+
+    y_true = y[test]
+    y_pred = model.predict(X[test], num_iteration=model.best_iteration, num_threads=num_threads)
+    errors = y_pred - y_true
+    metrics = {
+        **asdict(fold),
+        'train_from': pd.Timestamp(sessions[fold.train_start]),
+        'test_from': pd.Timestamp(sessions[fold.test_start]),
+        'test_to': pd.Timestamp(sessions[fold.test_end - 1]),
+        'n_train': fit.stop - fit.start,
+        'n_valid': valid.stop - valid.start,
+        'n_test': len(y_true),
+        'best_iteration': model.best_iteration,
+        'rmse': float(np.sqrt(np.mean(errors ** 2))),
+        'mae': float(np.mean(np.abs(errors))),
+        'dir_acc': float(np.mean(np.sign(y_true) == np.sign(y_pred))),
+        'seconds': time.perf_counter() - start,
+    }
+    oof = pd.DataFrame({
+        'fold': fold.fold,
+        'timestamp': _DATA['timestamp'][test],
+        'symbol': _DATA['symbol'][test],
+        'y_true': y_true,
+        'y_pred': y_pred,
+    })
+    return metrics, oof
+
+
+def _write_parquet(df: pd.DataFrame, path: Path):
+    tmp_path = path.with_suffix(".parquet.tmp")
+    df.to_parquet(tmp_path, index=False)
+    tmp_path.replace(path)
+
+
+@profiled_stage("backtest")
+def run_backtest(train_sessions: int = 120, test_sessions: int = 20, step_sessions: int = 20,
+                 embargo_sessions: int = 1, expanding: bool = False, max_workers: int = 4,
+                 data_file: Path = TRAIN_DATASET_FILE,
+                 output_dir: Optional[Path] = BACKTEST_DIR) -> pd.DataFrame:
+    """
+    1. Lay out walk-forward folds over the dataset's sessions
+    2. Train/predict every fold on a process pool (bounded LightGBM threads)
+    3. Save per-fold metrics + OOF predictions, log the summary
+    Returns the per-fold metrics.
+    """
+    logger.info("Walk-forward backtest...")
+
+    # Step 1: Folds over unique sessions
+    timestamps = pd.read_parquet(data_file, columns=['timestamp'])['timestamp']
+    utc = timestamps.dt.tz_convert('UTC') if timestamps.dt.tz else timestamps
+    n_sessions = utc.dt.normalize().nunique()
+    folds = walk_forward_folds(n_sessions, train_sessions, test_sessions, step_sessions,
+                               embargo_sessions, expanding)
+    if not folds:
+        raise ValueError(
+            f"{n_sessions} sessions is too short for train={train_sessions} "
+            f"+ embargo={embargo_sessions} + test={test_sessions}"
+        )
+
+    # Step 2: Parallel folds, cores split between processes
+    workers = max(1, min(max_workers, len(folds)))
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    logger.info(f"{len(folds)} folds over {n_sessions} sessions | "
+                f"{workers} workers x {num_threads} LightGBM threads")
+
+    metrics, oofs = [], []
+    # Spawned, not forked: the pipeline may be running LightGBM/OpenMP threads in this process
+    with step("folds") as s, ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker, initargs=(str(data_file),)) as pool:
+        futures = {pool.submit(_run_fold, fold, num_threads): fold for fold in folds}
+        for future in as_completed(futures):
+            fold_metrics, oof = future.result()
+            metrics.append(fold_metrics)
+            oofs.append(oof)
+            logger.info(
+                f"  fold {fold_metrics['fold']:>3} | test {fold_metrics['test_from'].date()} → "
+                f"{fold_metrics['test_to'].date()} | dir acc {fold_metrics['dir_acc']:.1%} | "
+                f"rmse {fold_metrics['rmse']:.5f} | {fold_metrics['seconds']:.1f}s"
+            )
+        s.record(rows_out=sum(len(oof) for oof in oofs))
+
+    folds_df = pd.DataFrame(metrics).sort_values('fold').reset_index(drop=True)
+    oof_df = pd.concat(oofs, ignore_index=True).sort_values(['fold', 'symbol', 'timestamp'])
+
+    # Step 3: Persist + summary
+    if output_dir is not None:
+        output_dir = Path(output_dir)
+        output_dir.mkdir(parents=True, exist_ok=True)
+        with step("write_results") as s:
+            _write_parquet(folds_df, output_dir / "folds.parquet")
+            _write_parquet(oof_df.reset_index(drop=True), output_dir / "oof.parquet")
+            s.record(rows_in=len(oof_df), bytes_written=file_bytes([output_dir / "folds.parquet", output_dir / "oof.parquet"]))
+
+    pooled_dir = np.mean(np.sign(oof_df['y_true']) == np.sign(oof_df['y_pred']))
+    pooled_rmse = np.sqrt(np.mean((oof_df['y_pred'] - oof_df['y_true']) ** 2))
+    logger.success("Backtest COMPLETE")
+    logger.success(f"   Dir Acc per fold: {folds_df['dir_acc'].mean():.1%} ± {folds_df['dir_acc'].std(ddof=0):.1%}")
+    logger.success(f"   Pooled OOF: dir acc {pooled_dir:.1%}, rmse {pooled_rmse:.5f} ({len(oof_df):,} preds)")
+    if output_dir is not None:
+        logger.success(f"   Results: {output_dir}")
+    return folds_df
+
+
+if __name__ == "__main__":
+    with open(ML_CONFIG_FILE) as f:
+        defaults = yaml.safe_load(f).get('backtest', {})
+    parser = argparse.ArgumentParser(description="Walk-forward backtest of the LightGBM baseline")
+    for key in ('train_sessions', 'test_sessions', 'step_sessions', 'embargo_sessions', 'max_workers'):
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=defaults.get(key))
+    parser.add_argument("--expanding", action="store_true", default=defaults.get('expanding', False))
+    args = parser.parse_args()
+    run_backtest(**{k: v for k, v in vars(args).items() if v is not None})
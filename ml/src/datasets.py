@@ -1,67 +1,247 @@
+import argparse
 import pandas as pd
 import numpy as np
+import pyarrow as pa
+import pyarrow.dataset as ds
 from pathlib import Path
+from typing import Dict, List, Optional
 from loguru import logger
-from common.config.paths import PROCESSED_MARKET_DIR, PROCESSED_FEATURES_DIR
+from common.config.paths import PROCESSED_MARKET_DIR, PROCESSED_FEATURES_DIR, TRAIN_DATASET_FILE
+from .processing import load_daily_ohlcv, open_daily_ohlcv_dataset
+from .profiling import file_bytes, profiled_stage, step
+from .schemas import conform, feature_schema, write_parquet
+
+FEATURE_COLS = ['ret_1d', 'ret_3d', 'ret_5d', 'vol_20d', 'vol_zscore']
+# Forecast horizons: bars ahead, or a calendar offset resolved as-of (last close at or before t + offset)
+HORIZONS = {'1d': 1, '5d': 5, '1w': pd.Timedelta(days=7)}
+TARGET_COLS = {horizon: f'next_{horizon}_log_return' for horizon in HORIZONS}
+TARGET_COL = TARGET_COLS['1d']
+FEATURES_SCHEMA = feature_schema(FEATURE_COLS)
+TARGET_LOOKAHEAD = pd.Timedelta(days=14)  # extra price history read past `end` for the last targets
+
+
+def _ts_scalar(value, field_type: pa.DataType) -> pa.Scalar:
+    """Timestamp literal typed like the column (naive inputs are taken as UTC)."""
+    ts = pd.Timestamp(value)
+    if getattr(field_type, "tz", None) and ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return pa.scalar(ts, type=field_type)
+
+
+def _slice_filter(schema: pa.Schema, symbols: Optional[List[str]],
+                  start=None, end=None) -> Optional[ds.Expression]:
+    """Build a pushdown predicate for symbol list + [start, end] window."""
+    expr = None
+    ts_type = schema.field("timestamp").type
+
+    def _and(a, b):
+        return b if a is None else a & b
+
+    if symbols:
+        expr = _and(expr, ds.field("symbol").isin(list(symbols)))
+    if start is not None:
+        expr = _and(expr, ds.field("timestamp") >= _ts_scalar(start, ts_type))
+    if end is not None:
+        expr = _and(expr, ds.field("timestamp") <= _ts_scalar(end, ts_type))
+    return expr
+
+
+def _composite_keys(symbols: pd.Series, timestamps: pd.Series, categories: pd.Index,
+                    origin_s: int, span_s: int) -> np.ndarray:
+    """
+    Monotone int64 key per (symbol, timestamp) for frames sorted by symbol/timestamp:
+    symbol code * span + seconds since origin.
+    """
+    codes = pd.Categorical(symbols, categories=categories).codes.astype(np.int64)
+    seconds = timestamps.to_numpy(dtype="datetime64[ns]").astype(np.int64) // 1_000_000_000 - origin_s
+    return codes * span_s + seconds
+
+
+def _forward_log_returns(prices: pd.DataFrame) -> Dict[str, np.ndarray]:
+    """
+    Every horizon's target for prices sorted by (symbol, timestamp), in one pass.
+
+    Bar horizons shift the close within each symbol segment. Calendar horizons
+    take the last close at or before t + offset (as-of); they stay NaN until the
+    symbol has a bar at or past t + offset, i.e. until that close is final.
+    """
+    close = prices['close'].to_numpy(dtype=np.float64)
+    n = len(close)
+    if n == 0:
+        return {col: np.empty(0) for col in TARGET_COLS.values()}
+    seg = pd.factorize(prices['symbol'])[0]          # category codes; no string compares
+    rows = np.arange(n)
+    seg_end = np.r_[np.flatnonzero(seg[1:] != seg[:-1]), n - 1]
+    last_row = np.repeat(seg_end, np.diff(np.r_[-1, seg_end]))   # last row of each row's segment
+
+    ts = prices['timestamp']
+    seconds = ((ts.dt.tz_convert('UTC') if ts.dt.tz else ts)
+               .to_numpy(dtype="datetime64[ns]").astype(np.int64) // 1_000_000_000)
+
+    targets = {}
+    for horizon, ahead in HORIZONS.items():
+        if isinstance(ahead, int):
+            j = rows + ahead
+            valid = j <= last_row
+        else:
+            # Monotone (segment, second) keys: as-of search within each segment
+            offset_s = int(ahead.total_seconds())
+            origin_s = seconds.min()
+            span_s = seconds.max() - origin_s + offset_s + 1
+            if (seg.max(initial=0) + 1) * span_s >= np.iinfo(np.int64).max:
+                raise ValueError(f"Too many symbols x seconds for {horizon} as-of keys")
+            keys = seg.astype(np.int64) * span_s + (seconds - origin_s)
+            j = np.searchsorted(keys, keys + offset_s, side='left')   # first bar at/after t + offset
+            valid = j <= last_row
+            exact = valid & (keys[np.minimum(j, n - 1)] == keys + offset_s)
+            j = np.where(exact, j, j - 1)
+        target = np.full(n, np.nan)
+        target[valid] = np.log(close[j[valid]] / close[valid])
+        targets[TARGET_COLS[horizon]] = target
+    return targets
+
+
+def _attach_targets(features: pd.DataFrame, prices: pd.DataFrame) -> pd.DataFrame:
+    """
+    Inner-join every horizon's forward log return onto features with a sorted-key lookup.
+
+    Both frames are sorted by (symbol, timestamp). Targets come from
+    _forward_log_returns on `prices`; the join is a binary search of the
+    feature keys into the price keys (no hash join).
+    """
+    # 1. Targets: forward closes within each symbol segment
+    targets = _forward_log_returns(prices)
+    if features.empty or prices.empty:
+        # Nothing to join (e.g. a slice matching no symbols): keep the output columns
+        return features.iloc[:0].assign(**{col: np.empty(0) for col in targets})
+
+    # 2. Composite sorted keys on a shared symbol dictionary + second resolution
+    categories = pd.Index(np.union1d(prices['symbol'].unique(), features['symbol'].unique()))
+    ts_p = prices['timestamp'].dt.tz_convert('UTC') if prices['timestamp'].dt.tz else prices['timestamp']
+    ts_f = features['timestamp'].dt.tz_convert('UTC') if features['timestamp'].dt.tz else features['timestamp']
+    ns_p = ts_p.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    ns_f = ts_f.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    origin_s = min(ns_p.min(), ns_f.min()) // 1_000_000_000
+    span_s = max(ns_p.max(), ns_f.max()) // 1_000_000_000 - origin_s + 1
+
+    whole_seconds = not ((ns_p % 1_000_000_000).any() or (ns_f % 1_000_000_000).any())
+    if not whole_seconds or len(categories) * span_s >= np.iinfo(np.int64).max:
+        # Keys would collide or overflow: fall back to a generic merge
+        prices = prices.assign(**targets)
+        return features.merge(prices[['symbol', 'timestamp', *targets]],
+                              on=['symbol', 'timestamp'], how='inner')
+
+    keys_p = _composite_keys(prices['symbol'], ts_p, categories, origin_s, span_s)
+    keys_f = _composite_keys(features['symbol'], ts_f, categories, origin_s, span_s)
+
+    # 3. Binary-search join (inner)
+    idx = np.searchsorted(keys_p, keys_f)
+    found = idx < len(keys_p)
+    found[found] = keys_p[idx[found]] == keys_f[found]
+
+    dataset = features.loc[found].reset_index(drop=True)
+    for col, target in targets.items():
+        dataset[col] = target[idx[found]]
+    return dataset
+
+
+@profiled_stage("dataset")
+def build_market_only_dataset(symbols: Optional[List[str]] = None, start=None, end=None,
+                              columns: Optional[List[str]] = None,
+                              output_file: Optional[Path] = None) -> pd.DataFrame:
+    """
+    Join features with forward log returns for every horizon in HORIZONS.
+
+    symbols / start / end / columns are pushed down to the Parquet scans, so a
+    slice only reads the partitions, row groups and columns it needs.
+    Writes Parquet + CSV to `output_file`. Without one, the full build writes
+    TRAIN_DATASET_FILE and a slice is only returned, so it never replaces the
+    training set.
+    """
 
-def build_market_only_dataset():
-    """Join features with next-day log returns."""
-    
     logger.info(" FS-11: Building market-only ML dataset...")
-    
-    # 1. Load PRICES → Create targets
-    prices_file = PROCESSED_MARKET_DIR / "daily_ohlcv.parquet"
-    prices = pd.read_parquet(prices_file)
-    
-    # Create next-day close and log return
-    prices['next_close'] = prices.groupby('symbol')['close'].shift(-1)
-    prices['next_1d_log_return'] = np.log(prices['next_close'] / prices['close'])
-    
-    logger.info(f" Prices loaded: {len(prices):,} rows, targets created")
-    
-    # 2. Load FEATURES
+    feature_cols = list(columns) if columns else FEATURE_COLS
+    unknown = set(feature_cols) - set(FEATURE_COLS)
+    if unknown:
+        raise ValueError(f"Unknown feature columns: {sorted(unknown)}")
+    sliced = bool(symbols or columns) or start is not None or end is not None
+    if output_file is None and not sliced:
+        output_file = TRAIN_DATASET_FILE
+
+    # 1. Load FEATURES (projection + predicate pushdown)
     features_file = PROCESSED_FEATURES_DIR / "market.parquet"
-    features = pd.read_parquet(features_file)
+    with step("load_features") as s:
+        features_ds = ds.dataset(features_file, format="parquet")
+        features = conform(features_ds.to_table(
+            columns=['symbol', 'timestamp'] + feature_cols,
+            filter=_slice_filter(features_ds.schema, symbols, start, end),
+        ).to_pandas(), FEATURES_SCHEMA, ['symbol', 'timestamp'] + feature_cols)
+        features = features.sort_values(['symbol', 'timestamp'], kind='stable').reset_index(drop=True)
+        s.record(rows_out=len(features))
     logger.info(f" Features loaded: {len(features):,} rows")
-    
+
+    # 2. Load PRICES → targets (read a little past `end` so the last rows get a next close)
+    price_end = None if end is None else pd.Timestamp(end) + TARGET_LOOKAHEAD
+    with step("load_prices") as s:
+        prices = load_daily_ohlcv(
+            columns=['symbol', 'timestamp', 'close'],
+            filter=_slice_filter(open_daily_ohlcv_dataset().schema, symbols, start, price_end),
+        )
+        s.record(rows_out=len(prices))
+    logger.info(f" Prices loaded: {len(prices):,} rows")
+
     # 3. JOIN: features + targets (same symbol/timestamp)
-    dataset = features.merge(
-        prices[['symbol', 'timestamp', 'next_1d_log_return']],
-        on=['symbol', 'timestamp'],
-        how='inner'
-    )
-    
-    logger.info(f" Joined dataset: {len(dataset):,} rows")
-    
-    # 4. Filter COMPLETE rows (no NaN features OR target)
-    feature_cols = ['ret_1d', 'ret_3d', 'ret_5d', 'vol_20d', 'vol_zscore']
+    with step("join_targets") as s:
+        dataset = _attach_targets(features, prices)
+        s.record(rows_in=len(features) + len(prices), rows_out=len(dataset))
+    logger.info(f" Joined dataset: {len(dataset):,} rows, targets created")
+
+    # 4. Filter COMPLETE rows (no NaN features or 1d target); longer horizons stay NaN
+    #    on the last bars of each symbol, and the trainer skips those per horizon
     before = len(dataset)
-    dataset = dataset.dropna(subset=feature_cols + ['next_1d_log_return'])
+    with step("dropna") as s:
+        dataset = dataset.dropna(subset=feature_cols + [TARGET_COL])
+        s.record(rows_in=before, rows_out=len(dataset))
     after = len(dataset)
-    
+
     logger.info(f"Cleaned: {before:,} → {after:,} complete rows")
-    
-    # 5. Reorder: features first, target last
-    cols = ['symbol', 'timestamp'] + feature_cols + ['next_1d_log_return']
-    dataset = dataset[cols]
-    
+
+    # 5. Reorder + compact dtypes: features first, targets last, float32 values
+    schema = feature_schema(feature_cols, list(TARGET_COLS.values()))
+    dataset = conform(dataset, schema).reset_index(drop=True)
+
+    if output_file is None:
+        return dataset
+
     # 6. Create train folder + save
-    output_file = Path("data/processed") / "train_market_only.parquet"
+    output_file = Path(output_file)
     output_file.parent.mkdir(exist_ok=True)
-    dataset.to_parquet(output_file, index=False)
-    
+    with step("write_parquet") as s:
+        write_parquet(dataset, output_file, schema)
+        s.record(rows_in=len(dataset), bytes_written=file_bytes([output_file]))
+
     # Export CSV too
     output_csv = output_file.with_suffix('.csv')
-    dataset.to_csv(output_csv, index=False)
-    
-    # Stats
-    target_stats = dataset['next_1d_log_return'].describe()
-    
+    with step("write_csv") as s:
+        dataset.to_csv(output_csv, index=False)
+        s.record(rows_in=len(dataset), bytes_written=file_bytes([output_csv]))
+
     logger.success(" FS-11 COMPLETE - ML READY!")
     logger.success(f"   {len(dataset):,} rows for training")
-    logger.success(f"   next_1d_log_return: mean={target_stats['mean']:.4f}")
+    for col in TARGET_COLS.values():
+        logger.success(f"   {col}: mean={dataset[col].mean():.4f}, {dataset[col].notna().sum():,} rows")
     logger.success(f"   Parquet: {output_file}")
     logger.success(f"   CSV: {output_csv}")
+    return dataset
 
 if __name__ == "__main__":
-    build_market_only_dataset()
+    parser = argparse.ArgumentParser(description="Build the market-only training dataset")
+    parser.add_argument("--symbols", nargs="+", help="restrict to these symbols")
+    parser.add_argument("--start", help="first timestamp (inclusive), e.g. 2025-03-01")
+    parser.add_argument("--end", help="last timestamp (inclusive)")
+    parser.add_argument("--columns", nargs="+", help=f"feature subset of {FEATURE_COLS}")
+    parser.add_argument("--output", type=Path, help=f"default {TRAIN_DATASET_FILE}; required for a slice")
+    args = parser.parse_args()
+    if args.output is None and (args.symbols or args.start or args.end or args.columns):
+        parser.error("a slice (--symbols/--start/--end/--columns) needs an explicit --output")
+    build_market_only_dataset(args.symbols, args.start, args.end, args.columns, args.output)
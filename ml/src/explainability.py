@@ -1,14 +1,51 @@
-import pandas as pd
-import numpy as np
-import shap
-import joblib
-import lightgbm as lgb  # for type compatibility
+"""
+SHAP attributions for the LightGBM baseline.
+
+    python -m ml.src.explainability                  # validation slice (last 20% by time)
+    python -m ml.src.explainability --scope all      # every dataset row
+
+Rows are read in chunks and explained on a process pool (model loaded once
+per worker, TreeSHAP threads split across workers). Each worker writes its
+chunk straight to a part file under
+data/processed/features/shap_market_only/model_version=<sha12>/, so the
+SHAP matrix is never held in memory. Rows whose (symbol, timestamp)
+already have SHAP values for the current model_version are skipped, which
+makes reruns incremental. The summary plot is drawn from a sample stratified
+by symbol.
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
 from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from loguru import logger
-from common.config.paths import PROCESSED_FEATURES_DIR
 
+from common.config.paths import ML_ARTIFACTS_DIR, SHAP_DATASET_DIR, TRAIN_DATASET_FILE
+from common.fingerprint import file_sha256
+from common.lazy import lazy_import
+from .profiling import file_bytes, profiled_stage, step
+
+joblib = lazy_import("joblib")
 
 FEATURE_COLS = ["ret_1d", "ret_3d", "ret_5d", "vol_20d", "vol_zscore"]
+SHAP_COLS = [f"shap_{col}" for col in FEATURE_COLS]
+KEY_COLS = ["symbol", "timestamp"]
+
+MODEL_FILE = ML_ARTIFACTS_DIR / "lgbm_market_only.pkl"
+SUMMARY_PLOT_FILE = ML_ARTIFACTS_DIR / "shap_market_only_summary.png"
+VALIDATION_FRACTION = 0.2   # same tail the baseline validates on
+
+
+def model_version(model_path: Path = MODEL_FILE) -> str:
+    """Partition key for SHAP rows; same short hash the API reports."""
+    return file_sha256(model_path)[:12]
 
 
 def _load_model(model_path: Path):
@@ -19,85 +56,176 @@ def _load_model(model_path: Path):
     return model
 
 
-def _load_validation_frame() -> pd.DataFrame:
-    data_file = PROCESSED_FEATURES_DIR.parent / "train_market_only.parquet"
-    if not data_file.exists():
-        raise FileNotFoundError(f"Training dataset not found: {data_file}")
+def _rows_filter(data_file: Path, scope: str):
+    """Dataset filter for the rows to explain: the validation tail, or everything."""
+    if scope == "all":
+        return None
+    if scope != "validation":
+        raise ValueError(f"Unknown SHAP scope: {scope}")
+    timestamps = pq.read_table(data_file, columns=["timestamp"]).column("timestamp")
+    split = pc.sort_indices(timestamps)[int(len(timestamps) * (1 - VALIDATION_FRACTION))].as_py()
+    return ds.field("timestamp") >= timestamps[split]   # scalar keeps the column's type/tz
 
-    df = pd.read_parquet(data_file)
-    logger.info(f"Loaded dataset: {len(df)} rows from {data_file}")
 
-    df_sorted = df.sort_values("timestamp").reset_index(drop=True)
-    split_idx = int(len(df_sorted) * 0.8)
-    val_df = df_sorted.iloc[split_idx:].reset_index(drop=True)
-    logger.info(f"Validation slice for SHAP: {len(val_df)} rows")
+def _existing_keys(version_dir: Path) -> pd.MultiIndex:
+    """(symbol, timestamp) already explained for this model version."""
+    if not version_dir.exists() or not any(version_dir.glob("*.parquet")):
+        return pd.MultiIndex.from_arrays([[], []], names=KEY_COLS)
+    keys = ds.dataset(version_dir, format="parquet").to_table(columns=KEY_COLS).to_pandas()
+    return pd.MultiIndex.from_frame(keys.astype({"symbol": str}))
 
-    return val_df
 
+# ---- worker side: the model is loaded once per process ----
 
-def generate_shap_for_baseline():
-    logger.info("FS-Explain: Starting SHAP computation for baseline model")
+_WORKER = {}
 
-    # 1. Load model and validation data
-    model_path = Path("ml/artifacts/lgbm_market_only.pkl")
-    model = _load_model(model_path)
 
-    val_df = _load_validation_frame()
-    X_val = val_df[FEATURE_COLS]
+def _init_worker(model_path: str, num_threads: int):
+    _WORKER.update(model=joblib.load(model_path), num_threads=num_threads)
 
-    # 2. SHAP explainer and values
-    logger.info("Creating SHAP TreeExplainer")
-    explainer = shap.TreeExplainer(model)
-    shap_values = explainer.shap_values(X_val)
-    base_value = explainer.expected_value
-    logger.info("SHAP values computed")
 
-    # 3. Global summary plot
-    artifacts_dir = Path("ml/artifacts")
-    artifacts_dir.mkdir(parents=True, exist_ok=True)
-    shap_plot_path = artifacts_dir / "shap_market_only_summary.png"
+def _explain_chunk(chunk: pd.DataFrame, output_file: str) -> int:
+    # LightGBM's native TreeSHAP (what shap.TreeExplainer calls for a Booster),
+    # called directly so each worker's thread count can be bounded.
+    # Last column is the expected value; contributions sum to the raw prediction.
+    model = _WORKER["model"]
+    contrib = model.predict(chunk[FEATURE_COLS], pred_contrib=True, num_threads=_WORKER["num_threads"])
+
+    out = chunk[KEY_COLS + FEATURE_COLS].reset_index(drop=True)
+    out[SHAP_COLS] = contrib[:, :-1]
+    out["prediction"] = contrib.sum(axis=1)
+    out["base_value"] = contrib[:, -1]
 
-    logger.info(f"Saving SHAP summary plot to {shap_plot_path}")
+    # Hidden temp name: dataset readers skip it until the rename
+    output_file = Path(output_file)
+    tmp_path = output_file.with_name(f".{output_file.name}.tmp")
+    out.to_parquet(tmp_path, index=False)
+    tmp_path.replace(output_file)
+    return len(out)
+
+
+def stratified_sample(version_dir: Path, n: int, seed: int = 42) -> pd.DataFrame:
+    """
+    ~n rows with per-symbol quotas proportional to each symbol's row count
+    (at least one each). Streams the partition; memory stays O(n).
+    """
+    dataset = ds.dataset(version_dir, format="parquet")
+    counts = dataset.to_table(columns=["symbol"]).column("symbol").to_pandas().astype(str).value_counts()
+    quota = np.maximum(1, np.round(counts * min(1.0, n / counts.sum()))).astype(int)
+
+    rng = np.random.default_rng(seed)
+    kept = None
+    for batch in dataset.to_batches(columns=["symbol"] + FEATURE_COLS + SHAP_COLS):
+        df = batch.to_pandas().astype({"symbol": str})
+        df["_priority"] = rng.random(len(df))
+        kept = df if kept is None else pd.concat([kept, df], ignore_index=True)
+        # Reservoir per symbol: keep each symbol's quota of smallest priorities
+        kept = kept.sort_values("_priority", kind="stable")
+        kept = kept[kept.groupby("symbol").cumcount().to_numpy() < kept["symbol"].map(quota).to_numpy()]
+    return kept.drop(columns="_priority").reset_index(drop=True)
+
+
+def _save_summary_plot(sample: pd.DataFrame, plot_path: Path):
+    import matplotlib
+    matplotlib.use("Agg")
     import matplotlib.pyplot as plt
+    import shap
 
     plt.figure()
-    shap.summary_plot(shap_values, X_val, show=False)
+    shap.summary_plot(sample[SHAP_COLS].to_numpy(), sample[FEATURE_COLS], show=False)
     plt.tight_layout()
-    plt.savefig(shap_plot_path, dpi=200)
+    plt.savefig(plot_path, dpi=200)
     plt.close()
 
-    # 4. Per-row SHAP table
-    shap_df = pd.DataFrame(
-        shap_values,
-        columns=[f"shap_{col}" for col in FEATURE_COLS],
-    )
 
-    y_pred = model.predict(X_val)
+@profiled_stage("shap")
+def generate_shap_for_baseline(scope: str = "validation", chunk_rows: int = 50_000, max_workers: int = 4,
+                               plot_sample: int = 5_000, model_path: Path = MODEL_FILE,
+                               data_file: Path = TRAIN_DATASET_FILE, output_dir: Path = SHAP_DATASET_DIR,
+                               plot_path: Path = SUMMARY_PLOT_FILE):
+    """
+    1. Resolve model_version and the rows already explained for it
+    2. Stream dataset chunks (new rows only) to a process pool; workers write parts
+    3. Summary plot from a stratified sample of the stored partition
+    """
+    logger.info("FS-Explain: Starting SHAP computation for baseline model")
 
-    shap_full = pd.concat(
-        [
-            val_df[["symbol", "timestamp"]].reset_index(drop=True),
-            X_val.reset_index(drop=True),
-            shap_df.reset_index(drop=True),
-        ],
-        axis=1,
+    # 1. Model version + existing keys
+    if not model_path.exists():
+        raise FileNotFoundError(f"Model file not found: {model_path}")
+    if not data_file.exists():
+        raise FileNotFoundError(f"Training dataset not found: {data_file}")
+    version = model_version(model_path)
+    version_dir = Path(output_dir) / f"model_version={version}"
+    version_dir.mkdir(parents=True, exist_ok=True)
+    with step("existing_keys") as s:
+        existing = _existing_keys(version_dir)
+        s.record(rows_out=len(existing))
+    logger.info(f"model_version={version} | {len(existing):,} rows already explained | scope={scope}")
+
+    # 2. Chunks → pool; at most 2 chunks per worker in flight
+    workers = max(1, max_workers)
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    run_id = time.strftime("%Y%m%dT%H%M%S")
+    scanner = ds.dataset(data_file, format="parquet").scanner(
+        columns=KEY_COLS + FEATURE_COLS, filter=_rows_filter(data_file, scope), batch_size=chunk_rows,
     )
-    shap_full["prediction"] = y_pred
-    shap_full["base_value"] = base_value
-
-    # 5. Save SHAP values (Parquet + CSV)
-    shap_parquet_path = PROCESSED_FEATURES_DIR / "shap_market_only.parquet"
-    shap_csv_path = PROCESSED_FEATURES_DIR / "shap_market_only.csv"
-    shap_parquet_path.parent.mkdir(parents=True, exist_ok=True)
 
-    shap_full.to_parquet(shap_parquet_path, index=False)
-    shap_full.to_csv(shap_csv_path, index=False)
+    start = time.perf_counter()
+    n_seen = n_written = n_chunks = 0
+    pending = set()
+    written_files = []
+    # Spawned, not forked: the pipeline may be running LightGBM/OpenMP threads in this process
+    with step("explain_chunks") as s, ProcessPoolExecutor(max_workers=workers,
+                                                          mp_context=multiprocessing.get_context("spawn"),
+                                                          initializer=_init_worker,
+                                                          initargs=(str(model_path), num_threads)) as pool:
+        for batch in scanner.to_batches():
+            if batch.num_rows == 0:
+                continue
+            chunk = batch.to_pandas()
+            n_seen += len(chunk)
+            if len(existing):
+                chunk = chunk[~pd.MultiIndex.from_frame(chunk[KEY_COLS].astype({"symbol": str})).isin(existing)]
+            if chunk.empty:
+                continue
+
+            output_file = version_dir / f"part-{run_id}-{n_chunks:05d}.parquet"
+            pending.add(pool.submit(_explain_chunk, chunk, str(output_file)))
+            written_files.append(output_file)
+            n_chunks += 1
+            if len(pending) >= 2 * workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                n_written += sum(future.result() for future in done)
+        n_written += sum(future.result() for future in pending)
+        s.record(rows_in=n_seen, rows_out=n_written, bytes_written=file_bytes(written_files))
+
+    logger.info(f"SHAP values: {n_written:,} new rows in {n_chunks} chunks "
+                f"({n_seen - n_written:,} skipped) in {time.perf_counter() - start:.1f}s "
+                f"| {workers} workers x {num_threads} threads")
 
-    logger.success(f"Saved per-row SHAP values to {shap_parquet_path}")
-    logger.success(f"Saved per-row SHAP CSV to {shap_csv_path}")
-    logger.success(f"Saved SHAP summary plot to {shap_plot_path}")
+    # 3. Global summary plot
+    if not any(version_dir.glob("*.parquet")):
+        logger.warning("No SHAP rows for this model version; summary plot skipped")
+        return
+    with step("summary_plot") as s:
+        sample = stratified_sample(version_dir, plot_sample)
+        plot_path.parent.mkdir(parents=True, exist_ok=True)
+        _save_summary_plot(sample, plot_path)
+        s.record(rows_in=len(sample))
+    logger.info(f"Summary plot from {len(sample):,} rows across {sample['symbol'].nunique()} symbols")
+
+    logger.success(f"Saved per-row SHAP values to {version_dir}")
+    logger.success(f"Saved SHAP summary plot to {plot_path}")
     logger.success("FS-Explain: SHAP explainability generation complete")
 
 
 if __name__ == "__main__":
-    generate_shap_for_baseline()
+    parser = argparse.ArgumentParser(description="Chunked, incremental SHAP values for the baseline model")
+    parser.add_argument("--scope", choices=["validation", "all"], default="validation")
+    parser.add_argument("--chunk-rows", type=int, default=50_000)
+    parser.add_argument("--max-workers", type=int, default=4)
+    parser.add_argument("--plot-sample", type=int, default=5_000)
+    args = parser.parse_args()
+    generate_shap_for_baseline(scope=args.scope, chunk_rows=args.chunk_rows,
+                               max_workers=args.max_workers, plot_sample=args.plot_sample)
@@ -0,0 +1,144 @@
+"""
+Export the trained LightGBM baseline to the flat array format (common/flat_tree.py).
+
+    python -m ml.src.export_flat_model
+
+Reads ml/artifacts/lgbm_market_only.pkl, flattens the trees used by
+Booster.predict (best_iteration when set), checks parity against
+Booster.predict on the training features and writes lgbm_market_only_flat.npz.
+The other horizons in the model bundle (lgbm_market_only_horizons.pkl) are
+exported the same way to lgbm_market_only_flat_<horizon>.npz.
+"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from loguru import logger
+
+from common.config.paths import ML_ARTIFACTS_DIR, MODEL_BUNDLE_FILE, TRAIN_DATASET_FILE
+from common.fingerprint import file_sha256
+from common.flat_tree import MISSING_NAN, MISSING_NONE, MISSING_ZERO, FlatTreeModel
+from common.lazy import lazy_import
+from .profiling import profiled_stage, step
+
+joblib = lazy_import("joblib")
+lgb = lazy_import("lightgbm")
+
+MODEL_FILE = ML_ARTIFACTS_DIR / "lgbm_market_only.pkl"
+FLAT_MODEL_FILE = ML_ARTIFACTS_DIR / "lgbm_market_only_flat.npz"
+
+
+
+def horizon_flat_file(horizon: str, flat_file: Path = FLAT_MODEL_FILE) -> Path:
+    """lgbm_market_only_flat.npz for 1d, lgbm_market_only_flat_<horizon>.npz otherwise."""
+    return flat_file if horizon == "1d" else flat_file.with_name(f"{flat_file.stem}_{horizon}.npz")
+
+
+MISSING_TYPES = {"None": MISSING_NONE, "Zero": MISSING_ZERO, "NaN": MISSING_NAN}
+
+
+def flatten_booster(booster: "lgb.Booster", source_sha256: str = "") -> FlatTreeModel:
+    """Node table for the trees Booster.predict uses by default."""
+    dump = booster.dump_model(num_iteration=booster.best_iteration or None)
+    if dump["num_class"] != 1:
+        raise ValueError("Only single-output models can be flattened")
+
+    feature, threshold, left, right, default_left, missing, value, roots = ([] for _ in range(8))
+    max_depth = 0
+
+    for tree in dump["tree_info"]:
+        # Iterative pre-order walk; children are patched once their index is known
+        roots.append(len(feature))
+        stack = [(tree["tree_structure"], None, None, 0)]
+        while stack:
+            node, parent, side, depth = stack.pop()
+            idx = len(feature)
+            if parent is not None:
+                (left if side == "left" else right)[parent] = idx
+
+            if "leaf_value" in node:
+                # Leaves loop onto themselves so traversal can run a fixed number of steps
+                feature.append(0); threshold.append(np.inf); left.append(idx); right.append(idx)
+                default_left.append(True); missing.append(MISSING_NONE); value.append(node["leaf_value"])
+                max_depth = max(max_depth, depth)
+                continue
+
+            if node["decision_type"] != "<=":
+                raise ValueError(f"Unsupported split type {node['decision_type']!r} (categorical)")
+            feature.append(node["split_feature"]); threshold.append(node["threshold"])
+            left.append(-1); right.append(-1)
+            default_left.append(node["default_left"]); missing.append(MISSING_TYPES[node["missing_type"]])
+            value.append(0.0)
+            stack.append((node["right_child"], idx, "right", depth + 1))
+            stack.append((node["left_child"], idx, "left", depth + 1))
+
+    return FlatTreeModel(
+        feature=np.array(feature), threshold=np.array(threshold),
+        left=np.array(left), right=np.array(right),
+        default_left=np.array(default_left), missing_type=np.array(missing),
+        value=np.array(value), roots=np.array(roots),
+        max_depth=max_depth, feature_names=dump["feature_names"],
+        average_output=dump.get("average_output", False),
+        source_sha256=source_sha256,
+    )
+
+
+def verify_parity(booster: "lgb.Booster", flat: FlatTreeModel, X: np.ndarray,
+                  rtol: float = 1e-9, atol: float = 1e-12):
+    """Flat predictions must match Booster.predict (raises AssertionError otherwise)."""
+    expected = booster.predict(X)
+    np.testing.assert_allclose(flat.predict(X), expected, rtol=rtol, atol=atol,
+                               err_msg="flat tree / Booster.predict mismatch")
+    # Single-row path is what /forecast uses
+    for i in range(min(len(X), 50)):
+        np.testing.assert_allclose(flat.predict(X[i]), expected[i:i + 1], rtol=rtol, atol=atol)
+
+
+@profiled_stage("export_flat")
+def export_flat_model(model_file: Path = MODEL_FILE, output_file: Path = FLAT_MODEL_FILE,
+                      bundle_file: Path = MODEL_BUNDLE_FILE) -> FlatTreeModel:
+    """
+    1. Load the pickled Booster
+    2. Flatten its trees into contiguous arrays
+    3. Verify parity on the training features (+ injected NaNs)
+    4. Save .npz next to the model
+    5. Same for the other horizons in the bundle, stamped with the 1d model's hash
+       (the bundle's training run), so serving can match them without the bundle
+    """
+    logger.info("Exporting flat tree model...")
+    booster = joblib.load(model_file)
+    flat = flatten_booster(booster, source_sha256=file_sha256(model_file))
+    logger.info(f" {flat.num_trees} trees, {len(flat.feature):,} nodes, max depth {flat.max_depth}")
+
+    with step("verify_parity") as s:
+        X = pd.read_parquet(TRAIN_DATASET_FILE, columns=flat.feature_names).to_numpy(dtype=np.float64)
+        X_missing = X[:200].copy()
+        X_missing[np.random.default_rng(0).random(X_missing.shape) < 0.2] = np.nan
+        X = np.vstack([X, X_missing])
+        verify_parity(booster, flat, X)
+        s.record(rows_in=len(X))
+    logger.info(f" Parity OK on {len(X):,} rows")
+
+    flat.save(output_file)
+    logger.success(f"Flat model saved: {output_file}")
+
+    # Step 5: per-horizon models, only from a bundle written alongside this model
+    if not Path(bundle_file).exists():
+        return flat
+    bundle = joblib.load(bundle_file)
+    if bundle['model_sha256'] != flat.source_sha256:
+        logger.warning(f"{Path(bundle_file).name} is from another training run; horizon models not exported")
+        return flat
+    with step("export_horizons") as s:
+        for horizon, entry in bundle['horizons'].items():
+            if horizon == "1d":
+                continue
+            horizon_flat = flatten_booster(entry['model'], source_sha256=flat.source_sha256)
+            verify_parity(entry['model'], horizon_flat, X)
+            horizon_flat.save(horizon_flat_file(horizon, output_file))
+            logger.success(f"Flat model saved ({horizon}): {horizon_flat_file(horizon, output_file)}")
+        s.record(rows_in=len(X) * (len(bundle['horizons']) - 1))
+    return flat
+
+
+if __name__ == "__main__":
+    export_flat_model()
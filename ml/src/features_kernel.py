@@ -0,0 +1,172 @@
+"""
+Single-pass NumPy kernel for the core market features.
+
+Works on symbol-sorted arrays: segment boundaries mark where each symbol
+starts, and windowed means/stds come from cumulative sums, so all five
+features are produced in one pass with no per-group Python work.
+Matches features_market.compute_market_features within float32 tolerance.
+"""
+import numpy as np
+import pandas as pd
+
+from .features_market import FEATURE_COLS, MIN_PERIODS, WINDOW
+
+RETURN_HORIZONS = (1, 3, 5)
+
+
+def _segments(codes: np.ndarray):
+    """Segment id, start offset and position-in-segment for each row."""
+    n = len(codes)
+    is_start = np.ones(n, dtype=bool)
+    is_start[1:] = codes[1:] != codes[:-1]
+    starts = np.flatnonzero(is_start)
+    seg_id = np.cumsum(is_start) - 1
+    pos = np.arange(n) - starts[seg_id]
+    return seg_id, starts, pos
+
+
+def _same_value_run(x: np.ndarray, valid: np.ndarray, seg_id: np.ndarray) -> np.ndarray:
+    """
+    Length of the run of identical valid values ending at (or before) each row,
+    reset per segment. pandas reports an exact 0 variance when run >= nobs.
+    """
+    idx = np.flatnonzero(valid)
+    run = np.zeros(len(x), dtype=np.int64)
+    if len(idx) == 0:
+        return run
+
+    xv, sv = x[idx], seg_id[idx]
+    breaks = np.ones(len(idx), dtype=bool)
+    breaks[1:] = (xv[1:] != xv[:-1]) | (sv[1:] != sv[:-1])
+    k = np.arange(len(idx))
+    run_v = k - np.maximum.accumulate(np.where(breaks, k, 0)) + 1
+
+    # Carry the last valid run forward over NaN rows (same segment only)
+    last_valid = np.cumsum(valid) - 1
+    has_prev = last_valid >= 0
+    carried = np.zeros(len(x), dtype=np.int64)
+    carried[has_prev] = run_v[last_valid[has_prev]]
+    same_seg = np.zeros(len(x), dtype=bool)
+    same_seg[has_prev] = sv[last_valid[has_prev]] == seg_id[has_prev]
+    run[same_seg] = carried[same_seg]
+    return run
+
+
+def _rolling_moments(x: np.ndarray, seg_id: np.ndarray, pos: np.ndarray,
+                     window: int, min_periods: int):
+    """
+    Windowed count/mean/std (ddof=1) per row, restricted to the row's segment.
+
+    Values are standardised per segment before the cumulative sums so long
+    histories do not lose precision to cancellation. Returns the standardised
+    mean/std (z units) plus the per-row scale, which is all the z-score needs.
+    """
+    valid = ~np.isnan(x)
+    n_seg = seg_id[-1] + 1
+
+    # Per-segment centre/scale (two-pass for stability)
+    cnt = np.bincount(seg_id, weights=valid, minlength=n_seg)
+    xs = np.where(valid, x, 0.0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mu = np.bincount(seg_id, weights=xs, minlength=n_seg) / cnt
+        dev = np.where(valid, x - mu[seg_id], 0.0)
+        sd = np.sqrt(np.bincount(seg_id, weights=dev * dev, minlength=n_seg) / cnt)
+    sd = np.where((sd > 0) & np.isfinite(sd), sd, 1.0)
+    z = dev / sd[seg_id]
+
+    # Cumulative sums with a leading zero: window sum = c[i + 1] - c[lo]
+    c0 = np.concatenate(([0], np.cumsum(valid, dtype=np.int64)))
+    c1 = np.concatenate(([0.0], np.cumsum(z)))
+    c2 = np.concatenate(([0.0], np.cumsum(z * z)))
+
+    lo = np.arange(1, len(x) + 1) - np.minimum(pos + 1, window)
+    nobs = c0[1:] - c0[lo]
+    s1 = c1[1:] - c1[lo]
+    s2 = c2[1:] - c2[lo]
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_z = s1 / nobs
+        var_z = np.maximum(s2 - s1 * mean_z, 0.0) / (nobs - 1)
+    std_z = np.sqrt(var_z)
+
+    # Runs of identical values: pandas gives the value itself and an exact 0 std,
+    # where the cumulative sums would leave rounding residue in both
+    constant = _same_value_run(x, valid, seg_id) >= nobs
+    mean_z = np.where(constant & valid, z, mean_z)
+    std_z = np.where(constant, 0.0, std_z)
+
+    enough = nobs >= max(min_periods, 2)
+    mean_z = np.where(nobs >= min_periods, mean_z, np.nan)
+    std_z = np.where(enough, std_z, np.nan)
+    return z, mean_z, std_z, sd[seg_id]
+
+
+def market_feature_kernel(codes: np.ndarray, close: np.ndarray, volume: np.ndarray,
+                          window: int = WINDOW, min_periods: int = MIN_PERIODS) -> np.ndarray:
+    """
+    All five features for symbol-sorted bars in one pass.
+    `codes` only needs to change value where the symbol changes.
+    Returns an (n, 5) float32 array in FEATURE_COLS order.
+    """
+    close = np.asarray(close, dtype=np.float64)
+    volume = np.asarray(volume, dtype=np.float64)
+    n = len(close)
+    out = np.full((n, len(FEATURE_COLS)), np.nan, dtype=np.float32)
+    if n == 0:
+        return out
+
+    seg_id, _, pos = _segments(np.asarray(codes))
+
+    # Returns: close / close[t-k] - 1 where t-k is in the same segment
+    ret_1d = np.full(n, np.nan)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for col, k in enumerate(RETURN_HORIZONS):
+            ret = np.full(n, np.nan)
+            ret[k:] = close[k:] / close[:-k] - 1
+            ret[pos < k] = np.nan
+            out[:, col] = ret
+            if k == 1:
+                ret_1d = ret
+
+    # Volatility: windowed std of 1D returns
+    _, _, std_z, scale = _rolling_moments(ret_1d, seg_id, pos, window, min_periods)
+    out[:, 3] = std_z * scale
+
+    # Volume z-score, computed in standardised units to avoid cancellation
+    z, mean_z, std_z, _ = _rolling_moments(volume, seg_id, pos, window, min_periods)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out[:, 4] = (z - mean_z) / std_z
+
+    return out
+
+
+def compute_market_features_fast(df: pd.DataFrame, chunk_rows: int = 2_000_000) -> pd.DataFrame:
+    """Drop-in for compute_market_features: same columns/order, float32 features."""
+    df = df[['symbol', 'timestamp', 'close', 'volume']]
+
+    # Kernel needs bars grouped by symbol and time-ordered within each group;
+    # output order matches the reference (sorted by symbol, timestamp)
+    codes, uniques = pd.factorize(df['symbol'])
+    ts = df['timestamp'].to_numpy(dtype='datetime64[ns]') if df['timestamp'].dt.tz is None \
+        else df['timestamp'].dt.tz_convert('UTC').dt.tz_localize(None).to_numpy()
+    same = codes[1:] == codes[:-1]
+    grouped = not (np.diff(codes) < 0).any() and not (same & (ts[1:] < ts[:-1])).any()
+    if not grouped or not pd.Index(uniques).is_monotonic_increasing:
+        df = df.sort_values(['symbol', 'timestamp'], kind='stable')
+        codes, _ = pd.factorize(df['symbol'])
+
+    close = df['close'].to_numpy()
+    volume = df['volume'].to_numpy()
+    values = np.empty((len(df), len(FEATURE_COLS)), dtype=np.float32)
+
+    # Chunk on symbol boundaries to cap kernel scratch memory on huge universes
+    _, starts, _ = _segments(codes)
+    cuts = np.unique(starts[np.searchsorted(starts, np.arange(0, len(df), chunk_rows), side="right") - 1])
+    bounds = np.append(cuts, len(df))
+    for lo, hi in zip(bounds[:-1], bounds[1:]):
+        values[lo:hi] = market_feature_kernel(codes[lo:hi], close[lo:hi], volume[lo:hi])
+
+    out = df[['symbol', 'timestamp']].reset_index(drop=True)
+    for i, col in enumerate(FEATURE_COLS):
+        out[col] = values[:, i]
+    return out
@@ -7,61 +7,103 @@ import pandas as pd
 import numpy as np
 from pathlib import Path
 from loguru import logger
-from common.config.paths import PROCESSED_MARKET_DIR, PROCESSED_FEATURES_DIR
+from common.config.paths import PROCESSED_MARKET_DIR, PROCESSED_FEATURES_DIR, ensure_data_dirs
+from .processing import load_daily_ohlcv
+from .profiling import file_bytes, profiled_stage, step
+from .schemas import feature_schema, write_parquet
 
-def calculate_market_features():
+FEATURE_COLS = ['ret_1d', 'ret_3d', 'ret_5d', 'vol_20d', 'vol_zscore']
+FEATURES_SCHEMA = feature_schema(FEATURE_COLS)
+WINDOW = 20
+MIN_PERIODS = 10
+
+
+def compute_market_features(df: pd.DataFrame) -> pd.DataFrame:
     """
-    Features:
-    - ret_1d, ret_3d, ret_5d: Returns over 1/3/5 days
-    - vol_20d: 20-day rolling volatility  
-    - vol_zscore: Volume vs 20-day rolling mean/std
+    Batch feature computation over full history (reference implementation).
+    Input needs symbol, timestamp, close, volume; output is sorted by symbol/timestamp.
     """
+    df = df.copy()
+
+    # Returns (1D, 3D, 5D)
+    df['ret_1d'] = df.groupby('symbol', observed=True)['close'].pct_change(1)
+    df['ret_3d'] = df.groupby('symbol', observed=True)['close'].pct_change(3)  
+    df['ret_5d'] = df.groupby('symbol', observed=True)['close'].pct_change(5)
     
-    logger.info("🔄 FS-10: Calculating core market features...")
-    
-    # Step 1: Load clean OHLCV data
-    input_file = PROCESSED_MARKET_DIR / "daily_ohlcv.parquet"
-    df = pd.read_parquet(input_file)
-    logger.info(f"📊 Loaded {len(df):,} rows from {input_file}")
-    
-    # Step 2: Calculate returns (1D, 3D, 5D)
-    df['ret_1d'] = df.groupby('symbol')['close'].pct_change(1)
-    df['ret_3d'] = df.groupby('symbol')['close'].pct_change(3)  
-    df['ret_5d'] = df.groupby('symbol')['close'].pct_change(5)
-    
-    # Step 3: 20D Volatility (std dev of daily returns)
-    df['vol_20d'] = (df.groupby('symbol')['ret_1d'].rolling(window=20, min_periods=10)
+    # 20D Volatility (std dev of daily returns)
+    df['vol_20d'] = (df.groupby('symbol', observed=True)['ret_1d'].rolling(window=WINDOW, min_periods=MIN_PERIODS)
                     .std()
                     .reset_index(0, drop=True))
     
-    # Step 4: Volume stats for Z-Score
-    df['vol_mean_20d'] = (df.groupby('symbol')['volume']
-                         .rolling(window=20, min_periods=10)
+    # Volume stats for Z-Score
+    df['vol_mean_20d'] = (df.groupby('symbol', observed=True)['volume']
+                         .rolling(window=WINDOW, min_periods=MIN_PERIODS)
                          .mean()
                          .reset_index(0, drop=True))
     
-    df['vol_std_20d'] = (df.groupby('symbol')['volume']
-                        .rolling(window=20, min_periods=10)
+    df['vol_std_20d'] = (df.groupby('symbol', observed=True)['volume']
+                        .rolling(window=WINDOW, min_periods=MIN_PERIODS)
                         .std()
                         .reset_index(0, drop=True))
     
-    # Step 5: Volume Z-Score
+    # Volume Z-Score
     df['vol_zscore'] = (df['volume'] - df['vol_mean_20d']) / df['vol_std_20d']
     
-    # Step 6: Select FINAL features + sort
-    feature_cols = ['symbol', 'timestamp', 'ret_1d', 'ret_3d', 'ret_5d', 'vol_20d', 'vol_zscore']
-    features_df = df[feature_cols].sort_values(['symbol', 'timestamp']).reset_index(drop=True)
+    # Select FINAL features + sort
+    feature_cols = ['symbol', 'timestamp'] + FEATURE_COLS
+    return df[feature_cols].sort_values(['symbol', 'timestamp']).reset_index(drop=True)
+
+
+@profiled_stage("features")
+def calculate_market_features(engine: str = "numpy"):
+    """
+    engine: "numpy" (single-pass kernel, float32 output) or "pandas" (reference).
+
+    Features:
+    - ret_1d, ret_3d, ret_5d: Returns over 1/3/5 days
+    - vol_20d: 20-day rolling volatility  
+    - vol_zscore: Volume vs 20-day rolling mean/std
+    """
+    
+    logger.info("🔄 FS-10: Calculating core market features...")
+    ensure_data_dirs()
+    
+    # Step 1: Load clean OHLCV data (partitioned table when present)
+    with step("load_ohlcv") as s:
+        df = load_daily_ohlcv(columns=['symbol', 'timestamp', 'close', 'volume'])
+        s.record(rows_out=len(df))
+    logger.info(f"📊 Loaded {len(df):,} rows from {PROCESSED_MARKET_DIR}")
+    
+    # Steps 2-6: Returns, volatility, volume z-score
+    with step("compute") as s:
+        if engine == "numpy":
+            from .features_kernel import compute_market_features_fast
+            features_df = compute_market_features_fast(df)
+        elif engine == "pandas":
+            features_df = compute_market_features(df)
+        else:
+            raise ValueError(f"Unknown feature engine: {engine}")
+        s.record(rows_in=len(df), rows_out=len(features_df))
+    logger.info(f"⚙️  Features computed with {engine} engine")
     
     # Step 7: Save Parquet (ML fast format)
     output_parquet = PROCESSED_FEATURES_DIR / "market.parquet"
-    features_df.to_parquet(output_parquet, index=False)
+    # Symbol-sorted, modest row groups → min/max stats let filtered scans skip most of the file;
+    # tmp + rename so the API's hot-reloading feature store never sees a partial file
+    tmp_parquet = output_parquet.with_suffix(".parquet.tmp")
+    with step("write_parquet") as s:
+        write_parquet(features_df, tmp_parquet, FEATURES_SCHEMA, row_group_size=64_000)
+        tmp_parquet.replace(output_parquet)
+        s.record(rows_in=len(features_df), bytes_written=file_bytes([output_parquet]))
     
     # Step 8: Save CSV (Excel friendly)
     output_csv = PROCESSED_FEATURES_DIR / "market.csv"
-    features_df.to_csv(output_csv, index=False)
+    with step("write_csv") as s:
+        features_df.to_csv(output_csv, index=False)
+        s.record(rows_in=len(features_df), bytes_written=file_bytes([output_csv]))
     
     # Step 9: Summary
-    non_null_features = features_df[['ret_1d', 'ret_3d', 'ret_5d', 'vol_20d', 'vol_zscore']].notna().sum()
+    non_null_features = features_df[FEATURE_COLS].notna().sum()
     
     logger.success("🎉 FS-10 COMPLETE!")
     logger.success(f"   📊 {len(features_df):,} rows, {features_df['symbol'].nunique()} symbols")
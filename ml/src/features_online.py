@@ -0,0 +1,243 @@
+"""
+Online (streaming) market features.
+
+Keeps per-symbol rolling state so each new bar updates ret_1d/3d/5d, vol_20d
+and vol_zscore in O(1), without touching history. Output matches the batch
+path in features_market.compute_market_features (see verify_parity).
+
+Usage:
+    engine = OnlineFeatureEngine()
+    engine.warm_up(history_df)                 # or OnlineFeatureEngine.load(path)
+    feats = engine.update("AAPL", ts, close, volume)
+    engine.save(path)
+"""
+import json
+import math
+from collections import deque
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from .features_market import FEATURE_COLS, MIN_PERIODS, WINDOW, compute_market_features
+
+RETURN_HORIZONS = (1, 3, 5)
+
+
+class RollingWindow:
+    """
+    Ring buffer of the last `size` values with windowed mean/variance.
+
+    Add/remove updates (Welford) mirror pandas' rolling var/mean, including
+    NaN skipping and the exact mean / zero variance for runs of identical values.
+    """
+
+    __slots__ = ("size", "values", "head", "pushed", "nobs", "mean", "m2", "prev", "same_run")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.values = [math.nan] * size
+        self.head = 0
+        self.pushed = 0
+        self.nobs = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.prev = math.nan
+        self.same_run = 0
+
+    def push(self, x: float):
+        # Evict the value falling out of the window
+        if self.pushed >= self.size:
+            old = self.values[self.head]
+            if old == old:
+                self.nobs -= 1
+                if self.nobs:
+                    delta = old - self.mean
+                    self.mean -= delta / self.nobs
+                    self.m2 -= ((self.nobs + 1) * delta * delta) / self.nobs
+                else:
+                    self.mean = 0.0
+                    self.m2 = 0.0
+
+        # Add the new value (NaN counts as missing)
+        if x == x:
+            self.nobs += 1
+            delta = x - self.mean
+            self.mean += delta / self.nobs
+            self.m2 += delta * (x - self.mean)
+            self.same_run = self.same_run + 1 if x == self.prev else 1
+            self.prev = x
+
+        self.values[self.head] = x
+        self.head = (self.head + 1) % self.size
+        self.pushed += 1
+
+    def window_mean(self, min_periods: int) -> float:
+        if self.nobs < min_periods:
+            return math.nan
+        # pandas returns the repeated value itself, free of add/remove residue
+        return self.prev if self.same_run >= self.nobs else self.mean
+
+    def window_std(self, min_periods: int) -> float:
+        if self.nobs < max(min_periods, 2):
+            return math.nan
+        if self.same_run >= self.nobs:
+            return 0.0
+        return math.sqrt(max(self.m2, 0.0) / (self.nobs - 1))
+
+    def to_dict(self) -> dict:
+        return {slot: getattr(self, slot) for slot in self.__slots__}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "RollingWindow":
+        window = cls(state["size"])
+        for slot in cls.__slots__:
+            setattr(window, slot, state[slot])
+        return window
+
+
+class SymbolState:
+    """Rolling state for one symbol: recent closes + return/volume windows."""
+
+    __slots__ = ("closes", "returns", "volumes", "last_timestamp")
+
+    def __init__(self, window: int = WINDOW):
+        self.closes = deque(maxlen=max(RETURN_HORIZONS) + 1)
+        self.returns = RollingWindow(window)
+        self.volumes = RollingWindow(window)
+        self.last_timestamp: Optional[pd.Timestamp] = None
+
+
+class OnlineFeatureEngine:
+    """Per-symbol O(1) feature updates with checkpoint/restore."""
+
+    def __init__(self, window: int = WINDOW, min_periods: int = MIN_PERIODS):
+        self.window = window
+        self.min_periods = min_periods
+        self.states: Dict[str, SymbolState] = {}
+
+    def update(self, symbol: str, timestamp, close: float, volume: float) -> Dict[str, float]:
+        """Ingest one bar and return its features. Bars must arrive in time order per symbol."""
+        timestamp = pd.Timestamp(timestamp)
+        state = self.states.get(symbol)
+        if state is None:
+            state = self.states[symbol] = SymbolState(self.window)
+        elif timestamp <= state.last_timestamp:
+            raise ValueError(
+                f"{symbol}: bar at {timestamp} is not after last bar {state.last_timestamp}"
+            )
+
+        # Returns over 1/3/5 bars (pct_change semantics)
+        state.closes.append(float(close))
+        features = {}
+        for horizon in RETURN_HORIZONS:
+            if len(state.closes) > horizon:
+                features[f"ret_{horizon}d"] = state.closes[-1] / state.closes[-1 - horizon] - 1
+            else:
+                features[f"ret_{horizon}d"] = math.nan
+
+        # Volatility: rolling std of 1D returns
+        state.returns.push(features["ret_1d"])
+        features["vol_20d"] = state.returns.window_std(self.min_periods)
+
+        # Volume z-score vs rolling mean/std
+        volume = float(volume)
+        state.volumes.push(volume)
+        mean = state.volumes.window_mean(self.min_periods)
+        std = state.volumes.window_std(self.min_periods)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            features["vol_zscore"] = float(np.float64(volume - mean) / np.float64(std))
+
+        state.last_timestamp = timestamp
+        return features
+
+    def warm_up(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Replay history (symbol, timestamp, close, volume) and return per-bar features."""
+        df = df.sort_values(["symbol", "timestamp"], kind="stable")
+        rows = []
+        for symbol, timestamp, close, volume in df[["symbol", "timestamp", "close", "volume"]].itertuples(index=False):
+            rows.append(self.update(symbol, timestamp, close, volume))
+        features = pd.DataFrame(rows, columns=FEATURE_COLS, index=df.index)
+        return pd.concat([df[["symbol", "timestamp"]], features], axis=1).reset_index(drop=True)
+
+    # ---- checkpoint / restore ----
+
+    def checkpoint(self) -> dict:
+        return {
+            "window": self.window,
+            "min_periods": self.min_periods,
+            "symbols": {
+                symbol: {
+                    "closes": list(state.closes),
+                    "returns": state.returns.to_dict(),
+                    "volumes": state.volumes.to_dict(),
+                    "last_timestamp": state.last_timestamp.isoformat(),
+                }
+                for symbol, state in self.states.items()
+            },
+        }
+
+    @classmethod
+    def restore(cls, checkpoint: dict) -> "OnlineFeatureEngine":
+        engine = cls(window=checkpoint["window"], min_periods=checkpoint["min_periods"])
+        for symbol, saved in checkpoint["symbols"].items():
+            state = SymbolState(engine.window)
+            state.closes.extend(saved["closes"])
+            state.returns = RollingWindow.from_dict(saved["returns"])
+            state.volumes = RollingWindow.from_dict(saved["volumes"])
+            state.last_timestamp = pd.Timestamp(saved["last_timestamp"])
+            engine.states[symbol] = state
+        return engine
+
+    def save(self, path: Path):
+        """Atomic JSON checkpoint (NaN allowed by Python's json)."""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.checkpoint(), f)
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "OnlineFeatureEngine":
+        with open(path) as f:
+            return cls.restore(json.load(f))
+
+
+def verify_parity(df: pd.DataFrame, rtol: float = 1e-9, atol: float = 1e-12, split: float = 0.7):
+    """
+    Online path must reproduce the batch features bar-for-bar.
+
+    Warms up on the first `split` of each symbol's bars, round-trips a
+    checkpoint, streams the rest, and compares against compute_market_features.
+    Raises AssertionError on any mismatch.
+    """
+    df = df.sort_values(["symbol", "timestamp"], kind="stable").reset_index(drop=True)
+    batch = compute_market_features(df)
+
+    position = df.groupby("symbol", observed=True).cumcount()
+    cutoff = (df.groupby("symbol", observed=True)["symbol"].transform("size") * split).astype(int)
+    head, tail = df[position < cutoff], df[position >= cutoff]
+
+    engine = OnlineFeatureEngine()
+    online_head = engine.warm_up(head)
+    engine = OnlineFeatureEngine.restore(json.loads(json.dumps(engine.checkpoint())))
+    online_tail = engine.warm_up(tail)
+
+    online = (pd.concat([online_head, online_tail])
+                .sort_values(["symbol", "timestamp"], kind="stable")
+                .reset_index(drop=True))
+
+    for col in FEATURE_COLS:
+        expected = batch[col].to_numpy(dtype="float64")
+        actual = online[col].to_numpy(dtype="float64")
+        np.testing.assert_allclose(actual, expected, rtol=rtol, atol=atol, equal_nan=True,
+                                   err_msg=f"online/batch mismatch in {col}")
+    logger.success(f"Online/batch parity OK: {len(df):,} bars, {df['symbol'].nunique()} symbols")
+
+
+if __name__ == "__main__":
+    from .processing import load_daily_ohlcv
+    verify_parity(load_daily_ohlcv(columns=["symbol", "timestamp", "close", "volume"]))
@@ -1,16 +1,21 @@
+import json
 import yaml
 import pandas as pd
-import yfinance as yf
-from pathlib import Path
-from common.config.paths import RAW_MARKET_DIR, RAW_METADATA_FILE
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from common.config.paths import ML_CONFIG_FILE, RAW_MARKET_DIR, RAW_MARKET_WATERMARKS_FILE, RAW_METADATA_FILE, ensure_data_dirs
 from datetime import datetime
 from decimal import Decimal
+from typing import List, Optional
 from loguru import logger
-from .schemas import MarketRow, CompanyMetadata  # Your schemas!
+from .market_sources import MarketDataSource, YFinanceSource, build_source
+from .schemas import OHLCV_SCHEMA, PRICE_COLUMNS, CompanyMetadata, validate_market_frame, write_parquet  # Your schemas!
+from .profiling import profiled_stage, step
+
+VALUE_COLUMNS = [*PRICE_COLUMNS, "volume"]   # compared to spot restatements in the overlap window
 
 
 def load_config():
-    with open("ml/config.yaml") as f:
+    with open(ML_CONFIG_FILE) as f:
         return yaml.safe_load(f)
 
 
@@ -111,54 +116,197 @@ def ingest_metadata():
         logger.success(f"✅ Metadata saved: {len(df)} companies → {path}")
 
 
-def fetch_and_save(symbol: str, start_date: str, data_dir: Path):
-    """Fetch OHLCV, validate schema, save CSV."""
-    logger.info(f"Fetching {symbol} from {start_date}")
+def load_watermarks() -> dict:
+    """Per-symbol high-water marks (ISO UTC timestamp of the last stored bar)."""
+    if not RAW_MARKET_WATERMARKS_FILE.exists():
+        return {}
+    with open(RAW_MARKET_WATERMARKS_FILE) as f:
+        return json.load(f)
+
+
+def save_watermarks(watermarks: dict):
+    """Atomically persist watermarks (write temp file, then rename)."""
+    RAW_MARKET_WATERMARKS_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = RAW_MARKET_WATERMARKS_FILE.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(watermarks, f, indent=2, sort_keys=True)
+    tmp_path.replace(RAW_MARKET_WATERMARKS_FILE)
+
+
+def _bootstrap_watermark(symbol: str):
+    """Derive a watermark from files already on disk (first incremental run)."""
+    symbol_dir = RAW_MARKET_DIR / symbol
+    latest = None
+    for path in sorted(symbol_dir.glob("*")):
+        if path.suffix == ".parquet":
+            ts = pd.read_parquet(path, columns=["timestamp"])["timestamp"]
+        elif path.suffix == ".csv":
+            ts = pd.read_csv(path, usecols=["timestamp"])["timestamp"]
+        else:
+            continue
+        file_max = pd.to_datetime(ts, utc=True).max()
+        if pd.notna(file_max) and (latest is None or file_max > latest):
+            latest = file_max
+    return latest
+
+
+def _stored_bars(symbol: str, since: pd.Timestamp) -> pd.DataFrame:
+    """Bars already on disk from `since` on, by timestamp; the newest ingest wins, as in processing."""
+    frames = []
+    for path in sorted((RAW_MARKET_DIR / symbol).glob("*")):
+        if path.suffix == ".parquet":
+            df = pd.read_parquet(path, columns=["timestamp", *VALUE_COLUMNS])
+        elif path.suffix == ".csv":
+            df = pd.read_csv(path, usecols=["timestamp", *VALUE_COLUMNS])
+        else:
+            continue
+        df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+        frames.append(df[df["timestamp"] >= since])
+    if not frames:
+        return pd.DataFrame(columns=VALUE_COLUMNS, index=pd.DatetimeIndex([], tz="UTC", name="timestamp"))
+    stored = pd.concat(frames, ignore_index=True).drop_duplicates("timestamp", keep="last")
+    return stored.set_index("timestamp")
+
+
+def _changed(fetched: pd.DataFrame, stored: pd.DataFrame) -> bool:
+    """True when a fetched bar is missing on disk or differs from the stored one (a restatement)."""
+    fetched = fetched.set_index(pd.to_datetime(fetched["timestamp"], utc=True))[VALUE_COLUMNS]
+    if not fetched.index.isin(stored.index).all():
+        return True
+    stored = stored.loc[fetched.index, VALUE_COLUMNS]
+    return bool(fetched.astype("float64").ne(stored.astype("float64")).any(axis=None))
+
+
+def fetch_and_save(symbol: str, start_date: str, overlap_days: int = 5,
+                   watermarks: Optional[dict] = None, source: Optional[MarketDataSource] = None):
+    """
+    Incrementally fetch OHLCV, validate schema, append a Parquet part.
+
+    Only bars after the symbol's high-water mark (minus `overlap_days` to pick
+    up restatements) are requested. New or restated rows land in
+    data/raw/market/<SYMBOL>/<YYYYMMDDTHHMMSS>.parquet; processing dedups the
+    overlap (latest ingest wins).
+
+    Returns the symbol's new watermark (None when no valid data came back);
+    the caller owns persisting it.
+    """
+    if watermarks is None:
+        watermarks = load_watermarks()
+    if source is None:
+        source = YFinanceSource()
 
-    # Get data (simple!)
-    ticker = yf.Ticker(symbol)
-    df = ticker.history(start=start_date, interval='1d')
+    # 1. Resolve fetch window from the high-water mark
+    watermark = watermarks.get(symbol)
+    watermark = pd.Timestamp(watermark) if watermark else _bootstrap_watermark(symbol)
+
+    if watermark is None:
+        fetch_start = start_date
+    else:
+        fetch_start = (watermark - pd.Timedelta(days=overlap_days)).strftime("%Y-%m-%d")
+    logger.info(f"Fetching {symbol} from {fetch_start} via {source.name} (watermark: {watermark})")
+
+    # 2. Get data
+    df = source.fetch(symbol, fetch_start)
 
     if df.empty:
         logger.error(f"No data for {symbol}")
         return
 
-    # Convert to your schema format
-    df.reset_index(inplace=True)
-    df = df.rename(columns={
-        'Date': 'timestamp', 'Open': 'open', 'High': 'high',
-        'Low': 'low', 'Close': 'close', 'Volume': 'volume'
-    })
     df['symbol'] = symbol
     df['ingest_date'] = datetime.now().date()
 
-    # Validate EVERY row with your schema
-    validated_rows = []
-    for _, row in df.iterrows():
-        try:
-            market_row = MarketRow(**row.to_dict())
-            validated_rows.append(market_row.model_dump())
-        except Exception as e:
-            logger.warning(f"Skipping invalid row: {e}")
+    # Validate all rows at once (same rules as MarketRow, column-wise)
+    validated_df, rejected_df = validate_market_frame(df)
+    if not rejected_df.empty:
+        reasons = rejected_df['reason'].value_counts().to_dict()
+        logger.warning(f"Skipping {len(rejected_df)} invalid rows for {symbol}: {reasons}")
 
-    if not validated_rows:
+    if validated_df.empty:
         return
 
-    validated_df = pd.DataFrame(validated_rows)
+    # 3. Nothing past the watermark → overlap only; write it only if it restates stored bars
+    timestamps = pd.to_datetime(validated_df['timestamp'], utc=True)
+    latest = timestamps.max()
+    if watermark is not None and latest <= watermark:
+        if not _changed(validated_df, _stored_bars(symbol, timestamps.min())):
+            logger.info(f"{symbol} up to date (latest bar {latest})")
+            return watermark
+        logger.info(f"{symbol}: restated bars in the overlap window")
+        latest = watermark
 
-    # Save partitioned (symbol/date)
+    # 4. Append a new part to the symbol partition
     symbol_dir = RAW_MARKET_DIR / symbol
     symbol_dir.mkdir(parents=True, exist_ok=True)
-    date_str = datetime.now().strftime("%Y%m%d")
-    path = symbol_dir / f"{date_str}.csv"
+    part_name = datetime.now().strftime("%Y%m%dT%H%M%S")
+    path = symbol_dir / f"{part_name}.parquet"
+
+    write_parquet(validated_df, path, OHLCV_SCHEMA)
+    logger.success(f"Appended {len(validated_df)} rows to {path}")
+
+    return latest
+
+
+@profiled_stage("ingestion")
+def run_ingestion(symbols: List[str], start_date: str, source: MarketDataSource,
+                  max_workers: int = 8, overlap_days: int = 5,
+                  checkpoint_every: int = 100) -> dict:
+    """
+    Fetch many symbols concurrently with per-symbol failure isolation.
+
+    Rate limiting and retries live in the source (see RetryingSource). Only
+    this thread touches the watermark dict; it is flushed to disk every
+    `checkpoint_every` completed symbols and at the end.
+    """
+    logger.info(f"Ingesting {len(symbols)} symbols via {source.name} ({max_workers} workers)")
+    ensure_data_dirs()
+
+    watermarks = load_watermarks()
+    summary = {"updated": [], "up_to_date": [], "no_data": [], "failed": {}}
+
+    with step("fetch") as s, ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(fetch_and_save, symbol, start_date, overlap_days, watermarks, source): symbol
+            for symbol in symbols
+        }
+        for done, future in enumerate(as_completed(futures), start=1):
+            symbol = futures[future]
+            previous = watermarks.get(symbol)
+            try:
+                latest = future.result()
+            except Exception as e:
+                logger.error(f"{symbol}: ingestion failed: {e}")
+                summary["failed"][symbol] = str(e)
+                continue
+
+            if latest is None:
+                summary["no_data"].append(symbol)
+            elif previous is not None and latest.isoformat() == previous:
+                summary["up_to_date"].append(symbol)
+            else:
+                watermarks[symbol] = latest.isoformat()
+                summary["updated"].append(symbol)
+
+            if done % checkpoint_every == 0:
+                save_watermarks(watermarks)
+                logger.info(f"Progress: {done}/{len(symbols)} symbols")
+        s.record(rows_in=len(symbols), rows_out=len(summary["updated"]))
 
-    validated_df.to_csv(path, index=False)  # CSV output [web:98]
-    logger.success(f"Saved {len(validated_df)} rows to {path}")
+    save_watermarks(watermarks)
+    logger.success(
+        f"Ingestion done: {len(summary['updated'])} updated, {len(summary['up_to_date'])} up to date, "
+        f"{len(summary['no_data'])} no data, {len(summary['failed'])} failed"
+    )
+    return summary
 
 
 if __name__ == "__main__":
     config = load_config()
-    data_dir = RAW_MARKET_DIR.parent
-    for symbol in config['symbols']:
-        fetch_and_save(symbol, config['start_date'], data_dir)
+    ingestion_cfg = config.get('ingestion', {})
+    run_ingestion(
+        config['symbols'],
+        config['start_date'],
+        source=build_source(config),
+        max_workers=ingestion_cfg.get('max_workers', 8),
+        overlap_days=config.get('overlap_days', 5),
+    )
     ingest_metadata()  # Always ingest metadata
@@ -0,0 +1,153 @@
+"""
+Market data sources for ingestion.
+
+MarketDataSource is the seam between the ingestion runner and wherever bars
+come from: yfinance in production, a local directory in the raw layout for
+offline runs/tests. RetryingSource wraps any source with rate limiting and
+exponential-backoff retries.
+"""
+import random
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Optional
+
+import pandas as pd
+from loguru import logger
+
+from common.lazy import lazy_import
+
+yf = lazy_import("yfinance")   # network client: only the yfinance source needs it
+
+
+class MarketDataSource(ABC):
+    """Fetches daily OHLCV bars for one symbol."""
+
+    name = "base"
+
+    @abstractmethod
+    def fetch(self, symbol: str, start: str) -> pd.DataFrame:
+        """
+        Return bars from `start` (YYYY-MM-DD) onwards with columns
+        timestamp, open, high, low, close, volume. Empty frame = no data.
+        """
+
+
+class YFinanceSource(MarketDataSource):
+    """Yahoo Finance via yfinance (one HTTP round-trip per symbol)."""
+
+    name = "yfinance"
+
+    def __init__(self, interval: str = "1d"):
+        self.interval = interval
+
+    def fetch(self, symbol: str, start: str) -> pd.DataFrame:
+        ticker = yf.Ticker(symbol)
+        df = ticker.history(start=start, interval=self.interval)
+        if df.empty:
+            return df
+
+        df = df.reset_index().rename(columns={
+            'Date': 'timestamp', 'Open': 'open', 'High': 'high',
+            'Low': 'low', 'Close': 'close', 'Volume': 'volume'
+        })
+        return df[['timestamp', 'open', 'high', 'low', 'close', 'volume']]
+
+
+class LocalFileSource(MarketDataSource):
+    """Replays bars from a directory in the raw layout: <root>/<SYMBOL>/*.csv|*.parquet."""
+
+    name = "local"
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+
+    def fetch(self, symbol: str, start: str) -> pd.DataFrame:
+        files = sorted([*(self.root / symbol).glob("*.csv"), *(self.root / symbol).glob("*.parquet")])
+        if not files:
+            return pd.DataFrame()
+
+        df = pd.concat(
+            [pd.read_parquet(f) if f.suffix == ".parquet" else pd.read_csv(f) for f in files],
+            ignore_index=True,
+        )
+        df['timestamp'] = pd.to_datetime(df['timestamp'], utc=True)
+        df = df[df['timestamp'] >= pd.Timestamp(start, tz="UTC")]
+        df = (df.sort_values('timestamp', kind='stable')
+                .drop_duplicates(subset=['timestamp'], keep='last')
+                .reset_index(drop=True))
+        return df[['timestamp', 'open', 'high', 'low', 'close', 'volume']]
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens/sec, bursts up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until one token is available."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class RetryingSource(MarketDataSource):
+    """Rate-limits and retries another source with exponential backoff + jitter."""
+
+    def __init__(self, source: MarketDataSource, limiter: Optional[TokenBucket] = None,
+                 max_retries: int = 3, backoff_base: float = 0.5, backoff_max: float = 30.0):
+        self.source = source
+        self.name = source.name
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def fetch(self, symbol: str, start: str) -> pd.DataFrame:
+        for attempt in range(self.max_retries + 1):
+            if self.limiter is not None:
+                self.limiter.acquire()
+            try:
+                return self.source.fetch(symbol, start)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+                delay *= random.uniform(0.5, 1.5)
+                logger.warning(f"{symbol}: fetch failed ({e}), retry {attempt + 1}/{self.max_retries} in {delay:.2f}s")
+                time.sleep(delay)
+
+
+def build_source(config: dict) -> MarketDataSource:
+    """Source from the `ingestion` block of ml/config.yaml, wrapped with limits/retries."""
+    settings = config.get('ingestion', {})
+    kind = settings.get('source', 'yfinance')
+
+    if kind == 'yfinance':
+        source = YFinanceSource(interval=config.get('freq', '1d'))
+    elif kind == 'local':
+        source = LocalFileSource(Path(settings['local_dir']))
+    else:
+        raise ValueError(f"Unknown market data source: {kind}")
+
+    return RetryingSource(
+        source,
+        limiter=TokenBucket(settings.get('rate_per_sec', 5.0)),
+        max_retries=settings.get('max_retries', 3),
+        backoff_base=settings.get('backoff_base', 0.5),
+    )
@@ -1,119 +1,227 @@
+import os
 import pandas as pd
 import numpy as np
-import lightgbm as lgb
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from sklearn.metrics import mean_squared_error, mean_absolute_error
-from sklearn.model_selection import train_test_split
-import joblib
+from typing import List, Optional
+import json
 from loguru import logger
-from common.config.paths import PROCESSED_FEATURES_DIR
+from common.config.paths import DRIFT_REFERENCE_FILE, ML_ARTIFACTS_DIR, MODEL_BUNDLE_FILE, TRAIN_DATASET_FILE
+from common.drift import build_reference, save_reference
+from common.fingerprint import file_sha256
+from common.lazy import lazy_import
+from .datasets import HORIZONS, TARGET_COLS
+from .profiling import file_bytes, profiled_stage, step
+from .schemas import feature_schema, read_parquet
 
-def train_lightgbm_baseline():
-    
-    logger.info("Training LightGBM baseline...")
+# Heavy: loaded on first use, so importing the constants below (backtest, tuning) stays cheap
+lgb = lazy_import("lightgbm")
+joblib = lazy_import("joblib")
+sk_metrics = lazy_import("sklearn.metrics")
+
+FEATURE_COLS = ['ret_1d', 'ret_3d', 'ret_5d', 'vol_20d', 'vol_zscore']
+TARGET_COL = TARGET_COLS['1d']
+DATASET_SCHEMA = feature_schema(FEATURE_COLS, list(TARGET_COLS.values()))
+
+# LightGBM parameters (stock prediction optimized) - shared with the backtester
+LGBM_PARAMS = {
+    'objective': 'regression',           # Predict continuous returns
+    'metric': 'rmse',                    # Optimize root mean squared error
+    'boosting_type': 'gbdt',             # Gradient boosting decision tree
+    'num_leaves': 31,                    # Max leaves per tree
+    'learning_rate': 0.05,               # Step size (slow = stable)
+    'feature_fraction': 0.9,             # Use 90% features per tree
+    'bagging_fraction': 0.8,             # Use 80% rows per tree
+    'bagging_freq': 5,                   # Re-bag every 5 trees
+    'verbose': -1,                       # Suppress LightGBM logs
+    'random_state': 42,                  # Reproducible results
+    'device': 'cpu'                      # Use CPU (GPU optional)
+}
+NUM_BOOST_ROUND = 1000                   # Max 1000 trees
+EARLY_STOPPING_ROUNDS = 50               # Stop if no improvement 50 rounds
+BEST_PARAMS_FILE = ML_ARTIFACTS_DIR / "lgbm_market_only_best_params.json"  # written by tuning.py
+MODEL_FILE = ML_ARTIFACTS_DIR / "lgbm_market_only.pkl"   # 1d model (flat export, SHAP job, /explain)
+
+
+def _horizon_view(base: "lgb.Dataset", target: pd.Series) -> "lgb.Dataset":
+    """Rows of a constructed Dataset that have this horizon's target, relabelled (binned rows are copied, not re-binned)."""
+    rows = np.flatnonzero(target.notna().to_numpy())
+    view = base.subset(rows).construct()
+    view.set_label(target.to_numpy()[rows])
+    return view
+
+
+def _label_end(df: pd.DataFrame, ahead) -> pd.Series:
+    """When each row's target is realised: `ahead` rows later in its symbol, or t + a calendar offset."""
+    if isinstance(ahead, int):
+        return df.groupby('symbol', observed=True)['timestamp'].shift(-ahead)
+    return df['timestamp'] + ahead
+
+
+def _fit_horizon(horizon: str, params: dict, train_set: "lgb.Dataset", valid_set: "lgb.Dataset") -> "lgb.Booster":
+    return lgb.train(
+        params,
+        train_set,
+        num_boost_round=NUM_BOOST_ROUND,
+        valid_sets=[valid_set],                  # Validate on val set
+        valid_names=[f'valid_{horizon}'],
+        callbacks=[lgb.early_stopping(EARLY_STOPPING_ROUNDS),
+                   lgb.log_evaluation(100)]      # Log every 100 rounds
+    )
+
+
+@profiled_stage("train")
+def train_lightgbm_baseline(params: dict = None, tuned: bool = False,
+                            horizons: Optional[List[str]] = None, max_workers: int = 3):
+    """
+    params: overrides on top of LGBM_PARAMS.
+    tuned: start from the best config found by `python -m ml.src.tuning`.
+    horizons: which of HORIZONS get a model (default all; 1d always does).
+    max_workers: horizons fitted concurrently; LightGBM threads are split across them.
+    """
+    horizons = list(dict.fromkeys(['1d', *(horizons or HORIZONS)]))
+    unknown = set(horizons) - set(HORIZONS)
+    if unknown:
+        raise ValueError(f"Unknown horizons: {sorted(unknown)}")
+
+    logger.info(f"Training LightGBM baseline for horizons {horizons}...")
     
     # 1. Load ML dataset
-    data_file = PROCESSED_FEATURES_DIR.parent / "train_market_only.parquet"
-    df = pd.read_parquet(data_file)
+    data_file = TRAIN_DATASET_FILE
+    with step("load_dataset") as s:
+        df = read_parquet(data_file, DATASET_SCHEMA)
+        s.record(rows_out=len(df), bytes_read=file_bytes([data_file]))
     logger.info(f"Dataset loaded: {len(df):,} rows")
     
-    # Define features and target
-    feature_cols = ['ret_1d', 'ret_3d', 'ret_5d', 'vol_20d', 'vol_zscore']
-    X = df[feature_cols]
-    y = df['next_1d_log_return']
-    
-    logger.info(f"Features shape: {X.shape}")
-    logger.info(f"Target range: {y.min():.4f} to {y.max():.4f}")
+    # Define features and targets
+    feature_cols = FEATURE_COLS
+    logger.info(f"Features shape: {df[feature_cols].shape}")
+    logger.info(f"Target range (1d): {df[TARGET_COL].min():.4f} to {df[TARGET_COL].max():.4f}")
     
     # 2. Time-based train/val split (NO future leakage)
     # Sort by time, take first 80% for train, last 20% for val
-    df_sorted = df.sort_values('timestamp')
-    split_idx = int(len(df_sorted) * 0.8)
-    
-    X_train = X.iloc[:split_idx]
-    X_val = X.iloc[split_idx:]
-    y_train = y.iloc[:split_idx]
-    y_val = y.iloc[split_idx:]
+    df = df.sort_values('timestamp', kind='stable').reset_index(drop=True)
+    split_idx = int(len(df) * 0.8)
+    train_df, val_df = df.iloc[:split_idx], df.iloc[split_idx:]
     
-    train_date = df_sorted['timestamp'].iloc[split_idx-1].date()
-    val_date = df_sorted['timestamp'].iloc[split_idx].date()
+    train_date = train_df['timestamp'].iloc[-1].date()
+    val_date = val_df['timestamp'].iloc[0].date()
     logger.info(f"Train/Val split: {train_date} | {val_date}")
-    logger.info(f"Train: {len(X_train):,} rows, Val: {len(X_val):,} rows")
-    
-    # 3. LightGBM datasets (optimized format)
-    train_data = lgb.Dataset(X_train, label=y_train)
-    val_data = lgb.Dataset(X_val, label=y_val, reference=train_data)
-    
-    # 4. LightGBM parameters (stock prediction optimized)
-    params = {
-        'objective': 'regression',           # Predict continuous returns
-        'metric': 'rmse',                    # Optimize root mean squared error
-        'boosting_type': 'gbdt',             # Gradient boosting decision tree
-        'num_leaves': 31,                    # Max leaves per tree
-        'learning_rate': 0.05,               # Step size (slow = stable)
-        'feature_fraction': 0.9,             # Use 90% features per tree
-        'bagging_fraction': 0.8,             # Use 80% rows per tree
-        'bagging_freq': 5,                   # Re-bag every 5 trees
-        'verbose': -1,                       # Suppress LightGBM logs
-        'random_state': 42,                  # Reproducible results
-        'device': 'cpu'                      # Use CPU (GPU optional)
-    }
-    
-    # 5. Train model with early stopping
-    model = lgb.train(
-        params,
-        train_data,
-        num_boost_round=1000,                # Max 1000 trees
-        valid_sets=[val_data],               # Validate on val set
-        callbacks=[lgb.early_stopping(50),   # Stop if no improvement 50 rounds
-                   lgb.log_evaluation(100)]  # Log every 100 rounds
-    )
-    
-    logger.info(f"Training complete: {model.num_trees()} trees")
-    
-    # 6. Predictions on validation set
-    y_pred = model.predict(X_val, num_iteration=model.best_iteration)
-    
-    # 7. Calculate metrics
-    rmse = np.sqrt(mean_squared_error(y_val, y_pred))
-    mae = mean_absolute_error(y_val, y_pred)
-    
-    # Directional accuracy (did we predict up/down correctly?)
-    direction_correct = np.mean(np.sign(y_val) == np.sign(y_pred))
+    logger.info(f"Train: {len(train_df):,} rows, Val: {len(val_df):,} rows")
+    
+    # 3. LightGBM parameters (defaults → tuned → explicit overrides)
+    overrides = params or {}
+    params = dict(LGBM_PARAMS)
+    if tuned:
+        with open(BEST_PARAMS_FILE) as f:
+            params.update(json.load(f)['params'])
+        logger.info(f"Using tuned params: {BEST_PARAMS_FILE}")
+    params.update(overrides)
+    n_jobs = max(1, min(max_workers, len(horizons)))
+    params.setdefault('num_threads', max(1, (os.cpu_count() or 1) // n_jobs))
+    
+    # 4. Purge: training rows whose target window ends inside the validation window leak it
+    val_start = val_df['timestamp'].iloc[0]
+    purged = {h: (_label_end(df, HORIZONS[h]).iloc[:split_idx] > val_start).to_numpy() for h in horizons}
+    for h in horizons:
+        logger.info(f"Purged {purged[h].sum():,} train rows overlapping validation ({h})")
+
+    # 5. Bin the feature matrix once: train rows, then validation through the train bin edges.
+    #    Each horizon gets row subsets of these (its non-NaN, unpurged targets) with its own labels.
+    with step("bin_datasets") as s:
+        train_base = lgb.Dataset(train_df[feature_cols], label=train_df[TARGET_COL], params=params).construct()
+        val_base = lgb.Dataset(val_df[feature_cols], label=val_df[TARGET_COL], reference=train_base,
+                               params=params).construct()
+        datasets = {
+            h: (_horizon_view(train_base, train_df[TARGET_COLS[h]].mask(purged[h])),
+                _horizon_view(val_base, val_df[TARGET_COLS[h]]))
+            for h in horizons
+        }
+        s.record(rows_in=len(df))
+    
+    # 6. Train one model per horizon, concurrently (LightGBM releases the GIL), with early stopping
+    with step("fit") as s:
+        with ThreadPoolExecutor(max_workers=n_jobs) as pool:
+            futures = {h: pool.submit(_fit_horizon, h, params, *datasets[h]) for h in horizons}
+            models = {h: future.result() for h, future in futures.items()}
+        s.record(rows_in=sum(train.num_data() + valid.num_data() for train, valid in datasets.values()))
+    
+    for h, model in models.items():
+        logger.info(f"Training complete ({h}): {model.num_trees()} trees, best iteration {model.best_iteration}")
+    
+    # 7. Predictions on validation set
+    X_val = val_df[feature_cols]
+    with step("predict_validation") as s:
+        y_preds = {h: model.predict(X_val, num_iteration=model.best_iteration) for h, model in models.items()}
+        s.record(rows_in=len(X_val) * len(models))
+    
+    # 8. Calculate metrics (rows with a known target for the horizon)
+    metrics = {}
+    for h in horizons:
+        y_val = val_df[TARGET_COLS[h]].to_numpy(dtype=np.float64)
+        known = ~np.isnan(y_val)
+        y_true, y_pred = y_val[known], y_preds[h][known]
+        metrics[h] = {
+            'rmse': float(np.sqrt(sk_metrics.mean_squared_error(y_true, y_pred))),
+            'mae': float(sk_metrics.mean_absolute_error(y_true, y_pred)),
+            # Directional accuracy (did we predict up/down correctly?)
+            'direction_accuracy': float(np.mean(np.sign(y_true) == np.sign(y_pred))),
+            'valid_rows': int(known.sum()),
+        }
     
     logger.info("Validation Metrics:")
-    logger.info(f"  RMSE: {rmse:.6f}")
-    logger.info(f"  MAE:  {mae:.6f}")
-    logger.info(f"  Dir Acc: {direction_correct:.1%}")
+    for h, m in metrics.items():
+        logger.info(f"  {h:>3}  RMSE: {m['rmse']:.6f}  MAE: {m['mae']:.6f}  Dir Acc: {m['direction_accuracy']:.1%}")
     
-    # 8. Feature importance
+    # 9. Feature importance
     importance = pd.DataFrame({
         'feature': feature_cols,
-        'importance': model.feature_importance(importance_type='gain')
-    }).sort_values('importance', ascending=False)
+        **{f'gain_{h}': model.feature_importance(importance_type='gain') for h, model in models.items()},
+    }).sort_values('gain_1d', ascending=False)
     
     logger.info("Feature Importance:")
     logger.info(importance.to_string(index=False))
     
-    # 9. Create artifacts folder + save model
-    artifacts_dir = Path("ml/artifacts")
+    # 10. Create artifacts folder + save models
+    artifacts_dir = ML_ARTIFACTS_DIR
     artifacts_dir.mkdir(exist_ok=True)
     
-    model_file = artifacts_dir / "lgbm_market_only.pkl"
-    joblib.dump(model, model_file)
-    
-    # FIXED OOF predictions
+    model_file = MODEL_FILE
     oof_file = artifacts_dir / "lgbm_market_only_oof.csv"  
-    oof_df = pd.DataFrame({
-        'timestamp': df_sorted['timestamp'].iloc[split_idx:].values,
-        'symbol': df_sorted['symbol'].iloc[split_idx:].values,
-        'y_true': y_val.values,
-        'y_pred': y_pred
-    })
-    oof_df.to_csv(oof_file, index=False)
+    with step("save_artifacts") as s:
+        joblib.dump(models['1d'], model_file)
+        # Bundle: every horizon's model; serving picks one per request
+        joblib.dump({
+            'feature_names': feature_cols,
+            'model_sha256': file_sha256(model_file),   # the 1d model above, so serving can spot a stale bundle
+            'horizons': {
+                h: {'target': TARGET_COLS[h], 'model': model, 'metrics': metrics[h]}
+                for h, model in models.items()
+            },
+        }, MODEL_BUNDLE_FILE)
+        
+        # Validation predictions: 1d as y_true/y_pred, other horizons suffixed
+        oof_df = pd.DataFrame({
+            'timestamp': val_df['timestamp'].values,
+            'symbol': val_df['symbol'].values,
+            'y_true': val_df[TARGET_COL].values,
+            'y_pred': y_preds['1d'],
+        })
+        for h in horizons[1:]:
+            oof_df[f'y_true_{h}'] = val_df[TARGET_COLS[h]].values
+            oof_df[f'y_pred_{h}'] = y_preds[h]
+        oof_df.to_csv(oof_file, index=False)
+        s.record(rows_in=len(oof_df), bytes_written=file_bytes([model_file, MODEL_BUNDLE_FILE, oof_file]))
+
+    # 11. Drift reference: binned training distributions the API compares live inputs against
+    with step("drift_reference") as s:
+        save_reference(build_reference(train_df[feature_cols]), DRIFT_REFERENCE_FILE)
+        s.record(rows_in=len(train_df))
 
     logger.success(f"Model saved: {model_file}")
+    logger.success(f"Horizon bundle: {MODEL_BUNDLE_FILE} ({', '.join(models)})")
     logger.success(f"OOF preds: {oof_file}")
+    logger.success(f"Drift reference: {DRIFT_REFERENCE_FILE}")
     logger.success("FS-12 COMPLETE - LightGBM baseline ready!")
 
 if __name__ == "__main__":
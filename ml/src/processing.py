@@ -1,82 +1,291 @@
 """
 Build daily OHLCV processed table
 Combines all raw market data into single clean table (Parquet + CSV).
+
+Incremental mode only reads raw files not yet in the manifest and rewrites
+just the affected symbol partitions of data/processed/market/daily_ohlcv/.
 """
+import json
+import shutil
 import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Dict, List, Optional
 from loguru import logger
-from common.config.paths import RAW_MARKET_DIR, PROCESSED_MARKET_DIR
+from common.config.paths import (
+    RAW_MARKET_DIR, PROCESSED_MARKET_DIR,
+    PROCESSED_OHLCV_DATASET_DIR, PROCESSED_OHLCV_MANIFEST_FILE, ensure_data_dirs,
+)
+from common.fingerprint import file_sha256
+from .profiling import file_bytes, profiled_stage, step
+from .schemas import OHLCV_SCHEMA, conform, without, write_parquet
+
+PARTITIONING = ds.partitioning(pa.schema([("symbol", pa.string())]), flavor="hive")
+PARTITION_SCHEMA = without(OHLCV_SCHEMA, "symbol")
+# Partition files + the path's symbol; older files (string dates, int64 volume) are cast on scan
+DATASET_SCHEMA = PARTITION_SCHEMA.append(pa.field("symbol", pa.string()))
+
+
+def _list_raw_files() -> List[Path]:
+    """All raw files, ordered so later ingests come last (dedup keeps the newest)."""
+    return sorted(
+        [*RAW_MARKET_DIR.rglob("*.csv"), *RAW_MARKET_DIR.rglob("*.parquet")],
+        key=lambda p: (p.parent.name, p.name),
+    )
+
+
+def _read_raw_file(raw_file: Path) -> Optional[pd.DataFrame]:
+    try:
+        if raw_file.suffix == ".parquet":
+            df = pd.read_parquet(raw_file)
+        else:
+            df = pd.read_csv(raw_file, engine="pyarrow")  # multithreaded C++ reader
+        logger.info(f"✅ Loaded {len(df)} rows from {raw_file.name}")
+        return df
+    except Exception as e:
+        logger.warning(f"⚠️  Failed to load {raw_file.name}: {e}")
+        return None
+
+
+def _read_raw_files(raw_files: List[Path], max_workers: int) -> Dict[Path, pd.DataFrame]:
+    """Read files in parallel; successfully read files only, in input order."""
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        frames = pool.map(_read_raw_file, raw_files)
+        return {path: df for path, df in zip(raw_files, frames) if df is not None}
+
+
+def _sort_dedup(df: pd.DataFrame) -> pd.DataFrame:
+    # Stable sort keeps file order, so the newest ingest (overlap/restatement) wins
+    df = df.sort_values(['symbol', 'timestamp'], kind='stable').reset_index(drop=True)
+    return df.drop_duplicates(subset=['symbol', 'timestamp'], keep='last').reset_index(drop=True)
+
+
+def _load_manifest() -> dict:
+    if not PROCESSED_OHLCV_MANIFEST_FILE.exists():
+        return {}
+    with open(PROCESSED_OHLCV_MANIFEST_FILE) as f:
+        return json.load(f)
+
+
+def _save_manifest(manifest: dict):
+    tmp_path = PROCESSED_OHLCV_MANIFEST_FILE.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    tmp_path.replace(PROCESSED_OHLCV_MANIFEST_FILE)
 
-def process_daily_ohlcv():
+
+def _manifest_entry(raw_file: Path, previous: Optional[dict]) -> dict:
+    """size/mtime/hash entry; the hash is only recomputed when size or mtime moved."""
+    stat = raw_file.stat()
+    if previous and previous['size'] == stat.st_size and previous['mtime'] == stat.st_mtime:
+        return previous
+    return {'size': stat.st_size, 'mtime': stat.st_mtime, 'sha256': file_sha256(raw_file)}
+
+
+def _partition_path(symbol: str) -> Path:
+    return PROCESSED_OHLCV_DATASET_DIR / f"symbol={symbol}" / "part-0.parquet"
+
+
+def _write_partition(symbol: str, df: pd.DataFrame):
+    """Atomically replace one symbol partition (symbol lives in the path)."""
+    path = _partition_path(symbol)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".parquet.tmp")
+    write_parquet(df, tmp_path, PARTITION_SCHEMA)
+    tmp_path.replace(path)
+
+
+def _merge_partition(symbol: str, new_rows: pd.DataFrame) -> int:
+    """Merge new rows into one symbol partition; returns the partition row count."""
+    path = _partition_path(symbol)
+    if path.exists():
+        existing = conform(pd.read_parquet(path), PARTITION_SCHEMA).assign(symbol=symbol)  # upgrades old files
+        merged = _sort_dedup(pd.concat([existing, new_rows], ignore_index=True))
+    else:
+        merged = _sort_dedup(new_rows)
+    _write_partition(symbol, merged)
+    return len(merged)
+
+
+def open_daily_ohlcv_dataset() -> ds.Dataset:
+    """Processed OHLCV as a pyarrow dataset; prefers the partitioned layout (always current)."""
+    if PROCESSED_OHLCV_DATASET_DIR.exists():
+        return ds.dataset(PROCESSED_OHLCV_DATASET_DIR, format="parquet", partitioning=PARTITIONING,
+                          schema=DATASET_SCHEMA)
+    return ds.dataset(PROCESSED_MARKET_DIR / "daily_ohlcv.parquet", format="parquet")
+
+
+def load_daily_ohlcv(columns: Optional[List[str]] = None,
+                     filter: Optional[ds.Expression] = None) -> pd.DataFrame:
     """
-    1. Read all data/raw/market/symbol/*.csv files
-    2. Concatenate into single DataFrame
-    3. Parse timestamps (convert string → datetime)
+    Read the processed OHLCV table in OHLCV_SCHEMA dtypes, sorted by symbol/timestamp.
+    `filter` is a pyarrow dataset expression pushed down to the scan
+    (symbol predicates prune whole partitions).
+    """
+    columns = list(columns) if columns is not None else OHLCV_SCHEMA.names
+    df = conform(open_daily_ohlcv_dataset().to_table(columns=columns, filter=filter).to_pandas(),
+                 OHLCV_SCHEMA, columns)
+    if 'symbol' in df and 'timestamp' in df:
+        df = df.sort_values(['symbol', 'timestamp'], kind='stable').reset_index(drop=True)
+    return df
+
+
+def process_daily_ohlcv_incremental(max_workers: int = 8):
+    """
+    1. Diff raw files against the manifest (size, mtime, sha256)
+    2. Read only new/changed files in parallel
+    3. Merge + dedup only the affected symbol partitions
+    4. Record the files in the manifest
+    """
+    logger.info("🔄 Incremental OHLCV compaction...")
+
+    # Step 1: Detect new or changed raw files
+    with step("diff_manifest") as s:
+        manifest = _load_manifest()
+        raw_files = _list_raw_files()
+        entries = {}
+        new_files = []
+        for raw_file in raw_files:
+            key = raw_file.relative_to(RAW_MARKET_DIR).as_posix()
+            previous = manifest.get(key)
+            entries[key] = _manifest_entry(raw_file, previous)
+            if previous is None or previous['sha256'] != entries[key]['sha256']:
+                new_files.append(raw_file)
+        s.record(rows_in=len(raw_files), rows_out=len(new_files))
+
+    logger.info(f"📂 {len(raw_files)} raw files, {len(new_files)} new or changed")
+    if not new_files:
+        _save_manifest(entries)
+        logger.success("FS-9 up to date - nothing to compact")
+        return
+
+    # Step 2: Read new files only
+    with step("read_raw") as s:
+        dfs = _read_raw_files(new_files, max_workers)
+        s.record(rows_out=sum(len(df) for df in dfs.values()), bytes_read=file_bytes(dfs))
+    if not dfs:
+        logger.error("❌ No data successfully loaded")
+        return
+    with step("normalize") as s:
+        new_rows = conform(pd.concat(dfs.values(), ignore_index=True), OHLCV_SCHEMA)
+        s.record(rows_out=len(new_rows))
+
+    # Step 3: Merge into affected partitions only
+    with step("merge_partitions") as s:
+        groups = dict(tuple(new_rows.groupby('symbol', sort=True, observed=True)))
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            sizes = dict(zip(groups, pool.map(lambda item: _merge_partition(*item), groups.items())))
+        s.record(rows_in=len(new_rows), rows_out=sum(sizes.values()),
+                 bytes_written=file_bytes(_partition_path(symbol) for symbol in sizes))
+
+    # Step 4: Only successfully read files enter the manifest (failures retry next run)
+    for raw_file in new_files:
+        if raw_file not in dfs:
+            entries.pop(raw_file.relative_to(RAW_MARKET_DIR).as_posix(), None)
+    _save_manifest(entries)
+
+    logger.success("FS-9 INCREMENTAL COMPLETE!")
+    logger.success(f" {len(new_rows):,} new rows → {len(sizes)} symbol partitions")
+    logger.success(f" Partitions: {sizes}")
+    logger.success(f" Dataset: {PROCESSED_OHLCV_DATASET_DIR}")
+
+
+@profiled_stage("processing")
+def process_daily_ohlcv(incremental: bool = False, max_workers: int = 8):
+    """
+    1. Read all data/raw/market/symbol/*.csv files + incremental *.parquet parts
+    2. Read them in parallel
+    3. Concatenate into single DataFrame in OHLCV_SCHEMA dtypes
     4. Sort by symbol, timestamp
     5. Deduplicate (keep latest row if duplicates)
     6. Save as Parquet (ML standard) + CSV (Excel friendly)
+    7. Rebuild the partitioned dataset (dropping symbols with no raw files left)
+       + manifest (baseline for incremental runs)
     """
-    
+    ensure_data_dirs()
+    if incremental:
+        return process_daily_ohlcv_incremental(max_workers=max_workers)
+
     logger.info("🔄 Building daily OHLCV processed table...")
-    
-    # Step 1: Find all CSV files recursively
-    csv_files = list(RAW_MARKET_DIR.rglob("*.csv"))
-    logger.info(f"📂 Found {len(csv_files)} CSV files: {RAW_MARKET_DIR}")
-    
-    if not csv_files:
-        logger.error("❌ No CSV files found in data/raw/market/")
+
+    # Step 1: Find all raw files recursively
+    raw_files = _list_raw_files()
+    logger.info(f"📂 Found {len(raw_files)} raw files: {RAW_MARKET_DIR}")
+
+    if not raw_files:
+        logger.error("❌ No raw files found in data/raw/market/")
         return
-    
-    # Step 2: Read all files and track source
-    dfs = []
-    for csv_file in csv_files:
-        try:
-            df = pd.read_csv(csv_file)
-            df['source_file'] = csv_file.name  # Track which file it came from
-            dfs.append(df)
-            logger.info(f"✅ Loaded {len(df)} rows from {csv_file.name}")
-        except Exception as e:
-            logger.warning(f"⚠️  Failed to load {csv_file.name}: {e}")
-    
+
+    # Step 2: Read all files (parallel)
+    with step("read_raw") as s:
+        dfs = _read_raw_files(raw_files, max_workers)
+        s.record(rows_out=sum(len(df) for df in dfs.values()), bytes_read=file_bytes(dfs))
+
     if not dfs:
         logger.error("❌ No data successfully loaded")
         return
-    
-    # Step 3: Concatenate all dataframes
-    combined_df = pd.concat(dfs, ignore_index=True)
-    logger.info(f"🔗 Combined: {len(combined_df):,} total rows")
-    
-    # Step 4: Parse timestamps (string → datetime)
-    combined_df['timestamp'] = pd.to_datetime(combined_df['timestamp'])
-    logger.info("✅ Timestamps parsed to datetime")
-    
-    # Step 5: Sort by symbol, timestamp (chronological order)
-    combined_df = combined_df.sort_values(['symbol', 'timestamp']).reset_index(drop=True)
-    logger.info("✅ Data sorted by symbol, timestamp")
-    
-    # Step 6: Deduplicate (if same symbol+date exists multiple times, keep latest)
+
+    # Step 3: Concatenate and cast once to OHLCV_SCHEMA (UTC timestamps, category symbol, uint64
+    # volume); columns outside the schema are dropped
+    with step("concat") as s:
+        combined_df = conform(pd.concat(dfs.values(), ignore_index=True), OHLCV_SCHEMA)
+        s.record(rows_out=len(combined_df))
+    logger.info(f"🔗 Combined: {len(combined_df):,} total rows, "
+                f"{combined_df.memory_usage(deep=True).sum() / 1e6:,.1f} MB in memory")
+
+    # Step 4 + 5: Sort by symbol, timestamp and deduplicate (keep latest ingest)
     before_dedup = len(combined_df)
-    combined_df = combined_df.drop_duplicates(subset=['symbol', 'timestamp'], keep='last')
+    with step("sort_dedup") as s:
+        combined_df = _sort_dedup(combined_df)
+        s.record(rows_in=before_dedup, rows_out=len(combined_df))
     after_dedup = len(combined_df)
-    logger.info(f"🧹 Deduplicated: {before_dedup:,} → {after_dedup:,} rows")
-    
-    # Step 7: Save as Parquet (ML standard: fast, small, schema-aware)
+    logger.info(f"🧹 Sorted + deduplicated: {before_dedup:,} → {after_dedup:,} rows")
+
+    # Step 6: Save as Parquet (ML standard: fast, small, schema-aware)
     output_parquet = PROCESSED_MARKET_DIR / "daily_ohlcv.parquet"
-    combined_df.to_parquet(output_parquet, index=False)
-    
-    # Step 8: Export CSV for Excel/team collaboration
+    with step("write_parquet") as s:
+        write_parquet(combined_df, output_parquet, OHLCV_SCHEMA)
+        s.record(rows_in=len(combined_df), bytes_written=file_bytes([output_parquet]))
+
+    # Step 7: Export CSV for Excel/team collaboration
     output_csv = PROCESSED_MARKET_DIR / "daily_ohlcv.csv"
-    combined_df.to_csv(output_csv, index=False)
-    
+    with step("write_csv") as s:
+        combined_df.to_csv(output_csv, index=False)
+        s.record(rows_in=len(combined_df), bytes_written=file_bytes([output_csv]))
+
+    # Step 8: Rebuild partitions + manifest so incremental runs start from here
+    with step("write_partitions") as s:
+        symbols = set()
+        for symbol, group in combined_df.groupby('symbol', sort=True, observed=True):
+            _write_partition(symbol, group)
+            symbols.add(symbol)
+        # Orphans last, so readers always see a complete dataset
+        for partition_dir in PROCESSED_OHLCV_DATASET_DIR.glob("symbol=*"):
+            if partition_dir.name.split("=", 1)[1] not in symbols:
+                shutil.rmtree(partition_dir)
+                logger.info(f"🗑️  Removed partition with no raw files: {partition_dir.name}")
+        s.record(rows_in=len(combined_df), bytes_written=file_bytes([PROCESSED_OHLCV_DATASET_DIR]))
+    # Only successfully read files enter the manifest (failures retry on the next incremental run)
+    with step("manifest") as s:
+        _save_manifest({
+            raw_file.relative_to(RAW_MARKET_DIR).as_posix(): _manifest_entry(raw_file, None)
+            for raw_file in dfs
+        })
+        s.record(rows_in=len(dfs), bytes_read=file_bytes(dfs))
+
     # Step 9: Summary statistics
     symbols_count = combined_df['symbol'].nunique()
     date_range = combined_df['timestamp'].agg(['min', 'max'])
-    
+
     logger.success("FS-9 COMPLETE!")
     logger.success(f" {len(combined_df):,} rows, {symbols_count} symbols")
     logger.success(f" {date_range['min'].date()} → {date_range['max'].date()}")
     logger.success(f" Parquet (ML): {output_parquet}")
     logger.success(f" CSV (Excel): {output_csv}")
+    logger.success(f" Partitioned: {PROCESSED_OHLCV_DATASET_DIR}")
 
 if __name__ == "__main__":
-    process_daily_ohlcv()
+    import sys
+    process_daily_ohlcv(incremental="--incremental" in sys.argv)
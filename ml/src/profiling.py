@@ -0,0 +1,368 @@
+"""
+Per-stage profiling for ML pipeline runs.
+
+    @profiled_stage("processing")
+    def process_daily_ohlcv(...):
+        with step("read_csv") as s:
+            dfs = ...
+            s.record(rows_out=n_rows, bytes_read=file_bytes(raw_files))
+
+A stage run measures itself and every step (steps nest) and records:
+- wall time and CPU time, including worker processes once they have exited
+- RSS at the end and peak RSS within the step
+- bytes moved through read/write syscalls
+- the rows in/out and logical bytes read/written that the code reports
+
+At the end it writes ml/artifacts/profiles/<stage>-<utc>.json and logs a
+summary per step. A stage called from inside another stage becomes one of
+its steps. step() outside a stage run records nothing.
+
+Opt-in (settings / env):
+- FINSENSE_PROFILE_TRACEMALLOC=1: top allocating source lines and traced peak
+  per step. tracemalloc slows allocation-heavy code, so it is off by default.
+- FINSENSE_PROFILE_SAMPLE_MS=5: a sampling thread records every thread's
+  Python stack at that interval (wall clock, so waits show) and writes
+  <stage>-<utc>.folded. That is the collapsed-stack format flamegraph.pl,
+  speedscope and inferno read.
+
+CPU time, I/O and RSS are process-wide counters. When the pipeline runs
+stages concurrently, each stage's numbers include the others' work.
+"""
+import functools
+import json
+import os
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from loguru import logger
+
+from common.config.paths import PROFILE_DIR
+from common.config.settings import settings
+
+TOP_ALLOCATIONS = 10
+MB = 1024 * 1024
+
+_current: ContextVar[Optional["StageRun"]] = ContextVar("finsense_stage_run", default=None)
+
+# ---- process counters (Linux /proc; degrade to getrusage elsewhere) ----
+
+_open_records: List["StepRecord"] = []   # every open stage/step in the process
+_rss_lock = threading.Lock()
+_can_reset_peak = True
+
+
+def _proc_status() -> dict:
+    """VmRSS / VmHWM in bytes (empty off Linux)."""
+    try:
+        with open("/proc/self/status") as f:
+            return {line.split(":")[0]: int(line.split()[1]) * 1024 for line in f if line.startswith(("VmRSS", "VmHWM"))}
+    except OSError:
+        return {}
+
+
+def _peak_rss() -> int:
+    status = _proc_status()
+    if "VmHWM" in status:
+        return status["VmHWM"]
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _current_rss() -> Optional[int]:
+    return _proc_status().get("VmRSS")
+
+
+def _io_counters() -> dict:
+    try:
+        with open("/proc/self/io") as f:
+            values = dict(line.split(": ") for line in f.read().splitlines())
+        return {"read": int(values["rchar"]), "write": int(values["wchar"])}
+    except (OSError, KeyError, ValueError):
+        return {}
+
+
+def _children_cpu() -> float:
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _open_record(record: "StepRecord"):
+    """Register an open record and restart the kernel's peak-RSS counter, so the peak is per step."""
+    global _can_reset_peak
+    with _rss_lock:
+        peak = _peak_rss()
+        for other in _open_records:          # the peak so far belongs to everything still open
+            other.peak_rss = max(other.peak_rss, peak)
+        if _can_reset_peak:
+            try:
+                with open("/proc/self/clear_refs", "w") as f:
+                    f.write("5")             # reset VmHWM to the current RSS (Linux >= 4.0)
+            except OSError:
+                _can_reset_peak = False
+        record.peak_rss = _current_rss() or 0
+        _open_records.append(record)
+
+
+def _close_record(record: "StepRecord"):
+    with _rss_lock:
+        record.peak_rss = max(record.peak_rss, _peak_rss())
+        _open_records.remove(record)
+
+
+def file_bytes(paths: Iterable[Path]) -> int:
+    """Total size of existing files/directories (for bytes_read / bytes_written)."""
+    total = 0
+    for path in map(Path, paths):
+        if path.is_dir():
+            total += sum(p.stat().st_size for p in path.rglob("*") if p.is_file())
+        elif path.exists():
+            total += path.stat().st_size
+    return total
+
+
+# ---- records ----
+
+class StepRecord:
+    COUNTS = ("rows_in", "rows_out", "bytes_read", "bytes_written")
+
+    def __init__(self, name: str, path: str, depth: int, trace_memory: bool):
+        self.name, self.path, self.depth = name, path, depth
+        self.counts = {}
+        self.peak_rss = 0
+        self.top_allocations = None
+        self.traced_peak = None
+        self._trace_memory = trace_memory and tracemalloc.is_tracing()
+        self._snapshot = None
+        self.wall_s = self.cpu_s = 0.0
+
+    def record(self, **counts):
+        """Add to rows_in / rows_out / bytes_read / bytes_written (repeat calls accumulate)."""
+        unknown = set(counts) - set(self.COUNTS)
+        if unknown:
+            raise ValueError(f"Unknown step counters: {sorted(unknown)}")
+        for key, value in counts.items():
+            self.counts[key] = self.counts.get(key, 0) + int(value)
+
+    def __enter__(self):
+        if self._trace_memory:
+            self._snapshot = _snapshot()
+            tracemalloc.reset_peak()
+        self._io = _io_counters()
+        self._children_cpu = _children_cpu()
+        self._cpu = time.process_time()
+        self._wall = time.perf_counter()
+        _open_record(self)
+        return self
+
+    def __exit__(self, *exc):
+        self.wall_s = time.perf_counter() - self._wall
+        self.cpu_s = time.process_time() - self._cpu + _children_cpu() - self._children_cpu
+        _close_record(self)
+        self.rss_end = _current_rss()
+        io = _io_counters()
+        self.io = {key: io[key] - self._io[key] for key in io} if self._io else {}
+        if self._trace_memory:
+            self.traced_peak = tracemalloc.get_traced_memory()[1]
+            stats = _snapshot().compare_to(self._snapshot, "lineno")[:TOP_ALLOCATIONS]
+            self.top_allocations = [
+                {"where": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                 "size_diff_mb": s.size_diff / MB, "size_mb": s.size / MB, "count_diff": s.count_diff}
+                for s in stats
+            ]
+            self._snapshot = None
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "path": self.path,
+            "depth": self.depth,
+            "wall_s": self.wall_s,
+            "cpu_s": self.cpu_s,
+            "peak_rss_mb": self.peak_rss / MB,
+            "rss_end_mb": self.rss_end / MB if self.rss_end is not None else None,
+            "io_read_bytes": self.io.get("read"),
+            "io_write_bytes": self.io.get("write"),
+            **{key: self.counts.get(key) for key in self.COUNTS},
+            "traced_peak_mb": self.traced_peak / MB if self.traced_peak is not None else None,
+            "top_allocations": self.top_allocations,
+        }
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    return tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),             # the sampler's own stack table
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ))
+
+
+class StackSampler(threading.Thread):
+    """Wall-clock sampling profiler: counts collapsed Python stacks of every other thread."""
+
+    def __init__(self, interval_s: float):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval_s = interval_s
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        me = threading.get_ident()
+        while not self._stop_event.wait(self.interval_s):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                frames = []
+                while frame is not None:
+                    code = frame.f_code
+                    frames.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                frames.append(names.get(ident, f"thread-{ident}"))
+                self.stacks[";".join(reversed(frames))] += 1
+            self.samples += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path: Path):
+        path.write_text("".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common()))
+
+
+class StageRun:
+    def __init__(self, name: str, trace_memory: bool = False, sample_ms: float = 0.0,
+                 output_dir: Path = PROFILE_DIR):
+        self.name = name
+        self.trace_memory = trace_memory
+        self.sample_ms = sample_ms
+        self.output_dir = Path(output_dir)
+        self.root = StepRecord(name, name, 0, trace_memory)
+        self.steps: List[StepRecord] = []
+        self._stack: List[StepRecord] = [self.root]
+        self._sampler: Optional[StackSampler] = None
+        self._started_tracing = False
+
+    @contextmanager
+    def step(self, name: str):
+        parent = self._stack[-1]
+        record = StepRecord(name, f"{parent.path}/{name}", parent.depth + 1, self.trace_memory)
+        self.steps.append(record)
+        self._stack.append(record)
+        try:
+            with record:
+                yield record
+        finally:
+            self._stack.pop()
+
+    def __enter__(self):
+        self.started_at = datetime.now(timezone.utc)
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+            self.root._trace_memory = True
+        if self.sample_ms > 0:
+            self._sampler = StackSampler(self.sample_ms / 1000)
+            self._sampler.start()
+        self.root.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.root.__exit__(exc_type, exc, tb)
+        if self._sampler is not None:
+            self._sampler.stop()
+        if self._started_tracing:
+            tracemalloc.stop()
+        try:
+            self._write_report("failed" if exc_type else "ok", f"{exc_type.__name__}: {exc}" if exc_type else None)
+        except OSError as e:
+            logger.warning(f"Profile report not written: {e}")
+        return False
+
+    def _write_report(self, status: str, error: Optional[str]):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        stem = f"{self.name}-{self.started_at:%Y%m%dT%H%M%S%fZ}"
+        folded = None
+        if self._sampler is not None:
+            folded = self.output_dir / f"{stem}.folded"
+            self._sampler.write(folded)
+        report = {
+            "stage": self.name,
+            "status": status,
+            "error": error,
+            "started_at": self.started_at.isoformat(),
+            "pid": os.getpid(),
+            "peak_rss_scope": "step" if _can_reset_peak else "process",
+            "tracemalloc": self.trace_memory,
+            "sample_ms": self.sample_ms or None,
+            "samples": self._sampler.samples if self._sampler else None,
+            "flamegraph": str(folded) if folded else None,
+            "total": self.root.to_dict(),
+            "steps": [record.to_dict() for record in self.steps],
+        }
+        path = self.output_dir / f"{stem}.json"
+        path.write_text(json.dumps(report, indent=2))
+
+        logger.info(f"Profile {self.name}: {self.root.wall_s:.2f}s wall, {self.root.cpu_s:.2f}s CPU, "
+                    f"peak RSS {self.root.peak_rss / MB:,.0f} MB → {path}")
+        for record in self.steps:
+            rows = record.counts.get("rows_out")
+            logger.info(f"  {'  ' * (record.depth - 1)}{record.name:<{24 - 2 * (record.depth - 1)}} "
+                        f"{record.wall_s:>8.3f}s {record.cpu_s:>8.3f}s cpu {record.peak_rss / MB:>8,.0f} MB peak"
+                        + (f" {rows:>12,} rows" if rows is not None else ""))
+
+
+class _NullStep:
+    def record(self, **counts):
+        pass
+
+
+_NULL_STEP = _NullStep()
+
+
+@contextmanager
+def step(name: str):
+    """Measure a sub-step of the running stage; a no-op outside one."""
+    run = _current.get()
+    if run is None:
+        yield _NULL_STEP
+        return
+    with run.step(name) as record:
+        yield record
+
+
+def current_step():
+    """The innermost open step (or the stage itself) to record counts on; a no-op outside a stage."""
+    run = _current.get()
+    return run._stack[-1] if run is not None else _NULL_STEP
+
+
+def profiled_stage(name: str):
+    """Decorator for stage entry points: profile the call and write its report."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _current.get() is not None:       # stage called from a stage: just a step of it
+                with step(name):
+                    return func(*args, **kwargs)
+            if not settings.profile_enabled:
+                return func(*args, **kwargs)
+            run = StageRun(name, settings.profile_tracemalloc, settings.profile_sample_ms)
+            token = _current.set(run)
+            try:
+                with run:
+                    return func(*args, **kwargs)
+            finally:
+                _current.reset(token)
+        return wrapper
+    return decorator
@@ -1,6 +1,11 @@
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
 from pydantic import BaseModel, Field
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Sequence, Tuple
 from decimal import Decimal
 
 
@@ -8,14 +13,174 @@ class MarketRow(BaseModel):
     """OHLCV market data schema."""
     symbol: str = Field(..., min_length=1, max_length=10)
     timestamp: datetime
-    open: Decimal
-    high: Decimal
-    low: Decimal
-    close: Decimal
+    open: float
+    high: float
+    low: float
+    close: float
     volume: int = Field(..., ge=0)
     ingest_date: Optional[datetime] = None
 
 
+MARKET_COLUMNS = ["symbol", "timestamp", "open", "high", "low", "close", "volume", "ingest_date"]
+PRICE_COLUMNS = ["open", "high", "low", "close"]
+OHLC_REL_TOLERANCE = 1e-9  # absorbs float noise from split/dividend adjustment
+
+
+# ---- Columnar dtype policy ----
+# One Arrow schema per table; Parquet writers go through write_parquet and
+# readers through conform, so every stage sees the same compact dtypes:
+#   symbol       dictionary<int32, string> (pandas category, sorted categories)
+#   timestamp    int64 nanoseconds since epoch, UTC
+#   OHLC prices  float64 (targets are log-ratios of closes)
+#   volume       uint64
+#   ingest_date  date32 (pandas datetime64[ns] at midnight)
+#   features     float32, as are targets (LightGBM keeps labels as float32)
+
+SYMBOL_TYPE = pa.dictionary(pa.int32(), pa.string())
+TIMESTAMP_TYPE = pa.timestamp("ns", tz="UTC")
+
+OHLCV_SCHEMA = pa.schema([
+    ("symbol", SYMBOL_TYPE),
+    ("timestamp", TIMESTAMP_TYPE),
+    *[(col, pa.float64()) for col in PRICE_COLUMNS],
+    ("volume", pa.uint64()),
+    ("ingest_date", pa.date32()),
+])
+
+
+def feature_schema(feature_cols: Sequence[str], target_cols: Sequence[str] = ()) -> pa.Schema:
+    """Features table (or training dataset, with targets): keys + float32 values."""
+    return pa.schema([
+        ("symbol", SYMBOL_TYPE),
+        ("timestamp", TIMESTAMP_TYPE),
+        *[(col, pa.float32()) for col in [*feature_cols, *target_cols]],
+    ])
+
+
+def without(schema: pa.Schema, *names: str) -> pa.Schema:
+    """Schema minus some fields (e.g. symbol, which hive partitions keep in the path)."""
+    return pa.schema([field for field in schema if field.name not in names])
+
+
+def _conform_column(col: pd.Series, type_: pa.DataType) -> pd.Series:
+    if pa.types.is_dictionary(type_):
+        if not isinstance(col.dtype, pd.CategoricalDtype):
+            return col.astype(str).astype("category")        # categories come out sorted
+        col = col.cat.remove_unused_categories()
+        categories = col.cat.categories
+        return col if categories.is_monotonic_increasing else col.cat.reorder_categories(categories.sort_values())
+    if pa.types.is_timestamp(type_):
+        if not isinstance(col.dtype, pd.DatetimeTZDtype):
+            col = pd.to_datetime(col, utc=True)              # strings may carry mixed DST offsets
+        return col.dt.tz_convert("UTC").astype("datetime64[ns, UTC]")
+    if pa.types.is_date(type_):
+        col = pd.to_datetime(col)
+        if isinstance(col.dtype, pd.DatetimeTZDtype):
+            col = col.dt.tz_localize(None)
+        return col.dt.normalize().astype("datetime64[ns]")
+    if pa.types.is_unsigned_integer(type_) and pd.api.types.is_signed_integer_dtype(col) and (col < 0).any():
+        raise ValueError(f"Negative values in unsigned column {col.name!r}")
+    return col.astype(type_.to_pandas_dtype())
+
+
+def conform(df: pd.DataFrame, schema: pa.Schema, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Cast a frame to the schema's pandas dtypes, columns in schema order.
+    `columns` restricts the check to a projection; columns outside the
+    schema (e.g. the old source_file) are dropped.
+    """
+    names = [name for name in schema.names if columns is None or name in columns]
+    missing = [name for name in names if name not in df]
+    if missing:
+        raise ValueError(f"Missing columns for schema: {missing}")
+    return pd.DataFrame({name: _conform_column(df[name], schema.field(name).type) for name in names},
+                        index=df.index)
+
+
+def write_parquet(df: pd.DataFrame, path: Path, schema: pa.Schema, **kwargs):
+    """Write a frame with exactly `schema` (kwargs go to pyarrow.parquet.write_table)."""
+    table = pa.Table.from_pandas(conform(df, schema), schema=schema, preserve_index=False)
+    pq.write_table(table, path, **kwargs)
+
+
+def read_parquet(path: Path, schema: pa.Schema, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """Read a Parquet file written by any version of the pipeline, conformed to `schema`."""
+    columns = list(columns) if columns is not None else schema.names
+    return conform(pd.read_parquet(path, columns=columns), schema, columns)
+
+
+def validate_market_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Column-wise equivalent of validating every row with MarketRow.
+
+    Same rules as MarketRow (symbol length, parseable timestamp, non-null
+    finite OHLC, integer volume >= 0, optional ingest_date) plus OHLC sanity
+    (low <= open/close <= high). Clean rows come out in OHLCV_SCHEMA dtypes.
+
+    Returns (clean, rejected); rejected keeps the input columns plus a
+    `reason` column listing every failed check, separated by ';'.
+    """
+    frame = df.reset_index(drop=True)
+    checks = {}
+
+    # Symbol: non-null string, 1-10 chars
+    symbol = frame["symbol"]
+    symbol_len = symbol.astype("string").str.len()
+    checks["symbol_length"] = symbol.isna() | (symbol_len < 1) | (symbol_len > 10)
+
+    # Timestamp: parseable (mixed offsets → UTC)
+    timestamp = frame["timestamp"]
+    if not pd.api.types.is_datetime64_any_dtype(timestamp):
+        timestamp = pd.to_datetime(timestamp, errors="coerce", utc=True)
+    checks["timestamp_unparseable"] = timestamp.isna()
+
+    # OHLC: numeric, non-null, finite
+    prices = frame[PRICE_COLUMNS].apply(pd.to_numeric, errors="coerce").astype("float64")
+    checks["ohlc_missing"] = ~pd.Series(np.isfinite(prices.to_numpy()).all(axis=1), index=frame.index)
+
+    # Volume: integer-valued, >= 0
+    volume = pd.to_numeric(frame["volume"], errors="coerce")
+    checks["volume_invalid"] = volume.isna() | (volume < 0) | (volume % 1 != 0)
+
+    # ingest_date: optional, but must parse when present
+    if "ingest_date" in frame:
+        ingest_date = pd.to_datetime(frame["ingest_date"], errors="coerce")
+        checks["ingest_date_unparseable"] = ingest_date.isna() & frame["ingest_date"].notna()
+    else:
+        ingest_date = pd.Series(pd.NaT, index=frame.index)
+
+    # OHLC sanity: low <= open/close <= high
+    tol = prices["high"].abs() * OHLC_REL_TOLERANCE
+    body_low = prices[["open", "close"]].min(axis=1)
+    body_high = prices[["open", "close"]].max(axis=1)
+    checks["ohlc_inconsistent"] = (
+        (prices["low"] > body_low + tol)
+        | (body_high > prices["high"] + tol)
+        | (prices["low"] > prices["high"] + tol)
+    )
+
+    # Collect reasons only where something failed
+    bad = np.zeros(len(frame), dtype=bool)
+    reasons = pd.Series("", index=frame.index, dtype="object")
+    for name, failed in checks.items():
+        failed = failed.fillna(True).to_numpy(dtype=bool)
+        bad |= failed
+        reasons[failed] = reasons[failed] + name + ";"
+
+    rejected = frame.loc[bad].copy()
+    rejected["reason"] = reasons[bad].str.rstrip(";")
+
+    clean = conform(pd.DataFrame({
+        "symbol": symbol[~bad],
+        "timestamp": timestamp[~bad],
+        **{col: prices.loc[~bad, col] for col in PRICE_COLUMNS},
+        "volume": volume[~bad],
+        "ingest_date": ingest_date[~bad],
+    }), OHLCV_SCHEMA).reset_index(drop=True)
+
+    return clean, rejected.reset_index(drop=True)
+
+
 class CompanyMetadata(BaseModel):
     """Company fundamentals and metadata schema."""
     symbol: str = Field(..., min_length=1, max_length=10)
@@ -0,0 +1,211 @@
+"""
+Hyperparameter search for the LightGBM baseline.
+
+Random configurations are pruned with successive halving on boosting rounds:
+every rung trains the survivors with `eta`x more rounds and keeps the best
+1/eta by validation RMSE. Trials run on a process pool, and all of them share
+one binned train/valid Dataset saved in LightGBM's binary format (keyed by the
+dataset's content hash, so re-runs skip binning entirely).
+
+Writes next to lgbm_market_only.pkl:
+    lgbm_market_only_best_params.json   best config (+ rounds)
+    lgbm_market_only_trials.csv         every trial at every rung
+"""
+import argparse
+import json
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+import yaml
+from loguru import logger
+
+from common.config.paths import ML_ARTIFACTS_DIR, ML_CONFIG_FILE, TRAIN_DATASET_FILE
+from common.fingerprint import file_sha256
+from common.lazy import lazy_import
+from .models_baseline import BEST_PARAMS_FILE, DATASET_SCHEMA, FEATURE_COLS, LGBM_PARAMS, TARGET_COL
+from .profiling import profiled_stage, step
+from .schemas import read_parquet
+
+lgb = lazy_import("lightgbm")
+
+TRIALS_FILE = ML_ARTIFACTS_DIR / "lgbm_market_only_trials.csv"
+BINARY_CACHE_DIR = ML_ARTIFACTS_DIR / "tuning"
+
+# Binning is fixed once the Dataset is built; everything below can vary per trial
+DATASET_PARAMS = {'max_bin': 255, 'feature_pre_filter': False, 'verbose': -1}
+
+SEARCH_SPACE = {
+    # name: (low, high, log scale, integer)
+    'num_leaves': (8, 128, True, True),
+    'learning_rate': (0.01, 0.2, True, False),
+    'min_data_in_leaf': (10, 200, True, True),
+    'feature_fraction': (0.5, 1.0, False, False),
+    'bagging_fraction': (0.5, 1.0, False, False),
+    'lambda_l2': (1e-3, 10.0, True, False),
+}
+
+
+def sample_configs(n_trials: int, seed: int = 42) -> List[dict]:
+    rng = np.random.default_rng(seed)
+    configs = []
+    for _ in range(n_trials):
+        config = {}
+        for name, (low, high, log, integer) in SEARCH_SPACE.items():
+            value = math.exp(rng.uniform(math.log(low), math.log(high))) if log else rng.uniform(low, high)
+            config[name] = int(round(value)) if integer else float(value)
+        configs.append(config)
+    return configs
+
+
+def _time_split(df: pd.DataFrame, valid_fraction: float) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    df = df.sort_values('timestamp', kind='stable')
+    split_idx = int(len(df) * (1 - valid_fraction))
+    return df.iloc[:split_idx], df.iloc[split_idx:]
+
+
+def build_binary_datasets(data_file: Path = TRAIN_DATASET_FILE,
+                          valid_fraction: float = 0.2) -> Tuple[Path, Path]:
+    """Bin train/valid once and save as LightGBM binaries (reused while the data is unchanged)."""
+    key = file_sha256(data_file)[:16]
+    train_bin = BINARY_CACHE_DIR / f"{key}_train.bin"
+    valid_bin = BINARY_CACHE_DIR / f"{key}_valid.bin"
+    if train_bin.exists() and valid_bin.exists():
+        logger.info(f"Reusing binned datasets {train_bin.name}, {valid_bin.name}")
+        return train_bin, valid_bin
+
+    BINARY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    train_df, valid_df = _time_split(read_parquet(data_file, DATASET_SCHEMA), valid_fraction)
+    train_data = lgb.Dataset(train_df[FEATURE_COLS], label=train_df[TARGET_COL], params=DATASET_PARAMS)
+    valid_data = lgb.Dataset(valid_df[FEATURE_COLS], label=valid_df[TARGET_COL], reference=train_data)
+    for data, path in ((train_data, train_bin), (valid_data, valid_bin)):
+        tmp_path = path.with_suffix(".bin.tmp")
+        data.save_binary(str(tmp_path))
+        tmp_path.replace(path)
+    logger.info(f"Binned {len(train_df):,} train / {len(valid_df):,} valid rows → {BINARY_CACHE_DIR}")
+    return train_bin, valid_bin
+
+
+# ---- worker side: binary datasets are loaded and constructed once per process ----
+
+_DATA = {}
+
+
+def _init_worker(train_bin: str, valid_bin: str, num_threads: int):
+    params = {**DATASET_PARAMS, 'num_threads': num_threads}
+    train_data = lgb.Dataset(train_bin, params=params).construct()
+    valid_data = lgb.Dataset(valid_bin, reference=train_data, params=params).construct()
+    _DATA.update(train=train_data, valid=valid_data, num_threads=num_threads)
+
+
+def _run_trial(trial: int, config: dict, rounds: int, early_stopping_rounds: int) -> dict:
+    start = time.perf_counter()
+    params = {**LGBM_PARAMS, **DATASET_PARAMS, **config, 'num_threads': _DATA['num_threads']}
+    evals = {}
+    model = lgb.train(
+        params, _DATA['train'],
+        num_boost_round=rounds,
+        valid_sets=[_DATA['valid']],
+        valid_names=['valid'],
+        callbacks=[lgb.early_stopping(early_stopping_rounds, verbose=False),
+                   lgb.record_evaluation(evals)],
+    )
+    best_iteration = model.best_iteration or rounds
+    return {
+        'trial': trial,
+        'rounds': rounds,
+        'best_iteration': best_iteration,
+        'rmse': float(evals['valid']['rmse'][best_iteration - 1]),
+        'seconds': time.perf_counter() - start,
+        **config,
+    }
+
+
+@profiled_stage("tuning")
+def run_tuning(n_trials: int = 27, eta: int = 3, min_rounds: int = 50, max_rounds: int = 1000,
+               early_stopping_rounds: int = 50, max_workers: int = 4, seed: int = 42,
+               data_file: Path = TRAIN_DATASET_FILE) -> dict:
+    """
+    1. Bin the train/valid split once (LightGBM binary cache)
+    2. Successive halving: rung budgets min_rounds * eta^k, keep top 1/eta
+    3. Save best params + the full trial log
+    """
+    logger.info("Hyperparameter search (successive halving)...")
+    if eta < 2:
+        raise ValueError("eta must be >= 2")
+
+    # Step 1: Shared binned datasets
+    with step("bin_datasets"):
+        train_bin, valid_bin = build_binary_datasets(data_file)
+
+    # Step 2: Rungs over a process pool (threads split between workers)
+    configs = dict(enumerate(sample_configs(n_trials, seed)))
+    workers = max(1, min(max_workers, n_trials))
+    num_threads = max(1, (os.cpu_count() or 1) // workers)
+    log = []
+    survivors = list(configs)
+    rounds = min_rounds
+    rung = 0
+    # Spawned, not forked: forking after LightGBM/OpenMP threads exist can deadlock the workers
+    with step("search"), ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_init_worker,
+                                             initargs=(str(train_bin), str(valid_bin), num_threads)) as pool:
+        while True:
+            results = list(pool.map(
+                _run_trial, survivors, [configs[t] for t in survivors],
+                [rounds] * len(survivors), [early_stopping_rounds] * len(survivors),
+            ))
+            results.sort(key=lambda r: r['rmse'])
+            last_rung = len(results) <= 1 or rounds >= max_rounds
+            keep = 1 if last_rung else max(1, len(results) // eta)
+            for rank, result in enumerate(results):
+                log.append({'rung': rung, 'promoted': rank < keep and not last_rung, **result})
+            logger.info(f"  rung {rung}: {len(results):>3} trials x {rounds:>4} rounds | "
+                        f"best rmse {results[0]['rmse']:.6f} (trial {results[0]['trial']})")
+            if last_rung:
+                break
+            survivors = [r['trial'] for r in results[:keep]]
+            rounds = min(rounds * eta, max_rounds)
+            rung += 1
+
+    # Step 3: Persist
+    best = results[0]
+    best_params = {
+        'params': {**LGBM_PARAMS, **configs[best['trial']]},
+        'num_boost_round': best['best_iteration'],
+        'valid_rmse': best['rmse'],
+        'trial': best['trial'],
+        'n_trials': n_trials,
+        'dataset_sha256': file_sha256(data_file),
+    }
+    ML_ARTIFACTS_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_path = BEST_PARAMS_FILE.with_suffix(".json.tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(best_params, f, indent=2)
+    tmp_path.replace(BEST_PARAMS_FILE)
+    pd.DataFrame(log).to_csv(TRIALS_FILE, index=False)
+
+    total_rounds = sum(r['rounds'] for r in log)
+    logger.success("Tuning COMPLETE")
+    logger.success(f"   Best trial {best['trial']}: rmse {best['rmse']:.6f} @ {best['best_iteration']} rounds")
+    logger.success(f"   {len(log)} trial runs, {total_rounds:,} rounds budgeted "
+                   f"(vs {n_trials * max_rounds:,} without pruning)")
+    logger.success(f"   Best params: {BEST_PARAMS_FILE}")
+    logger.success(f"   Trial log: {TRIALS_FILE}")
+    return best_params
+
+
+if __name__ == "__main__":
+    with open(ML_CONFIG_FILE) as f:
+        defaults = yaml.safe_load(f).get('tuning', {})
+    parser = argparse.ArgumentParser(description="Successive-halving search for LightGBM params")
+    for key in ('n_trials', 'eta', 'min_rounds', 'max_rounds', 'early_stopping_rounds', 'max_workers', 'seed'):
+        parser.add_argument(f"--{key.replace('_', '-')}", type=int, default=defaults.get(key))
+    args = parser.parse_args()
+    run_tuning(**{k: v for k, v in vars(args).items() if v is not None})
@@ -0,0 +1,154 @@
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from serving.api_gateway.metrics import INFERENCE_STAGE_SECONDS, QUEUE_REJECTED
+from serving.api_gateway.model_service import FeatureNotFoundError, ModelNotReadyError, ModelService
+from serving.api_gateway.schemas.forecast import ForecastBatchError, ForecastRequest, ForecastResponse
+
+logger = logging.getLogger("api_gateway.batching")
+
+
+class QueueFullError(RuntimeError):
+    """Too many requests waiting for inference (backpressure → 503)."""
+
+
+class InferenceDispatcher:
+    """
+    Coalesces concurrent /forecast requests into micro-batches.
+
+    Callers enqueue (request, future) and await the future. One collector task
+    takes the first waiting request and, if others are arriving alongside it,
+    keeps collecting until `max_batch` items or `window_ms` elapse. It then
+    scores the batch with a single vectorised ModelService.predict_many call
+    on a dedicated worker thread, so the event loop never runs inference. While a batch is scoring, new requests queue up
+    and form the next batch: under load batches grow, and an idle server
+    still answers within one window. A full queue fails fast instead of
+    growing latency without bound. Cache hits are answered before queueing.
+    """
+
+    def __init__(self, service: ModelService, window_ms: float = 2.0, max_batch: int = 64, max_queue: int = 2048):
+        self.service = service
+        self.window_s = window_ms / 1000
+        self.max_batch = max_batch
+        self.max_queue = max_queue
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.batches = 0
+        self.items = 0
+        self.rejected = 0
+        self.max_batch_seen = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_s > 0 and self.max_batch > 1
+
+    async def start(self):
+        if not self.enabled or self._task is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="inference")
+        self._task = asyncio.get_running_loop().create_task(self._collect(), name="inference-dispatcher")
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        while not self._queue.empty():
+            _, future, _ = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(ModelNotReadyError("server is shutting down"))
+        self._executor.shutdown(wait=False)
+        self._task = self._queue = self._executor = None
+
+    async def submit(self, req: ForecastRequest) -> ForecastResponse:
+        if not self.service.ready:
+            raise ModelNotReadyError(self.service.load_error or "model is warming up")
+        cached = self.service.cached(req)
+        if cached is not None:
+            return cached
+        if self._queue is None:
+            # Batching off: still keep inference off the event loop
+            return await run_in_threadpool(self.service.predict, req)
+
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((req, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            QUEUE_REJECTED.inc()
+            raise QueueFullError(f"inference queue is full ({self.max_queue} pending)")
+        return await future
+
+    async def _collect(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(0)   # let requests that are already in flight enqueue
+            if self._queue.empty():
+                # Nothing concurrent: don't make a lone request pay the window
+                await self._run_batch(loop, batch)
+                continue
+            deadline = loop.time() + self.window_s
+            while len(batch) < self.max_batch:
+                if not self._queue.empty():
+                    batch.append(self._queue.get_nowait())
+                    continue
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            await self._run_batch(loop, batch)
+
+    async def _run_batch(self, loop: asyncio.AbstractEventLoop, batch: List[Tuple[ForecastRequest, asyncio.Future, float]]):
+        batch = [entry for entry in batch if not entry[1].cancelled()]   # client went away
+        if not batch:
+            return
+        now = time.perf_counter()
+        for _, _, enqueued_at in batch:
+            INFERENCE_STAGE_SECONDS.observe(now - enqueued_at, "queue_wait", self.service.backend, self.service.model_version)
+        self.batches += 1
+        self.items += len(batch)
+        self.max_batch_seen = max(self.max_batch_seen, len(batch))
+        try:
+            results = await loop.run_in_executor(self._executor, self.service.predict_many, [req for req, _, _ in batch])
+        except Exception as e:
+            logger.exception("inference batch failed")
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for (_, future, _), result in zip(batch, results):
+            if future.done():
+                continue
+            if isinstance(result, ForecastBatchError):
+                future.set_exception(FeatureNotFoundError(result.detail))
+            else:
+                future.set_result(result)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "window_ms": self.window_s * 1000,
+            "max_batch": self.max_batch,
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": self.items / self.batches if self.batches else 0.0,
+            "max_batch_seen": self.max_batch_seen,
+            "rejected": self.rejected,
+        }
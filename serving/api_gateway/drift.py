@@ -0,0 +1,124 @@
+import logging
+import math
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from common.drift import bin_index, load_reference, score
+
+logger = logging.getLogger("api_gateway.drift")
+
+
+class DriftMonitor:
+    """
+    Live feature histograms over a sliding window, scored against the
+    training reference (common/drift.py).
+
+    The window holds the last ~`window_size` feature vectors /forecast
+    scored, split into `n_slices` count matrices (features x bins). Starting
+    a new slice drops the oldest, so memory is fixed and an update is one
+    bin search per feature. Scores (PSI, binned KS) are computed from the
+    counts alone. Windows are per process.
+    """
+
+    def __init__(self, reference_path: Path, window_size: int = 5_000, n_slices: int = 10,
+                 psi_threshold: float = 0.2, min_samples: int = 200):
+        self.reference_path = Path(reference_path)
+        self.n_slices = max(1, n_slices)
+        self.slice_size = max(1, window_size // self.n_slices)
+        self.psi_threshold = psi_threshold
+        self.min_samples = min_samples
+        self.reference: Optional[dict] = None
+        self.feature_names: List[str] = []
+        self.columns: List[int] = []          # feature → column in the model's input row
+        self.edges: List[np.ndarray] = []
+        self._edge_lists: List[list] = []     # same edges as lists: bisect beats numpy for one value
+        self._slices: Optional[np.ndarray] = None
+        self._current = 0
+        self._filled = 0
+        self.observed = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._slices is not None
+
+    def load(self, model_feature_names: List[str]) -> bool:
+        """Read the reference and bind its features to the model's column order; False if unavailable."""
+        if not self.reference_path.exists():
+            logger.warning("no drift reference; drift monitoring disabled", extra={"path": str(self.reference_path)})
+            return False
+        reference = load_reference(self.reference_path)
+        names = [name for name in reference["features"] if name in model_feature_names]
+        self.reference = reference
+        self.feature_names = names
+        self.columns = [model_feature_names.index(name) for name in names]
+        self.edges = [np.asarray(reference["features"][name]["edges"], dtype=np.float64) for name in names]
+        self._edge_lists = [edges.tolist() for edges in self.edges]
+        n_bins = max((len(edges) + 2 for edges in self.edges), default=2)
+        with self._lock:
+            self._slices = np.zeros((self.n_slices, len(names), n_bins), dtype=np.int64)
+            self._current = self._filled = self.observed = 0
+        return True
+
+    def _advance(self):
+        self._current = (self._current + 1) % self.n_slices
+        self._slices[self._current] = 0
+        self._filled = 0
+
+    def observe_row(self, row: np.ndarray):
+        """One feature vector (the single-forecast path)."""
+        if self._slices is None:
+            return
+        bins = [len(edges) + 1 if math.isnan(value) else bisect_left(edges, value)
+                for edges, value in zip(self._edge_lists, (float(row[c]) for c in self.columns))]
+        with self._lock:
+            if self._filled >= self.slice_size:
+                self._advance()
+            counts = self._slices[self._current]
+            for k, b in enumerate(bins):
+                counts[k, b] += 1
+            self._filled += 1
+            self.observed += 1
+
+    def observe(self, X: np.ndarray):
+        """Many feature vectors (batch paths); vectorised per slice."""
+        if self._slices is None or len(X) == 0:
+            return
+        n_features, n_bins = self._slices.shape[1:]
+        bins = np.column_stack([bin_index(X[:, c].astype(np.float64), edges)
+                                for c, edges in zip(self.columns, self.edges)])
+        offsets = np.arange(n_features) * n_bins
+        with self._lock:
+            start = 0
+            while start < len(bins):
+                if self._filled >= self.slice_size:
+                    self._advance()
+                stop = min(len(bins), start + self.slice_size - self._filled)
+                flat = (bins[start:stop] + offsets).ravel()
+                self._slices[self._current] += np.bincount(flat, minlength=n_features * n_bins).reshape(n_features, n_bins)
+                self._filled += stop - start
+                start = stop
+            self.observed += len(bins)
+
+    def report(self) -> dict:
+        if self._slices is None:
+            return {"feature_drift": False, "status": "disabled", "detail": "no drift reference loaded", "features": {}}
+        with self._lock:
+            window = self._slices.sum(axis=0)
+        n = int(window[0].sum()) if len(window) else 0
+        body = {"window_size": n, "window_capacity": self.slice_size * self.n_slices, "observed": self.observed,
+                "reference_rows": self.reference["n_rows"], "reference_created_at": self.reference.get("created_at"),
+                "psi_threshold": self.psi_threshold}
+        if n < self.min_samples:
+            return {"feature_drift": False, "status": "insufficient_data", **body, "min_samples": self.min_samples, "features": {}}
+
+        reference_counts = {name: self.reference["features"][name]["counts"] for name in self.feature_names}
+        live_counts = {name: window[k, :len(self.edges[k]) + 2] for k, name in enumerate(self.feature_names)}
+        features = score(reference_counts, live_counts, self.reference["n_rows"], self.psi_threshold)
+        drifted = [name for name, result in features.items() if result["drift"]]
+        return {"feature_drift": bool(drifted), "status": "drift" if drifted else "ok", **body,
+                "drifted_features": drifted, "features": features}
@@ -0,0 +1,208 @@
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow.parquet as pq
+
+from common.config.paths import SHAP_DATASET_DIR
+from common.config.settings import settings
+from common.lazy import is_available, lazy_import
+from serving.api_gateway.feature_store import FeatureNotFoundError, FeatureSnapshot, to_utc_ns
+from serving.api_gateway.metrics import CACHE_LOOKUPS, INFERENCE_STAGE_SECONDS
+from serving.api_gateway.model_service import HORIZON_BARS, ModelNotReadyError, ModelService
+from serving.api_gateway.prediction_cache import PredictionCache
+from serving.api_gateway.schemas.explain import ExplainRequest,ExplainMetadata,ExplainResponse,EvidenceItem,FeatureAttribution
+
+logger = logging.getLogger("api_gateway.explain_service")
+
+joblib = lazy_import("joblib")
+# Optional, and ~2 s to import: loaded by load() in the warm-up thread, never at startup.
+# Without it, LightGBM's native TreeSHAP (pred_contrib) is used.
+shap = lazy_import("shap") if is_available("shap") else None
+
+TOP_DRIVERS = 3
+PROMPT_VERSION = "prompt-explain-v0"
+
+
+class ExplainService:
+    """
+    Per-request SHAP attributions behind /explain.
+
+    Explains the same as-of bar /forecast scores, with the same horizon model.
+    Bars covered by the precomputed SHAP partition of the served model version
+    (ml/src/explainability.py, 1d model) are answered from an in-memory index;
+    other bars, bars whose features were restated since, or horizons with their
+    own model are explained on the fly by TreeExplainers built once at load.
+    Responses are cached.
+    """
+
+    def __init__(self, model_service: ModelService, shap_dir: Path = SHAP_DATASET_DIR) -> None:
+        self.model_service = model_service
+        self.shap_dir = Path(shap_dir)
+        self.index: Optional[FeatureSnapshot] = None   # rows: [shap_*, feature values, base_value]
+        self.boosters: Dict[str, object] = {}        # horizon → Booster, as ModelService.predictors
+        self.explainers: Dict[str, object] = {}
+        self.expected_values: Dict[str, float] = {}
+        self.feature_names: List[str] = []
+        self.cache = PredictionCache(settings.prediction_cache_size, settings.prediction_cache_ttl_s)
+        self.load_error: Optional[str] = None
+        self.precomputed = 0
+        self.computed = 0
+        self._ready = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    def load(self) -> None:
+        """Build the explainer and SHAP index; run after ModelService.load()."""
+        try:
+            service = self.model_service
+            if not service.ready:
+                raise ModelNotReadyError(service.load_error or "model is not loaded")
+            self.feature_names = list(service.feature_names)
+            # The flat backend keeps no Booster in memory
+            if service.backend == "lightgbm":
+                self.boosters = dict(service.predictors)
+            else:
+                boosters = {**(service.load_bundle() if len(service.predictors) > 1 else {}),
+                            "1d": joblib.load(service.model_path)}
+                self.boosters = {horizon: boosters[horizon] for horizon in service.predictors if horizon in boosters}
+            if shap is not None:
+                for horizon, booster in self.boosters.items():
+                    self.explainers[horizon] = shap.TreeExplainer(booster)
+                    self.expected_values[horizon] = float(np.ravel(self.explainers[horizon].expected_value)[0])
+            self.index = self._load_index(service.model_version)
+
+            # Warm-up: first call builds the explainer's internal buffers
+            for horizon in self.boosters:
+                self._compute(np.zeros((1, len(self.feature_names)), dtype=np.float32), horizon)
+            self._ready.set()
+            logger.info("explainer ready", extra={"model_version": service.model_version,
+                                                  "horizon_models": sorted(self.boosters),
+                                                  "precomputed_rows": self.index.n_rows if self.index else 0,
+                                                  "explainer": "shap" if self.explainers else "pred_contrib"})
+        except Exception as e:
+            self.load_error = f"{type(e).__name__}: {e}"
+            logger.exception("explainer load failed")
+
+    def _load_index(self, model_version: str) -> Optional[FeatureSnapshot]:
+        version_dir = self.shap_dir / f"model_version={model_version}"
+        if not version_dir.exists() or not any(version_dir.glob("*.parquet")):
+            logger.warning("no precomputed SHAP values for this model; explaining on the fly",
+                           extra={"model_version": model_version})
+            return None
+        columns = [f"shap_{name}" for name in self.feature_names] + self.feature_names + ["base_value"]
+        table = pq.read_table(version_dir, columns=["symbol", "timestamp", *columns])
+        return FeatureSnapshot.from_table(table, columns, version=model_version, dtype=np.float64)
+
+    def explain(self, req: ExplainRequest) -> ExplainResponse:
+        if not self.ready:
+            raise ModelNotReadyError(self.load_error or self.model_service.load_error or "explainer is warming up")
+
+        snapshot = self.model_service.features.snapshot
+        versions = (self.model_service.model_version, snapshot.version)
+        key = (req.symbol, req.as_of, req.as_of.utcoffset(), req.horizon, *versions)
+        if self.cache.enabled:
+            cached = self.cache.get(key, versions)
+            CACHE_LOOKUPS.inc("explain", "miss" if cached is None else "hit")
+            if cached is not None:
+                return cached
+
+        start = time.perf_counter()
+        i = snapshot.row_index(req.symbol, to_utc_ns(req.as_of))
+        row = snapshot.values[i:i + 1]
+        horizon = self._model_horizon(req.horizon)
+        # The precomputed partition holds the 1d model's attributions
+        attribution = self._precomputed(req.symbol, snapshot.timestamps[i], row) if horizon == "1d" else None
+        if attribution is None:
+            contrib, base_value = self._compute(row, horizon)
+            source = "computed"
+            self.computed += 1
+        else:
+            contrib, base_value = attribution
+            source = "precomputed"
+            self.precomputed += 1
+        INFERENCE_STAGE_SECONDS.observe(time.perf_counter() - start, f"shap_{source}",
+                                        self.model_service.backend, self.model_service.model_version)
+
+        response = self._response(req, row[0], contrib, base_value, source, snapshot.version)
+        if self.cache.enabled:
+            self.cache.put(key, versions, response)
+        return response
+
+    def _precomputed(self, symbol: str, bar_ns: int, row: np.ndarray) -> Optional[Tuple[np.ndarray, float]]:
+        index = self.index
+        if index is None:
+            return None
+        try:
+            j = index.row_index(symbol, bar_ns)
+        except FeatureNotFoundError:
+            return None
+        if index.timestamps[j] != bar_ns:
+            return None
+        n = len(self.feature_names)
+        values = index.values[j]
+        # Stored attributions only hold for the feature values they were computed on
+        if not np.array_equal(values[n:2 * n].astype(np.float32), row[0], equal_nan=True):
+            return None
+        return values[:n], float(values[-1])
+
+    def _model_horizon(self, horizon: str) -> str:
+        return horizon if horizon in self.boosters else "1d"
+
+    def _compute(self, row: np.ndarray, horizon: str = "1d") -> Tuple[np.ndarray, float]:
+        if horizon in self.explainers:
+            return np.ravel(self.explainers[horizon].shap_values(row)), self.expected_values[horizon]
+        contrib = self.boosters[horizon].predict(row, pred_contrib=True)[0]
+        return contrib[:-1], float(contrib[-1])
+
+    def _response(self, req: ExplainRequest, row: np.ndarray, contrib: np.ndarray, base_value: float,
+                  source: str, feature_version: str) -> ExplainResponse:
+        # Horizons without their own model use the 1-bar model scaled, as /forecast does;
+        # attributions sum to its predicted_return
+        bars = 1 if req.horizon in self.boosters else HORIZON_BARS[req.horizon]
+        contrib = np.asarray(contrib, dtype=np.float64) * bars
+        base_value *= bars
+        predicted = base_value + float(contrib.sum())
+
+        order = np.argsort(-np.abs(contrib), kind="stable")
+        attributions = [
+            FeatureAttribution(feature=self.feature_names[k],value=float(row[k]) if math.isfinite(row[k]) else None,shap=float(contrib[k]),)
+            for k in order
+        ]
+        top_drivers = [
+            f"{a.feature} = {_fmt(a.value)} {'raised' if a.shap > 0 else 'lowered'} the forecast by {abs(a.shap):.2e}"
+            for a in attributions[:TOP_DRIVERS] if a.shap != 0
+        ]
+        summary = (f"{req.symbol} {req.horizon} predicted return {predicted:+.3%} against a {base_value:+.3%} "
+                   f"baseline; " + (f"largest driver: {attributions[0].feature}." if top_drivers else "no feature moved the forecast."))
+
+        meta = ExplainMetadata(model_version=self.model_service.model_version,prompt_version=PROMPT_VERSION,feature_version=feature_version,attribution_source=source,)
+
+        return ExplainResponse(symbol=req.symbol,as_of=req.as_of,horizon=req.horizon,summary=summary,top_drivers=top_drivers,evidence=_placeholder_evidence(req.symbol),meta=meta,base_value=base_value,predicted_return=predicted,attributions=attributions,)
+
+    def stats(self) -> dict:
+        return {"ready": self.ready,"precomputed_rows": self.index.n_rows if self.index else 0,"precomputed_hits": self.precomputed,"computed": self.computed,"cache": self.cache.stats(),}
+
+
+def _fmt(value: Optional[float]) -> str:
+    return "n/a" if value is None else f"{value:.4g}"
+
+
+def _placeholder_evidence(symbol: str) -> List[EvidenceItem]:
+    # Until the RAG pipeline lands, evidence stays a fixed example
+    return [EvidenceItem(
+        id="evt-1",
+        source="news",
+        title=f"{symbol} rallies on positive earnings",
+        snippet=f"{symbol} reported better-than-expected earnings, "
+                f"driving bullish sentiment in the short term.",
+        published_at=datetime.utcnow() - timedelta(hours=12),
+        url="https://example.com/news/a",
+    )]
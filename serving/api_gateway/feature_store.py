@@ -0,0 +1,182 @@
+import array
+import logging
+import threading
+from bisect import bisect_right
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from common.fingerprint import file_sha256
+
+logger = logging.getLogger("api_gateway.feature_store")
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+EPOCH_NAIVE = datetime(1970, 1, 1)
+
+
+class FeatureNotFoundError(LookupError):
+    """No usable feature row for (symbol, as_of)."""
+
+
+def to_utc_ns(ts: datetime) -> int:
+    """Epoch nanoseconds; naive datetimes are taken as UTC."""
+    delta = ts - (EPOCH_NAIVE if ts.tzinfo is None else EPOCH)
+    return (delta.days * 86_400 + delta.seconds) * 1_000_000_000 + delta.microseconds * 1_000
+
+
+class FeatureSnapshot:
+    """
+    Immutable point-in-time view of market.parquet.
+
+    Rows are grouped by symbol and time-ordered; `bounds[symbol]` is the
+    symbol's [lo, hi) row range into one contiguous int64 timestamp array and
+    one contiguous float32 (rows, features) matrix.
+    """
+
+    __slots__ = ("version", "feature_names", "timestamps", "values", "bounds", "stat")
+
+    def __init__(self, version: str, feature_names: List[str], timestamps: array.array,
+                 values: np.ndarray, bounds: Dict[str, Tuple[int, int]], stat: Tuple[int, int]):
+        self.version = version
+        self.feature_names = feature_names
+        self.timestamps = timestamps
+        self.values = values
+        self.bounds = bounds
+        self.stat = stat
+
+    @classmethod
+    def read(cls, path: Path, feature_names: List[str]) -> "FeatureSnapshot":
+        stat = path.stat()
+        table = pq.read_table(path, columns=["symbol", "timestamp", *feature_names])
+        return cls.from_table(table, feature_names, version=file_sha256(path)[:12],
+                              stat=(stat.st_mtime_ns, stat.st_size))
+
+    @classmethod
+    def from_table(cls, table: pa.Table, value_names: List[str], version: str,
+                   stat: Tuple[int, int] = (0, 0), dtype=np.float32) -> "FeatureSnapshot":
+        """Index any (symbol, timestamp, *value_names) table; values are stored as `dtype`."""
+        symbols = table.column("symbol").to_numpy(zero_copy_only=False).astype(str)
+        ts = (table.column("timestamp").cast(pa.timestamp("ns", tz="UTC"))
+                   .to_numpy().astype("datetime64[ns]").astype(np.int64))
+        values = np.column_stack([
+            table.column(name).to_numpy(zero_copy_only=False).astype(dtype) for name in value_names
+        ]) if value_names else np.empty((len(ts), 0), dtype=dtype)
+
+        order = np.lexsort((ts, symbols))
+        symbols, ts = symbols[order], ts[order]
+        starts = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]]) if len(ts) else np.array([], dtype=int)
+        ends = np.r_[starts[1:], len(ts)]
+        return cls(
+            version=version,
+            feature_names=list(value_names),
+            timestamps=array.array("q", ts.tobytes()),   # bisect-able without boxing the whole index
+            values=np.ascontiguousarray(values[order]),
+            bounds={symbols[lo]: (int(lo), int(hi)) for lo, hi in zip(starts, ends)},
+            stat=stat,
+        )
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.timestamps)
+
+    def row_index(self, symbol: str, as_of_ns: int) -> int:
+        """Index of the latest bar at or before `as_of_ns` (binary search, no disk)."""
+        bounds = self.bounds.get(symbol)
+        if bounds is None:
+            raise FeatureNotFoundError(f"unknown symbol {symbol!r}")
+        lo, hi = bounds
+        i = bisect_right(self.timestamps, as_of_ns, lo, hi) - 1
+        if i < lo:
+            raise FeatureNotFoundError(f"no features for {symbol} before the requested as_of")
+        return i
+
+
+class OnlineFeatureStore:
+    """
+    Point-in-time feature lookups served from memory.
+
+    load() builds a new snapshot and swaps it in with a single reference
+    assignment, so readers always see a complete snapshot. A watcher thread
+    polls the file's (mtime, size) and reloads when the pipeline publishes
+    new features; a failed reload keeps the current snapshot.
+    """
+
+    def __init__(self, path: Path, feature_names: Optional[List[str]] = None,
+                 reload_interval_s: float = 30.0):
+        self.path = Path(path)
+        self.feature_names = list(feature_names or [])
+        self.reload_interval_s = reload_interval_s
+        self._snapshot: Optional[FeatureSnapshot] = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher: Optional[threading.Thread] = None
+
+    @property
+    def snapshot(self) -> FeatureSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            raise FeatureNotFoundError("feature store is not loaded")
+        return snapshot
+
+    @property
+    def ready(self) -> bool:
+        return self._snapshot is not None
+
+    @property
+    def version(self) -> str:
+        return self._snapshot.version if self._snapshot is not None else "unloaded"
+
+    def load(self) -> FeatureSnapshot:
+        with self._reload_lock:
+            snapshot = FeatureSnapshot.read(self.path, self.feature_names)
+            previous, self._snapshot = self._snapshot, snapshot
+        logger.info("feature snapshot loaded", extra={
+            "feature_version": snapshot.version, "rows": snapshot.n_rows, "symbols": len(snapshot.bounds),
+            "previous_version": previous.version if previous else None,
+        })
+        return snapshot
+
+    def lookup(self, symbol: str, as_of: datetime) -> Tuple[np.ndarray, str]:
+        """(1, n_features) float32 row for the latest bar at or before `as_of`, plus the snapshot version."""
+        snapshot = self.snapshot
+        i = snapshot.row_index(symbol, to_utc_ns(as_of))
+        return snapshot.values[i:i + 1], snapshot.version
+
+    # ---- hot reload ----
+
+    def reload_if_changed(self) -> bool:
+        try:
+            stat = self.path.stat()
+        except FileNotFoundError:
+            return False
+        current = self._snapshot
+        if current is not None and current.stat == (stat.st_mtime_ns, stat.st_size):
+            return False
+        try:
+            self.load()
+            return True
+        except Exception:
+            logger.exception("feature reload failed; keeping current snapshot")
+            return False
+
+    def start_watcher(self):
+        if self._watcher is not None or self.reload_interval_s <= 0:
+            return
+        self._stop.clear()
+
+        def watch():
+            while not self._stop.wait(self.reload_interval_s):
+                self.reload_if_changed()
+
+        self._watcher = threading.Thread(target=watch, name="feature-store-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self):
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=5)
+            self._watcher = None
@@ -1,20 +1,49 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request
+import threading
 import time
 import logging
+from common.config.settings import settings
 from common.logging.logging_config import setup_logging
+from serving.api_gateway.metrics import HTTP_REQUEST_SECONDS, RECENT_SERVING_REQUESTS, SERVING_ROUTES, registry, route_template
 from serving.api_gateway.routers import forecast_router, explain_router, monitoring_router
+from serving.api_gateway.routers.forecast import dispatcher, model_service
+from serving.api_gateway.routers.explain import explain_service
 
 setup_logging()
 logger = logging.getLogger("api_gateway")
 
 
-app = FastAPI(title="FinSense API Gateway")
+def warm_up():
+    model_service.load()
+    explain_service.load()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Load + warm the model off the event loop; /monitoring/ready reports 503 until done
+    threading.Thread(target=warm_up, name="model-warmup", daemon=True).start()
+    await dispatcher.start()
+    registry.start_flusher(settings.metrics_flush_interval_s)
+    yield
+    await dispatcher.stop()
+    model_service.close()
+    registry.stop_flusher()
+
+
+app = FastAPI(title="FinSense API Gateway", lifespan=lifespan)
 
 @app.middleware("http")
 async def log_requests(request: Request,call_next):
-    start_time = time.time()
+    start_time = time.perf_counter()
     response= await call_next(request)
-    duration_ms = (time.time() - start_time) * 1000
+    duration_s = time.perf_counter() - start_time
+    duration_ms = duration_s * 1000
+    # Streamed bodies (/forecast/batch) are timed to the response headers
+    route, status = route_template(request.scope), str(response.status_code)
+    HTTP_REQUEST_SECONDS.observe(duration_s, route, request.method, status, model_service.model_version)
+    if request.method == "POST" and route.startswith(SERVING_ROUTES):
+        RECENT_SERVING_REQUESTS.inc(status)
     logger.info("request",extra={"path": request.url.path,"method":request.method,"status_code":response.status_code,"duration_ms":round(duration_ms,2),})
     return response
 
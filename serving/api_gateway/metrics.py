@@ -0,0 +1,312 @@
+"""
+In-process metrics: counters and fixed-bucket histograms.
+
+Recording is a dict lookup on the label values plus an index bump under a
+lock (around a microsecond), so it is safe on the request hot path. Series
+are exposed as JSON and as Prometheus text. Window counters keep per-hour
+buckets for the last 24h ("how many in the last day" without a Prometheus
+server); they are JSON-only, since Prometheus derives windows from counters.
+
+With several uvicorn workers, set FINSENSE_METRICS_DIR to a shared
+directory. Each process then writes its snapshot there (periodically, and
+on every scrape it serves), and a scrape merges every file: counters and
+bucket counts are summed. Files of exited workers are kept, so totals do
+not drop on restarts.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from common.config.settings import settings
+
+logger = logging.getLogger("api_gateway.metrics")
+
+# Seconds: 10 µs → 10 s
+LATENCY_BUCKETS = (1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3,
+                   0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.series: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, value: float = 1.0):
+        with self._lock:
+            self.series[label_values] = self.series.get(label_values, 0.0) + value
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            series = [[list(key), value] for key, value in self.series.items()]
+        return {"kind": self.kind, "help": self.help, "labels": list(self.labels), "series": series}
+
+
+class WindowCounter(Counter):
+    """
+    Counter over a sliding window: one series per label values and time bucket,
+    the bucket's start (epoch seconds) being the last label. Buckets that leave
+    the window are dropped, so the series sum to the last `window_s` seconds
+    (to bucket granularity).
+    """
+    kind = "window"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 window_s: int = 86_400, bucket_s: int = 3_600):
+        super().__init__(name, help, (*labels, "bucket_start"))
+        self.window_s, self.bucket_s = window_s, bucket_s
+
+    def inc(self, *label_values, value: float = 1.0):
+        bucket = int(time.time()) // self.bucket_s * self.bucket_s
+        key = (*label_values, bucket)
+        with self._lock:
+            if key not in self.series:   # new bucket: prune the ones that left the window
+                for old in [k for k in self.series if k[-1] <= bucket - self.window_s]:
+                    del self.series[old]
+            self.series[key] = self.series.get(key, 0.0) + value
+
+    def snapshot(self) -> dict:
+        return {**super().snapshot(), "window_s": self.window_s, "bucket_s": self.bucket_s}
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                 buckets: Iterable[float] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = tuple(buckets)
+        self.series: Dict[tuple, list] = {}   # label values → [bucket counts (+Inf last), sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values):
+        i = bisect_left(self.buckets, value)   # first bucket with le >= value
+        with self._lock:
+            state = self.series.get(label_values)
+            if state is None:
+                state = self.series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            state[0][i] += 1
+            state[1] += value
+            state[2] += 1
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            series = [[list(key), list(counts), total, count] for key, (counts, total, count) in self.series.items()]
+        return {"kind": self.kind, "help": self.help, "labels": list(self.labels),
+                "buckets": list(self.buckets), "series": series}
+
+
+class MetricsRegistry:
+    def __init__(self, multiproc_dir: Optional[str] = None):
+        self.metrics: Dict[str, object] = {}
+        self.multiproc_dir = Path(multiproc_dir) if multiproc_dir else None
+        self._file_name = f"metrics-{os.getpid()}-{time.time_ns()}.json"   # pid reuse must not clobber old totals
+        self._stop = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Iterable[float] = LATENCY_BUCKETS) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+    def window(self, name: str, help: str, labels: Tuple[str, ...] = (),
+               window_s: int = 86_400, bucket_s: int = 3_600) -> WindowCounter:
+        return self.metrics.setdefault(name, WindowCounter(name, help, labels, window_s, bucket_s))
+
+    def snapshot(self) -> dict:
+        return {name: metric.snapshot() for name, metric in self.metrics.items()}
+
+    # ---- multi-process aggregation ----
+
+    def flush(self):
+        if self.multiproc_dir is None:
+            return
+        self.multiproc_dir.mkdir(parents=True, exist_ok=True)
+        path = self.multiproc_dir / self._file_name
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        tmp_path.write_text(json.dumps(self.snapshot()))
+        tmp_path.replace(path)
+
+    def collect(self) -> dict:
+        """This process's snapshot, or the sum over every worker's file in multi-process mode."""
+        if self.multiproc_dir is None:
+            return self.snapshot()
+        self.flush()
+        snapshots = []
+        for path in sorted(self.multiproc_dir.glob("metrics-*.json")):
+            try:
+                snapshots.append(json.loads(path.read_text()))
+            except (OSError, ValueError):
+                logger.warning("skipping unreadable metrics file", extra={"path": str(path)})
+        return merge_snapshots(snapshots)
+
+    def start_flusher(self, interval_s: float):
+        if self.multiproc_dir is None or self._flusher is not None or interval_s <= 0:
+            return
+        self._stop.clear()
+
+        def run():
+            while not self._stop.wait(interval_s):
+                self.flush()
+
+        self._flusher = threading.Thread(target=run, name="metrics-flusher", daemon=True)
+        self._flusher.start()
+
+    def stop_flusher(self):
+        self._stop.set()
+        if self._flusher is not None:
+            self._flusher.join(timeout=5)
+            self._flusher = None
+        self.flush()
+
+
+COUNTER_KINDS = ("counter", "window")   # single-value series, summed across workers
+
+
+def merge_snapshots(snapshots: List[dict]) -> dict:
+    merged: Dict[str, dict] = {}
+    for snapshot in snapshots:
+        for name, metric in snapshot.items():
+            target = merged.setdefault(name, {**metric, "series": {}})
+            for entry in metric["series"]:
+                key = tuple(entry[0])
+                if metric["kind"] in COUNTER_KINDS:
+                    target["series"][key] = target["series"].get(key, 0.0) + entry[1]
+                else:
+                    counts, total, count = target["series"].get(key, ([0] * len(entry[1]), 0.0, 0))
+                    target["series"][key] = ([a + b for a, b in zip(counts, entry[1])], total + entry[2], count + entry[3])
+    for metric in merged.values():
+        if metric["kind"] in COUNTER_KINDS:
+            metric["series"] = [[list(key), value] for key, value in metric["series"].items()]
+        else:
+            metric["series"] = [[list(key), *state] for key, state in metric["series"].items()]
+    return merged
+
+
+# ---- exposition ----
+
+def _quantile(buckets: List[float], counts: List[int], q: float) -> Optional[float]:
+    """Linear interpolation inside the bucket holding the q-th observation (as histogram_quantile does)."""
+    total = sum(counts)
+    if total == 0:
+        return None
+    rank, cumulative = q * total, 0
+    for i, n in enumerate(counts):
+        if cumulative + n >= rank and n:
+            if i == len(buckets):     # +Inf bucket: best we can say is the top finite bound
+                return buckets[-1]
+            lower = buckets[i - 1] if i else 0.0
+            return lower + (buckets[i] - lower) * (rank - cumulative) / n
+        cumulative += n
+    return buckets[-1]
+
+
+def to_json(snapshot: dict) -> dict:
+    out = {}
+    for name, metric in snapshot.items():
+        rows = []
+        for entry in metric["series"]:
+            labels = dict(zip(metric["labels"], entry[0]))
+            if metric["kind"] in COUNTER_KINDS:
+                rows.append({"labels": labels, "value": entry[1]})
+                continue
+            counts, total, count = entry[1], entry[2], entry[3]
+            rows.append({
+                "labels": labels, "count": count, "sum": total,
+                "mean": total / count if count else None,
+                "p50": _quantile(metric["buckets"], counts, 0.50),
+                "p90": _quantile(metric["buckets"], counts, 0.90),
+                "p99": _quantile(metric["buckets"], counts, 0.99),
+            })
+        out[name] = {"kind": metric["kind"], "help": metric["help"], "series": rows}
+    return out
+
+
+def _label_str(names: List[str], values: List[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def to_prometheus(snapshot: dict) -> str:
+    """Prometheus text exposition format 0.0.4."""
+    lines = []
+    for name, metric in sorted(snapshot.items()):
+        if metric["kind"] == "window":   # JSON-only; Prometheus takes increase() over the counters
+            continue
+        lines.append(f"# HELP {name} {metric['help']}")
+        lines.append(f"# TYPE {name} {metric['kind']}")
+        names = metric["labels"]
+        for entry in metric["series"]:
+            if metric["kind"] == "counter":
+                lines.append(f"{name}{_label_str(names, entry[0])} {entry[1]}")
+                continue
+            counts, total, count = entry[1], entry[2], entry[3]
+            cumulative = 0
+            for bound, n in zip([*metric["buckets"], "+Inf"], counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{name}_bucket{_label_str(names, entry[0], le)} {cumulative}")
+            lines.append(f"{name}_sum{_label_str(names, entry[0])} {total}")
+            lines.append(f"{name}_count{_label_str(names, entry[0])} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def window_totals(metric: dict, now: Optional[float] = None) -> List[Tuple[dict, float]]:
+    """
+    (labels, value) per series of a window snapshot still inside the window at `now`.
+    Merged snapshots include files of exited workers, so their old buckets are dropped here.
+    """
+    now = time.time() if now is None else now
+    current = int(now) // metric["bucket_s"] * metric["bucket_s"]
+    names = metric["labels"][:-1]
+    return [(dict(zip(names, key[:-1])), value) for key, value in metric["series"]
+            if key[-1] > current - metric["window_s"]]
+
+
+SERVING_ROUTES = ("/forecast", "/explain")   # error rates cover these; /monitoring/ready 503s during warm-up on purpose
+
+
+def route_template(scope: dict) -> str:
+    """Matched route template ("/forecast/"), never the raw path: keeps label cardinality bounded."""
+    # FastAPI versions that resolve included routers lazily keep the prefixed template on the route context
+    route = (scope.get("fastapi") or {}).get("effective_route_context") or scope.get("route")
+    return getattr(route, "path_format", None) or "unmatched"
+
+
+registry = MetricsRegistry(settings.metrics_dir)
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template",
+    ("route", "method", "status", "model_version"))
+INFERENCE_STAGE_SECONDS = registry.histogram(
+    "inference_stage_duration_seconds", "Time per model-service stage",
+    ("stage", "backend", "model_version"))
+INFERENCE_BATCH_SIZE = registry.histogram(
+    "inference_batch_size", "Items per vectorised predict call", ("path",), buckets=SIZE_BUCKETS)
+CACHE_LOOKUPS = registry.counter(
+    "response_cache_lookups_total", "Response cache lookups by result", ("cache", "result"))
+PREDICTIONS = registry.counter(
+    "predictions_total", "Forecasts returned (batch items counted one by one)", ("route",))
+RECENT_PREDICTIONS = registry.window(
+    "predictions_recent", "Forecasts returned, per hour over the last 24h")
+RECENT_SERVING_REQUESTS = registry.window(
+    "serving_requests_recent", "POST /forecast and /explain requests by status, per hour over the last 24h",
+    ("status",))
+QUEUE_REJECTED = registry.counter(
+    "inference_queue_rejected_total", "Requests refused because the inference queue was full")
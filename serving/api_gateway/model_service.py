@@ -1,29 +1,299 @@
-from datetime import datetime, timedelta
+import logging
+import math
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
-from serving.api_gateway.schemas.forecast import ForecastRequest,ForecastResponse,PredictionPayload,RiskPayload,ModelMetadata
+import numpy as np
+import pyarrow.parquet as pq
+
+from common.config.paths import (BACKTEST_DIR, DRIFT_REFERENCE_FILE, ML_ARTIFACTS_DIR, MODEL_BUNDLE_FILE, PROCESSED_FEATURES_DIR,
+                                 TRAIN_DATASET_FILE)
+from common.config.settings import settings
+from common.fingerprint import file_sha256
+from common.lazy import lazy_import
+from common.flat_tree import FlatTreeModel
+from serving.api_gateway.drift import DriftMonitor
+from serving.api_gateway.metrics import CACHE_LOOKUPS, INFERENCE_BATCH_SIZE, INFERENCE_STAGE_SECONDS
+from serving.api_gateway.feature_store import FeatureNotFoundError, FeatureSnapshot, OnlineFeatureStore, to_utc_ns
+from serving.api_gateway.prediction_cache import PredictionCache
+from serving.api_gateway.schemas.forecast import ForecastRequest,ForecastResponse,PredictionPayload,RiskPayload,ModelMetadata,ForecastBatchError
+
+logger = logging.getLogger("api_gateway.model_service")
+
+joblib = lazy_import("joblib")   # unpickling the Booster loads lightgbm, at load() rather than import
+
+HORIZON_BARS = {"1d": 1, "5d": 5, "1w": 5}   # trading bars per horizon
+FLAT_BAND = 0.1                               # |return| < FLAT_BAND * sigma → "flat"
+Z_95, Z_99 = 1.6448536269514722, 2.3263478740408408
+ES_95 = 2.0627128075074257                    # phi(Z_95) / 0.05
+BATCH_CHUNK = 1024                            # rows per vectorised predict call in predict_batch
+
+
+class ModelNotReadyError(RuntimeError):
+    """Model or features are still loading (or failed to load)."""
 
 
 class ModelService:
-    def __init__(self, model_name: str = "dummy_model") -> None:
+    """
+    LightGBM baseline behind /forecast.
+
+    load() reads the model artifacts once and fills the online feature store;
+    predict() is then an in-memory as-of lookup + a single-row numpy predict.
+    Each horizon is scored by its own model from the horizon bundle when there
+    is one; otherwise the 1d model's forecast is scaled to the horizon.
+    backend: "lightgbm" (Booster.predict) or "flat" (exported flat trees,
+    lower fixed cost per call); defaults to settings.inference_backend.
+    """
+
+    def __init__(self, model_name: str = "lgbm_market_only",
+                 model_path: Path = ML_ARTIFACTS_DIR / "lgbm_market_only.pkl",
+                 features_path: Path = PROCESSED_FEATURES_DIR / "market.parquet",
+                 flat_model_path: Path = ML_ARTIFACTS_DIR / "lgbm_market_only_flat.npz",
+                 bundle_path: Path = MODEL_BUNDLE_FILE,
+                 backend: Optional[str] = None) -> None:
         self.model_name = model_name
-        self.model_version = "v0.1.0"
-        self.feature_version = "v0.0.1"
-        self.trained_to = datetime(2024, 12, 31)
+        self.model_path = Path(model_path)
+        self.flat_model_path = Path(flat_model_path)
+        self.bundle_path = Path(bundle_path)
+        self.backend = backend or settings.inference_backend
+        self.features = OnlineFeatureStore(features_path, reload_interval_s=settings.feature_reload_interval_s)
+        self.cache = PredictionCache(settings.prediction_cache_size, settings.prediction_cache_ttl_s)
+        self.drift = DriftMonitor(DRIFT_REFERENCE_FILE, settings.drift_window_size, settings.drift_window_slices,
+                                  settings.drift_psi_threshold, settings.drift_min_samples)
+        self.model_version = "unloaded"
+        self.model_sha256 = ""   # served 1d model; horizon models must come from its training run
+        self.trained_to: Optional[datetime] = None
+        self.backtest_window: Tuple[Optional[datetime], Optional[datetime]] = (None, None)
+        self.metadata: Optional[ModelMetadata] = None   # identical for every response → built once
+        self.predictor = None   # 1d model: anything with .predict(ndarray) → ndarray
+        self.predictors: Dict[str, object] = {}   # horizon → its own model (always has "1d")
+        self.feature_names = []
+        self.vol_col = -1
+        self.load_error: Optional[str] = None
+        self._ready = threading.Event()
+
+    @property
+    def ready(self) -> bool:
+        return self._ready.is_set()
+
+    @property
+    def feature_version(self) -> str:
+        return self.features.version
+
+    def load(self) -> None:
+        """Load model + features and warm the predictor; safe to run in a background thread."""
+        try:
+            self._load_model()
+            self.vol_col = self.feature_names.index("vol_20d")
+            self.features.feature_names = self.feature_names
+            self.features.load()
+            self.features.start_watcher()
+            self._load_metadata()
+            self.drift.load(self.feature_names)
+
+            # Warm-up: first call allocates LightGBM buffers / compiles the flat walk
+            for predictor in self.predictors.values():
+                predictor.predict(np.zeros((1, len(self.feature_names)), dtype=np.float32))
+            self._ready.set()
+            logger.info("model ready", extra={"backend": self.backend,
+                                              "model_version": self.model_version,
+                                              "horizon_models": sorted(self.predictors),
+                                              "feature_version": self.feature_version,
+                                              "symbols": len(self.features.snapshot.bounds)})
+        except Exception as e:
+            self.load_error = f"{type(e).__name__}: {e}"
+            logger.exception("model load failed")
+
+    def close(self) -> None:
+        self.features.stop_watcher()
+
+    def _load_model(self) -> None:
+        if self.backend == "lightgbm":
+            self.model_sha256 = file_sha256(self.model_path)
+            self.predictor = joblib.load(self.model_path)
+            self.feature_names = self.predictor.feature_name()
+            self.model_version = self.model_sha256[:12]
+            self.predictors = {**self.load_bundle(), "1d": self.predictor}
+        elif self.backend == "flat":
+            flat = FlatTreeModel.load(self.flat_model_path)
+            if self.model_path.exists() and file_sha256(self.model_path) != flat.source_sha256:
+                raise RuntimeError(f"{self.flat_model_path.name} is stale; run python -m ml.src.export_flat_model")
+            self.predictor = flat
+            self.feature_names = flat.feature_names
+            self.model_sha256 = flat.source_sha256
+            self.model_version = flat.source_sha256[:12]
+            self.predictors = {**self._load_flat_horizons(), "1d": flat}
+        else:
+            raise ValueError(f"Unknown inference backend: {self.backend}")
+
+    def load_bundle(self) -> Dict[str, object]:
+        """Per-horizon Boosters, only from a bundle trained together with the served 1d model."""
+        if not self.bundle_path.exists():
+            logger.warning("no model bundle; horizons scale the 1d forecast", extra={"bundle": self.bundle_path.name})
+            return {}
+        bundle = joblib.load(self.bundle_path)
+        if bundle["model_sha256"] != self.model_sha256:
+            logger.warning("model bundle is from another training run; horizons scale the 1d forecast",
+                           extra={"bundle": self.bundle_path.name})
+            return {}
+        return {horizon: entry["model"] for horizon, entry in bundle["horizons"].items()}
+
+    def _load_flat_horizons(self) -> Dict[str, FlatTreeModel]:
+        # Horizon exports are stamped with the 1d model's hash (their training run), so the
+        # bundle is never unpickled here: the flat backend runs without lightgbm
+        models = {}
+        for horizon in HORIZON_BARS:
+            path = self.flat_model_path.with_name(f"{self.flat_model_path.stem}_{horizon}.npz")
+            if horizon == "1d" or not path.exists():
+                continue
+            flat = FlatTreeModel.load(path)
+            if flat.source_sha256 != self.model_sha256:
+                raise RuntimeError(f"{path.name} is stale; run python -m ml.src.export_flat_model")
+            models[horizon] = flat
+        if not models:
+            logger.warning("no flat horizon models; horizons scale the 1d forecast",
+                           extra={"model": self.flat_model_path.name})
+        return models
+
+    def _load_metadata(self) -> None:
+        dates = pq.read_table(TRAIN_DATASET_FILE, columns=["timestamp"]).column("timestamp")
+        self.trained_to = dates.to_pandas().max().to_pydatetime()
+        folds_file = BACKTEST_DIR / "folds.parquet"
+        if folds_file.exists():
+            folds = pq.read_table(folds_file, columns=["test_from", "test_to"]).to_pandas()
+            self.backtest_window = (folds["test_from"].min().to_pydatetime(), folds["test_to"].max().to_pydatetime())
+        else:
+            self.backtest_window = (self.trained_to, self.trained_to)
+        self.metadata = ModelMetadata(model_name=self.model_name,model_version=self.model_version,trained_until=self.trained_to,backtest_start=self.backtest_window[0],backtest_end=self.backtest_window[1],)
 
     def predict(self, req: ForecastRequest) -> ForecastResponse:
+        if not self.ready:
+            raise ModelNotReadyError(self.load_error or "model is warming up")
+        start = time.perf_counter()
+        cached = self.cached(req)
+        if cached is not None:
+            self._observe("cache_hit", start)
+            return cached
+
+        start = time.perf_counter()
+        row, feature_version = self.features.lookup(req.symbol, req.as_of)
+        start = self._observe("feature_lookup", start)
+        self.drift.observe_row(row[0])
+        daily_vol = float(row[0, self.vol_col])
+        if not math.isfinite(daily_vol):
+            raise FeatureNotFoundError(f"{req.symbol} has no volatility history at {req.as_of.isoformat()}")
+        raw_return = float(self.predictors.get(req.horizon, self.predictor).predict(row)[0])
+        self._observe("inference", start)
+        response = self._response(req, raw_return, daily_vol)
+        self._remember(req, feature_version, response)
+        return response
+
+    def _observe(self, stage: str, start: float) -> float:
+        now = time.perf_counter()
+        INFERENCE_STAGE_SECONDS.observe(now - start, stage, self.backend, self.model_version)
+        return now
+
+    def predict_many(self, items: List[ForecastRequest]) -> List[Union[ForecastResponse, ForecastBatchError]]:
+        """One in-order result per item from a single snapshot; scored items are cached (micro-batching path)."""
+        snapshot = self.features.snapshot
+        results = [result for chunk in self.predict_batch(items, snapshot=snapshot, source="micro_batch") for result in chunk]
+        for item, result in zip(items, results):
+            if isinstance(result, ForecastResponse):
+                self._remember(item, snapshot.version, result)
+        return results
+
+    # ---- prediction cache ----
+    # Deterministic for fixed model + features, so repeats skip lookup and scoring.
+    # The offset is part of the key because the response echoes as_of as given.
+
+    def _cache_key(self, req: ForecastRequest, feature_version: str) -> tuple:
+        return (req.symbol, req.as_of, req.as_of.utcoffset(), req.horizon, self.model_version, feature_version)
+
+    def cached(self, req: ForecastRequest) -> Optional[ForecastResponse]:
+        if not self.cache.enabled:
+            return None
+        feature_version = self.features.version
+        cached = self.cache.get(self._cache_key(req, feature_version), (self.model_version, feature_version))
+        CACHE_LOOKUPS.inc("prediction", "miss" if cached is None else "hit")
+        return cached
+
+    def _remember(self, req: ForecastRequest, feature_version: str, response: ForecastResponse) -> None:
+        # Keyed on the snapshot that actually produced the response, not the one current now
+        if self.cache.enabled:
+            self.cache.put(self._cache_key(req, feature_version), (self.model_version, feature_version), response)
+
+    def predict_batch(self, items: List[ForecastRequest], chunk_size: int = BATCH_CHUNK,
+                      snapshot: Optional[FeatureSnapshot] = None,
+                      source: str = "batch_endpoint") -> Iterator[List[Union[ForecastResponse, ForecastBatchError]]]:
         """
-        Dummy implementation.
+        Score many items, yielding results chunk by chunk in input order.
 
-        Later this will:
-        - Load/call Shri's trained model.
-        - Use real features from his feature store or artifacts.
+        Each chunk gathers its feature rows from one snapshot (consistent for the
+        whole batch) and runs one vectorised predict per horizon model. Items that cannot be
+        scored come back as ForecastBatchError instead of failing the batch.
         """
-        now = datetime.utcnow()
+        if not self.ready:
+            raise ModelNotReadyError(self.load_error or "model is warming up")
+        snapshot = snapshot or self.features.snapshot
+
+        for start in range(0, len(items), chunk_size):
+            chunk = items[start:start + chunk_size]
+            results: List[Union[ForecastResponse, ForecastBatchError, None]] = [None] * len(chunk)
+
+            # 1. Gather: as-of row index per item
+            t0 = time.perf_counter()
+            rows, scored = [], []
+            for j, item in enumerate(chunk):
+                try:
+                    rows.append(snapshot.row_index(item.symbol, to_utc_ns(item.as_of)))
+                    scored.append(j)
+                except FeatureNotFoundError as e:
+                    results[j] = self._batch_error(item, 404, str(e))
+
+            t0 = self._observe("feature_lookup_batch", t0)
+
+            # 2. Score: one predict call per horizon model in the chunk
+            if rows:
+                X = snapshot.values[rows]
+                self.drift.observe(X)
+                models = np.array([chunk[j].horizon if chunk[j].horizon in self.predictors else "1d" for j in scored])
+                raw_returns = np.empty(len(rows))
+                for horizon in np.unique(models):
+                    mask = models == horizon
+                    raw_returns[mask] = self.predictors[horizon].predict(X[mask])
+                self._observe("inference_batch", t0)
+                INFERENCE_BATCH_SIZE.observe(len(rows), source)
+                daily_vols = X[:, self.vol_col].astype(np.float64)
+                for j, raw_return, daily_vol in zip(scored, raw_returns.tolist(), daily_vols.tolist()):
+                    item = chunk[j]
+                    if math.isfinite(daily_vol):
+                        results[j] = self._response(item, raw_return, daily_vol)
+                    else:
+                        results[j] = self._batch_error(item, 404, f"{item.symbol} has no volatility history at {item.as_of.isoformat()}")
+            yield results
+
+    @staticmethod
+    def _batch_error(item: ForecastRequest, status_code: int, detail: str) -> ForecastBatchError:
+        return ForecastBatchError(symbol=item.symbol,as_of=item.as_of,horizon=item.horizon,status_code=status_code,detail=detail,)
+
+    def _response(self, req: ForecastRequest, raw_return: float, daily_vol: float) -> ForecastResponse:
+        # Horizon model predicts the horizon's log return; without one, the 1-bar
+        # model is scaled to the horizon (random-walk aggregation)
+        bars = HORIZON_BARS[req.horizon]
+        mu = raw_return if req.horizon in self.predictors else raw_return * bars
+        sigma = daily_vol * math.sqrt(bars)
 
-        prediction = PredictionPayload(horizon=req.horizon,predicted_return=0.012,predicted_volatility=0.035,predicted_direction="up",)
+        if abs(mu) < FLAT_BAND * sigma:
+            direction = "flat"
+        else:
+            direction = "up" if mu > 0 else "down"
+        confidence = 0.5 * (1 + math.erf(abs(mu) / (sigma * math.sqrt(2)))) if sigma > 0 else 1.0
 
-        risk = RiskPayload(var_95=-0.04,var_99=-0.07,expected_shortfall_95=-0.05,model_confidence=0.82,)
+        prediction = PredictionPayload(horizon=req.horizon,predicted_return=mu,predicted_volatility=sigma,predicted_direction=direction,)
 
-        model = ModelMetadata(model_name=self.model_name,model_version=self.model_version,trained_until=self.trained_to,backtest_start=now - timedelta(days=365),backtest_end=now - timedelta(days=1),)
+        risk = RiskPayload(var_95=mu - Z_95 * sigma,var_99=mu - Z_99 * sigma,expected_shortfall_95=mu - ES_95 * sigma,model_confidence=confidence,)
 
-        return ForecastResponse(symbol=req.symbol,as_of=req.as_of,prediction=prediction,risk=risk,model=model,)
+        return ForecastResponse(symbol=req.symbol,as_of=req.as_of,prediction=prediction,risk=risk,model=self.metadata,)
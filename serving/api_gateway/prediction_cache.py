@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+
+class PredictionCache:
+    """
+    Bounded LRU + TTL cache for deterministic predictions.
+
+    Keys carry (model_version, feature_version); when either changes, get()
+    drops every entry at once instead of letting stale ones age out.
+    Thread-safe (handlers may run in worker threads).
+    """
+
+    def __init__(self, max_entries: int = 10_000, ttl_s: float = 300.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._versions: Optional[Tuple[str, str]] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.expirations = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_s > 0
+
+    def _check_versions(self, versions: Tuple[str, str]):
+        if versions != self._versions:
+            if self._entries:
+                self.invalidations += 1
+            self._entries.clear()
+            self._versions = versions
+
+    def get(self, key: Hashable, versions: Tuple[str, str]) -> Optional[Any]:
+        with self._lock:
+            self._check_versions(versions)
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= self.clock():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: Hashable, versions: Tuple[str, str], value: Any):
+        with self._lock:
+            self._check_versions(versions)
+            self._entries[key] = (self.clock() + self.ttl_s, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expirations": self.expirations,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
@@ -1,10 +1,14 @@
-from fastapi import APIRouter
-from datetime import datetime, timedelta
-from typing import List
-from serving.api_gateway.schemas.explain import ExplainRequest,ExplainMetadata,ExplainResponse,EvidenceItem
+from fastapi import APIRouter, HTTPException
+from serving.api_gateway.schemas.explain import ExplainRequest,ExplainResponse
+from serving.api_gateway.explain_service import ExplainService
+from serving.api_gateway.model_service import FeatureNotFoundError, ModelNotReadyError
+from serving.api_gateway.routers.forecast import model_service
 
 router= APIRouter(tags=["explain"])
 
+# Shares the forecast model + feature store; loaded by the app lifespan after the model
+explain_service = ExplainService(model_service)
+
 @router.get("/ping")
 async def ping_explain():
     return {"service":"explain","status":"ok"}
@@ -12,35 +16,13 @@ async def ping_explain():
 @router.post("/",response_model=ExplainResponse)
 async def create_explanation(request: ExplainRequest) -> ExplainResponse:
     """
-    dummy explanation endpoint 
-    later this will call the RAG + LLM pipeline to build a real explanation
+    SHAP attributions for the forecast at (symbol, as_of, horizon).
+    Index lookup or a single-row TreeSHAP (tens of µs): cheaper inline than a threadpool hop.
+    Evidence is still a placeholder until the RAG + LLM pipeline lands.
     """
-    now = datetime.utcnow()
-    dummy_evidence: List[EvidenceItem] = [        EvidenceItem(
-            id="evt-1",
-            source="news",
-            title=f"{request.symbol} rallies on positive earnings",
-            snippet=f"{request.symbol} reported better-than-expected earnings, "
-                    f"driving bullish sentiment in the short term.",
-            published_at=now - timedelta(hours=12),
-            url="https://example.com/news/a",
-        )
-    ]
-
-    meta = ExplainMetadata(
-        model_version="v0.1.0",
-        prompt_version="prompt-explain-v0",
-    )
-
-    return ExplainResponse(
-        symbol=request.symbol,
-        as_of=request.as_of,
-        horizon=request.horizon,
-        summary="This is a placeholder explanation.",
-        top_drivers=[
-            "Recent earnings beat",
-            "Positive short-term sentiment in news flow",
-        ],
-        evidence=dummy_evidence,
-        meta=meta,
-    )
+    try:
+        return explain_service.explain(request)
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except FeatureNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
@@ -1,12 +1,24 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import StreamingResponse
 
-from serving.api_gateway.schemas.forecast import ForecastRequest, ForecastResponse
-from serving.api_gateway.model_service import ModelService
+from common.config.settings import settings
+from serving.api_gateway.metrics import PREDICTIONS, RECENT_PREDICTIONS
+from serving.api_gateway.schemas.forecast import ForecastBatchRequest, ForecastRequest, ForecastResponse
+from serving.api_gateway.model_service import FeatureNotFoundError, ModelNotReadyError, ModelService
+from serving.api_gateway.batching import InferenceDispatcher, QueueFullError
 
 router = APIRouter(tags=["forecast"])
 
-# Global instance (later can be injected / replaced in tests)
+# Global instance (later can be injected / replaced in tests); loaded by the app lifespan
 model_service = ModelService()
+# Coalesces concurrent single forecasts into micro-batches; started/stopped by the app lifespan
+dispatcher = InferenceDispatcher(model_service, window_ms=settings.batch_window_ms,
+                                 max_batch=settings.batch_max_items, max_queue=settings.batch_queue_size)
+
+
+def _count_predictions(route: str, n: int) -> None:
+    PREDICTIONS.inc(route, value=n)
+    RECENT_PREDICTIONS.inc(value=n)
 
 
 @router.get("/ping")
@@ -17,6 +29,36 @@ async def ping_forecast():
 @router.post("/", response_model=ForecastResponse)
 async def create_forecast(request: ForecastRequest) -> ForecastResponse:
     """
-    Delegate to the model service adapter.
+    Delegate to the model service via the micro-batching dispatcher (inference never runs on the event loop).
+    """
+    try:
+        response = await dispatcher.submit(request)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    except ModelNotReadyError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except FeatureNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    _count_predictions("/forecast/", 1)
+    return response
+
+
+@router.post("/batch")
+async def create_forecast_batch(request: ForecastBatchRequest) -> StreamingResponse:
+    """
+    Score many (symbol, as_of, horizon) items; streams one NDJSON line per item,
+    in request order. Unscorable items get an error line (status_code + detail).
     """
-    return model_service.predict(request)
+    if not model_service.ready:
+        raise HTTPException(status_code=503, detail=model_service.load_error or "model is warming up")
+
+    # Sync generator: Starlette iterates it in a worker thread, one write per chunk
+    def ndjson_lines():
+        for results in model_service.predict_batch(request.items):
+            # Each scored item is a prediction; error lines are not
+            scored = sum(isinstance(result, ForecastResponse) for result in results)
+            if scored:
+                _count_predictions("/forecast/batch", scored)
+            yield "".join(result.model_dump_json() + "\n" for result in results)
+
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
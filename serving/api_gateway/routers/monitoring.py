@@ -1,4 +1,12 @@
+import os
+
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse, PlainTextResponse
+
+from serving.api_gateway.metrics import SERVING_ROUTES, registry, to_json, to_prometheus, window_totals
+
+from serving.api_gateway.routers.forecast import dispatcher, model_service
+from serving.api_gateway.routers.explain import explain_service
 
 router = APIRouter(tags=["monitoring"])
 
@@ -6,10 +14,42 @@ router = APIRouter(tags=["monitoring"])
 async def health():
     return {"status": "healthy"}
 
+@router.get("/ready")
+async def ready():
+    """Readiness: 200 only once the model and features are loaded and warm."""
+    body = {"ready": model_service.ready,"model_version": model_service.model_version,"feature_version": model_service.feature_version,"explain_ready": explain_service.ready,}
+    if not model_service.ready:
+        body["detail"] = model_service.load_error or "warming up"
+        return JSONResponse(status_code=503, content=body)
+    return body
+
 @router.get("/metrics")
 async def metrics():
-    return {"prediction_count_24h":0,"error_rate_24h":0.0,}
+    """Counters/histograms (all workers when FINSENSE_METRICS_DIR is set) + this process's component stats."""
+    snapshot = registry.collect()
+    requests = snapshot["http_request_duration_seconds"]
+    labels = requests["labels"]
+    totals = [(dict(zip(labels, values)), count) for values, _, _, count in requests["series"]]
+    request_count = sum(count for _, count in totals)
+    serving = [(series, count) for series, count in totals if series["method"] == "POST" and series["route"].startswith(SERVING_ROUTES)]
+    serving_count = sum(count for _, count in serving)
+    error_count = sum(count for series, count in serving if series["status"].startswith("5"))
+    error_rate = error_count / serving_count if serving_count else 0.0
+    prediction_count = int(sum(value for _, value in snapshot["predictions_total"]["series"]))
+    # *_24h: hourly buckets over the last 24h
+    prediction_count_24h = int(sum(value for _, value in window_totals(snapshot["predictions_recent"])))
+    recent = window_totals(snapshot["serving_requests_recent"])
+    recent_count = sum(value for _, value in recent)
+    recent_errors = sum(value for series, value in recent if series["status"].startswith("5"))
+    error_rate_24h = recent_errors / recent_count if recent_count else 0.0
+    return {"prediction_count":prediction_count,"request_count":request_count,"error_rate":error_rate,"prediction_count_24h":prediction_count_24h,"error_rate_24h":error_rate_24h,"metrics":to_json(snapshot),
+            "process":{"pid":os.getpid(),"prediction_cache":model_service.cache.stats(),"dispatcher":dispatcher.stats(),"explain":explain_service.stats(),},}
+
+@router.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def metrics_prometheus():
+    return PlainTextResponse(to_prometheus(registry.collect()), media_type="text/plain; version=0.0.4")
 
 @router.get("/drift")
 async def drift():
-    return {"feature_drift":False,"embedding_drift":False,}
\ No newline at end of file
+    """Feature drift of recent /forecast inputs against the training reference (this process's window)."""
+    return {**model_service.drift.report(),"embedding_drift":False,"pid":os.getpid(),}
@@ -1,11 +1,11 @@
 from datetime import datetime
-from typing import Literal, List
-from pydantic import BaseModel
+from typing import Literal, List, Optional
+from pydantic import BaseModel, computed_field
 
 class ExplainRequest(BaseModel):
     symbol: str
     as_of: datetime
-    horizon: Literal["1d","5d"]= "1d"
+    horizon: Literal["1d","5d","1w"]= "1d"
 
 class EvidenceItem(BaseModel):
     id:str
@@ -15,9 +15,22 @@ class EvidenceItem(BaseModel):
     published_at: datetime
     url: str
 
+class FeatureAttribution(BaseModel):
+    feature: str
+    value: Optional[float]      # feature value at the as-of bar (None if missing)
+    shap: float                 # contribution to the horizon's predicted return
+
 class ExplainMetadata(BaseModel):
-    model_verison: str
+    model_version: str
     prompt_version: str
+    feature_version: Optional[str] = None
+    attribution_source: Optional[Literal["precomputed","computed"]] = None
+
+    @computed_field(json_schema_extra={"deprecated": True, "description": "Deprecated: use model_version"})
+    @property
+    def model_verison(self) -> str:
+        # Old misspelled key, still sent alongside model_version for existing clients
+        return self.model_version
 
 class ExplainResponse(BaseModel):
     symbol: str
@@ -26,4 +39,7 @@ class ExplainResponse(BaseModel):
     summary: str
     top_drivers: List[str]
     evidence: List[EvidenceItem]
-    meta: ExplainMetadata
\ No newline at end of file
+    meta: ExplainMetadata
+    base_value: Optional[float] = None          # expected model output, horizon-scaled
+    predicted_return: Optional[float] = None    # base_value + sum of attributions (= /forecast)
+    attributions: List[FeatureAttribution] = []  # sorted by |shap|, largest first
\ No newline at end of file
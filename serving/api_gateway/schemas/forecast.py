@@ -1,6 +1,8 @@
 from datetime import datetime
-from typing import Literal, Optional
-from pydantic import BaseModel
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+
+MAX_BATCH_ITEMS = 100_000
 
 
 class ForecastRequest(BaseModel):
@@ -37,3 +39,16 @@ class ForecastResponse(BaseModel):
     prediction: PredictionPayload
     risk: RiskPayload
     model: ModelMetadata
+
+
+class ForecastBatchRequest(BaseModel):
+    items: List[ForecastRequest] = Field(min_length=1, max_length=MAX_BATCH_ITEMS)
+
+
+class ForecastBatchError(BaseModel):
+    """One NDJSON line for an item that could not be scored."""
+    symbol: str
+    as_of: datetime
+    horizon: str
+    status_code: int
+    detail: str
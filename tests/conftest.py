@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def market_bars() -> pd.DataFrame:
+    """
+    Daily bars for a few symbols, sorted by symbol/timestamp as
+    load_daily_ohlcv returns them, with the edge cases the feature paths
+    treat specially:
+    - LONG: 80-bar random walk
+    - SHORT: 8 bars (fewer than the 10-bar minimum and the 20-bar window)
+    - FLAT: a constant-price run and a zero-volume run inside the window
+    - STEADY: constant non-zero volume throughout
+    """
+    rng = np.random.default_rng(7)
+
+    def bars(symbol, n, start):
+        close = 100 * np.exp(np.cumsum(rng.normal(0.0003, 0.02, n)))
+        volume = rng.lognormal(12, 0.5, n).round()
+        return pd.DataFrame({"symbol": symbol, "timestamp": pd.bdate_range(start, periods=n, tz="UTC"),
+                             "close": close, "volume": volume})
+
+    long, short, flat, steady = bars("LONG", 80, "2024-01-01"), bars("SHORT", 8, "2024-03-01"), \
+        bars("FLAT", 60, "2024-01-15"), bars("STEADY", 40, "2024-02-01")
+    flat.loc[10:40, "close"] = flat.loc[10, "close"]
+    flat.loc[20:45, "volume"] = 0.0
+    steady["volume"] = 5_000.0
+    df = pd.concat([long, short, flat, steady], ignore_index=True)
+    return df.sort_values(["symbol", "timestamp"], kind="stable").reset_index(drop=True)
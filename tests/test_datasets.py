@@ -0,0 +1,26 @@
+import numpy as np
+
+from ml.src.datasets import TARGET_COLS, _attach_targets, _forward_log_returns
+from ml.src.features_market import FEATURE_COLS, compute_market_features
+
+
+def test_attach_targets_matches_merge(market_bars):
+    features = compute_market_features(market_bars)
+    dataset = _attach_targets(features, market_bars)
+    assert len(dataset) == len(features)
+    one_day = dataset.groupby("symbol", observed=True)["ret_1d"].shift(-1)
+    np.testing.assert_allclose(dataset[TARGET_COLS["1d"]], np.log1p(one_day), equal_nan=True)
+
+
+def test_empty_slice_keeps_output_columns(market_bars):
+    features = compute_market_features(market_bars)
+    expected = ["symbol", "timestamp", *FEATURE_COLS, *TARGET_COLS.values()]
+    for feats, prices in ((features.iloc[:0], market_bars), (features, market_bars.iloc[:0])):
+        dataset = _attach_targets(feats, prices)
+        assert dataset.empty
+        assert list(dataset.columns) == expected
+
+
+def test_forward_log_returns_on_no_prices(market_bars):
+    targets = _forward_log_returns(market_bars.iloc[:0])
+    assert {col: len(target) for col, target in targets.items()} == dict.fromkeys(TARGET_COLS.values(), 0)
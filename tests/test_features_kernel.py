@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from ml.src.features_kernel import compute_market_features_fast, market_feature_kernel
+from ml.src.features_market import FEATURE_COLS, compute_market_features
+
+
+def assert_kernel_matches(fast: pd.DataFrame, reference: pd.DataFrame):
+    assert fast[["symbol", "timestamp"]].equals(reference[["symbol", "timestamp"]])
+    for col in FEATURE_COLS:
+        assert fast[col].dtype == np.float32
+        # float32 output: tolerance of the float32 cast, NaN in exactly the same places
+        np.testing.assert_allclose(fast[col].to_numpy(dtype=np.float64), reference[col].to_numpy(dtype=np.float64),
+                                   rtol=1e-5, atol=1e-6, equal_nan=True, err_msg=col)
+
+
+def test_kernel_matches_pandas(market_bars):
+    assert_kernel_matches(compute_market_features_fast(market_bars), compute_market_features(market_bars))
+
+
+def test_same_value_runs_match_exactly(market_bars):
+    # _same_value_run: pandas reports the repeated value and an exact 0 std over a run of
+    # identical values, so vol_20d is 0 inside the constant-price run and vol_zscore is
+    # 0/0 (NaN, not +-inf from rounding residue) inside the zero- and constant-volume runs
+    fast = compute_market_features_fast(market_bars)
+    reference = compute_market_features(market_bars)
+
+    flat = (reference["symbol"] == "FLAT").to_numpy()
+    zero_vol = flat & (reference["vol_20d"] == 0).to_numpy()
+    assert zero_vol.any()
+    np.testing.assert_array_equal(fast.loc[zero_vol, "vol_20d"], 0.0)
+
+    for symbol in ("FLAT", "STEADY"):
+        rows = (reference["symbol"] == symbol).to_numpy()
+        expected = reference.loc[rows, "vol_zscore"].to_numpy()
+        actual = fast.loc[rows, "vol_zscore"].to_numpy()
+        assert np.isfinite(actual[~np.isnan(actual)]).all()
+        np.testing.assert_array_equal(np.isnan(actual), np.isnan(expected))
+
+
+def test_short_series_has_no_windowed_features(market_bars):
+    short = market_bars[market_bars["symbol"] == "SHORT"]   # 8 bars < MIN_PERIODS
+    fast = compute_market_features_fast(short)
+    assert fast[["vol_20d", "vol_zscore"]].isna().all().all()
+    assert_kernel_matches(fast, compute_market_features(short))
+
+
+def test_chunked_kernel_matches_single_pass(market_bars):
+    assert_kernel_matches(compute_market_features_fast(market_bars, chunk_rows=7), compute_market_features(market_bars))
+
+
+def test_empty_input():
+    out = market_feature_kernel(np.array([], dtype=np.int64), np.array([]), np.array([]))
+    assert out.shape == (0, len(FEATURE_COLS))
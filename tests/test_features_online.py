@@ -0,0 +1,52 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ml.src.features_market import FEATURE_COLS, compute_market_features
+from ml.src.features_online import OnlineFeatureEngine, verify_parity
+
+BAR_COLS = ["symbol", "timestamp", "close", "volume"]
+
+
+def assert_features_match(actual: pd.DataFrame, expected: pd.DataFrame):
+    assert actual[["symbol", "timestamp"]].equals(expected[["symbol", "timestamp"]])
+    for col in FEATURE_COLS:
+        np.testing.assert_allclose(actual[col].to_numpy(dtype="float64"), expected[col].to_numpy(dtype="float64"),
+                                   rtol=1e-9, atol=1e-12, equal_nan=True, err_msg=col)
+
+
+def test_stream_matches_batch_across_checkpoint_restore(market_bars, tmp_path):
+    expected = compute_market_features(market_bars)
+
+    # Live-feed order: bars interleaved across symbols, checkpointed halfway
+    feed = market_bars.sort_values(["timestamp", "symbol"], kind="stable")[BAR_COLS].reset_index(drop=True)
+    half = len(feed) // 2
+    engine = OnlineFeatureEngine()
+    rows = [engine.update(*bar) for bar in feed.iloc[:half].itertuples(index=False)]
+    engine.save(tmp_path / "online_state.json")
+    engine = OnlineFeatureEngine.load(tmp_path / "online_state.json")
+    rows += [engine.update(*bar) for bar in feed.iloc[half:].itertuples(index=False)]
+
+    online = pd.concat([feed[["symbol", "timestamp"]], pd.DataFrame(rows, columns=FEATURE_COLS)], axis=1)
+    online = online.sort_values(["symbol", "timestamp"], kind="stable").reset_index(drop=True)
+    assert_features_match(online, expected)
+
+
+def test_checkpoint_is_json_round_trippable(market_bars):
+    engine = OnlineFeatureEngine()
+    engine.warm_up(market_bars)
+    saved = json.dumps(engine.checkpoint())   # NaN != NaN, so compare serialised
+    assert json.dumps(OnlineFeatureEngine.restore(json.loads(saved)).checkpoint()) == saved
+
+
+def test_verify_parity(market_bars):
+    verify_parity(market_bars)
+
+
+def test_rejects_out_of_order_bars():
+    engine = OnlineFeatureEngine()
+    engine.update("AAA", "2024-01-03", 10.0, 100.0)
+    with pytest.raises(ValueError):
+        engine.update("AAA", "2024-01-02", 10.0, 100.0)
@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+
+from common import flat_tree
+from common.flat_tree import MISSING_NAN, MISSING_ZERO, FlatTreeModel
+
+lgb = pytest.importorskip("lightgbm")
+from ml.src.export_flat_model import flatten_booster  # noqa: E402  (needs lightgbm)
+
+
+@pytest.fixture(params=["numba", "numpy"])
+def engine(request, monkeypatch):
+    """Run each test with the compiled walk and with the _predict_numpy fallback."""
+    if request.param == "numba":
+        if flat_tree.numba is None:
+            pytest.skip("numba not installed")
+    else:
+        monkeypatch.setattr(flat_tree, "_compiled_walk", lambda: None)
+    return request.param
+
+
+def _train(zero_as_missing: bool):
+    rng = np.random.default_rng(3)
+    X = rng.normal(size=(2_000, 4))
+    X[:, 2] = np.where(rng.random(2_000) < 0.3, 0.0, X[:, 2])        # zero runs for the Zero splits
+    y = X[:, 0] - 2 * X[:, 1] + 3 * (X[:, 2] == 0) + rng.normal(0, 0.1, 2_000)
+    X[rng.random(X.shape) < 0.1] = np.nan                              # NaNs seen in training
+    params = {"objective": "regression", "num_leaves": 15, "min_data_in_leaf": 5,
+              "zero_as_missing": zero_as_missing, "verbosity": -1, "seed": 0}
+    return lgb.train(params, lgb.Dataset(X, y), num_boost_round=30), X
+
+
+def _queries(X: np.ndarray) -> np.ndarray:
+    rng = np.random.default_rng(11)
+    Q = X[:300].copy()
+    Q[rng.random(Q.shape) < 0.2] = np.nan
+    Q[rng.random(Q.shape) < 0.2] = 0.0
+    Q[:5, 3] = -0.0
+    return np.vstack([X, Q])
+
+
+@pytest.mark.parametrize("zero_as_missing, missing_type", [(False, MISSING_NAN), (True, MISSING_ZERO)])
+def test_flat_predict_matches_booster(engine, zero_as_missing, missing_type):
+    booster, X = _train(zero_as_missing)
+    flat = flatten_booster(booster)
+    assert (flat.missing_type == missing_type).any()
+    Q = _queries(X)
+    expected = booster.predict(Q)
+    np.testing.assert_allclose(flat.predict(Q), expected, rtol=1e-9, atol=1e-12)
+    # Single-row input (the /forecast path)
+    for i in range(0, len(Q), 97):
+        np.testing.assert_allclose(flat.predict(Q[i]), expected[i:i + 1], rtol=1e-9, atol=1e-12)
+
+
+def test_best_iteration_and_round_trip(engine, tmp_path):
+    booster, X = _train(False)
+    booster.best_iteration = 12
+    flat = flatten_booster(booster, source_sha256="abc")
+    assert flat.num_trees == 12
+    flat.save(tmp_path / "flat.npz")
+    loaded = FlatTreeModel.load(tmp_path / "flat.npz")
+    assert loaded.source_sha256 == "abc"
+    Q = _queries(X)
+    np.testing.assert_allclose(loaded.predict(Q), booster.predict(Q, num_iteration=12), rtol=1e-9, atol=1e-12)
@@ -0,0 +1,39 @@
+import json
+
+from serving.api_gateway import metrics
+from serving.api_gateway.metrics import MetricsRegistry, merge_snapshots, to_prometheus, window_totals
+
+HOUR, DAY = 3_600, 86_400
+T0 = 1_700_000_000 // DAY * DAY
+
+
+def _at(monkeypatch, t):
+    monkeypatch.setattr(metrics.time, "time", lambda: t)
+
+
+def test_window_counts_last_24_hours(monkeypatch):
+    window = MetricsRegistry().window("requests_recent", "test", ("status",))
+    _at(monkeypatch, T0)
+    window.inc("200", value=3)
+    _at(monkeypatch, T0 + 12 * HOUR)
+    window.inc("500")
+    _at(monkeypatch, T0 + DAY + 30)   # the T0 bucket has left the window and is pruned
+    window.inc("200")
+    snapshot = window.snapshot()
+    assert len(snapshot["series"]) == 2
+    assert sorted((labels["status"], value) for labels, value in window_totals(snapshot)) == [("200", 1.0), ("500", 1.0)]
+    # 24h later nothing is left, even without a new inc to prune on
+    assert window_totals(snapshot, now=T0 + 2 * DAY) == []
+
+
+def test_window_merges_across_workers_and_drops_stale_files(monkeypatch):
+    workers = [MetricsRegistry() for _ in range(3)]
+    windows = [registry.window("predictions_recent", "test") for registry in workers]
+    _at(monkeypatch, T0)
+    windows[0].inc(value=4)                      # an exited worker's file, never updated again
+    _at(monkeypatch, T0 + DAY + HOUR)
+    windows[1].inc(value=2)
+    windows[2].inc(value=5)
+    merged = merge_snapshots([json.loads(json.dumps(registry.snapshot())) for registry in workers])
+    assert [value for _, value in window_totals(merged["predictions_recent"])] == [7.0]
+    assert "predictions_recent" not in to_prometheus(merged)